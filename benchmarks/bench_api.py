@@ -0,0 +1,163 @@
+"""
+Benchmark of the hot paths of GoogleDrive and GoogleSheet against a local fake backend, without network and quotas.
+
+Each operation is repeated and reported by ops/sec, MB/s of the request and response bodies, and the peak of
+memory allocated by Python during an operation, measured by tracemalloc in a separate run.
+The rate limiters are opened up, so that only the client and the fake latency are measured.
+
+    $ python benchmarks/bench_api.py --latency 0.01 --file-size 8388608 --rows 10000 --columns 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_backend import FakeBackend  # noqa: E402
+from gworkspace_client import Instrumentation  # noqa: E402
+from gworkspace_client.GoogleDrive import GoogleDrive  # noqa: E402
+from gworkspace_client.GoogleSheet import GoogleSheet  # noqa: E402
+from gworkspace_client.RateLimiter import RateLimiter  # noqa: E402
+
+OPERATIONS = ['list_files', 'upload_file', 'upload_file_resumable', 'download_file', 'write_sheet',
+              'read_single_sheet']
+
+
+class _FakeBackendMixin:
+    """
+    Serve a client by the fake backend instead of Google, with no credential
+    """
+    backend = None
+
+    def _load_token(self, scopes: str) -> object:
+        return None
+
+    def _build_service(self, api: str, version: str):
+        from googleapiclient.discovery import build
+
+        services = self.__dict__.setdefault('_fake_services', threading.local())
+        if not hasattr(services, api):
+            setattr(services, api, build(api, version, http=self.backend, static_discovery=True))
+        return getattr(services, api)
+
+
+class BenchDrive(_FakeBackendMixin, GoogleDrive):
+    pass
+
+
+class BenchSheet(_FakeBackendMixin, GoogleSheet):
+    pass
+
+
+class _ByteCounter:
+    """
+    A hook of Instrumentation summing the bytes of the calls
+    """
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Instrumentation.CallRecord) -> None:
+        with self._lock:
+            self.bytes += record.bytes_sent + record.bytes_received
+
+
+def make_operations(backend: FakeBackend, workdir: str, args) -> dict:
+    """
+    :return: a dict of {name of operation: a function running it once}
+    """
+    import pandas as pd
+
+    _FakeBackendMixin.backend = backend
+    token_path = os.path.join(workdir, 'fake-token.json')
+    gdrive = BenchDrive(token_path=token_path, client_secret_path='')
+    gsheet = BenchSheet(token_path=token_path, client_secret_path='', url_or_id='fake-sheet')
+
+    upload_path = os.path.join(workdir, 'upload.bin')
+    with open(upload_path, 'wb') as f:
+        f.write(os.urandom(args.file_size))
+    download_path = os.path.join(workdir, 'download.bin')
+    df = pd.DataFrame([['x' * args.cell_size] * args.columns] * (args.rows - 1),
+                      columns=[f'col{j}' for j in range(args.columns)])
+
+    return {
+        'list_files': lambda: gdrive.list_files('root'),
+        'upload_file': lambda: gdrive.upload_file('root', upload_path, mimetype='application/octet-stream'),
+        'upload_file_resumable': lambda: gdrive.upload_file('root', upload_path, mimetype='application/octet-stream',
+                                                            resumable=True, chunk_size=args.chunk_size),
+        'download_file': lambda: gdrive.download_file('file00000000', download_path, chunk_size=args.chunk_size,
+                                                      return_bytes=False),
+        'write_sheet': lambda: gsheet.write_sheet('Sheet1', df),
+        'read_single_sheet': lambda: gsheet.read_single_sheet('Sheet1'),
+    }
+
+
+def measure(operation, repeat: int, counter: _ByteCounter) -> dict:
+    """
+    Run an operation repeatedly
+    :return: a dict of ops_per_sec, mb_per_sec and peak_mb
+    """
+    # a warm-up, which also builds the services and imports lazily imported modules
+    operation()
+
+    counter.bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    elapsed = time.perf_counter() - start
+    transferred = counter.bytes
+
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops_per_sec': repeat / elapsed,
+        'mb_per_sec': transferred / elapsed / 1024 / 1024,
+        'peak_mb': peak / 1024 / 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20, help='the number of runs per operation')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of latency per request')
+    parser.add_argument('--files', type=int, default=1000, help='the number of files listed in a folder')
+    parser.add_argument('--file-size', type=int, default=4 * 1024 * 1024, help='bytes of a file up/downloaded')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024,
+                        help='bytes of a chunk of resumable uploads and downloads, a multiple of 256KB')
+    parser.add_argument('--rows', type=int, default=1000, help='the number of rows of a sheet, including header')
+    parser.add_argument('--columns', type=int, default=10, help='the number of columns of a sheet')
+    parser.add_argument('--cell-size', type=int, default=8, help='the length of a cell value')
+    parser.add_argument('--ops', nargs='*', default=OPERATIONS, choices=OPERATIONS, help='operations to run')
+    args = parser.parse_args()
+
+    for api in ('drive', 'sheets'):
+        RateLimiter.configure(api, rate=1e9, burst=10 ** 9)
+
+    backend = FakeBackend(latency=args.latency, n_files=args.files, file_size=args.file_size, n_rows=args.rows,
+                          n_columns=args.columns, cell_size=args.cell_size)
+    counter = Instrumentation.add_hook(_ByteCounter())
+
+    with tempfile.TemporaryDirectory() as workdir:
+        operations = make_operations(backend, workdir, args)
+
+        print(f'{"operation":<24} {"ops/sec":>10} {"MB/s":>10} {"peak MB":>10}')
+        for name in args.ops:
+            result = measure(operations[name], args.repeat, counter)
+            print(f'{name:<24} {result["ops_per_sec"]:>10.1f} {result["mb_per_sec"]:>10.1f} '
+                  f'{result["peak_mb"]:>10.1f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark of the import time of gworkspace_client modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and the cumulative import time
+is reported with the heavy dependencies loaded by the import, which should be none of HEAVY_MODULES.
+
+    $ python benchmarks/bench_import.py --repeat 5 --max-ms 100
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    'gworkspace_client',
+    'gworkspace_client.GsuiteBase',
+    'gworkspace_client.GoogleDrive',
+    'gworkspace_client.GoogleSheet',
+]
+
+# dependencies that must be loaded only when a method needing them is called
+HEAVY_MODULES = [
+    'pandas',
+    'googleapiclient.discovery',
+    'googleapiclient.http',
+    'google_auth_oauthlib',
+    'google.oauth2.credentials',
+]
+
+_PROBE = 'import sys, {module}; print(",".join(m for m in {heavy!r} if m in sys.modules))'
+
+
+def measure(module: str) -> tuple:
+    """
+    Import a module in a fresh interpreter
+    :param module: name of the module
+    :return: a tuple of (cumulative import time in ms, list of heavy modules loaded)
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                          capture_output=True, text=True, check=True)
+
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    return cumulative_us / 1000, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='the number of imports per module')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median import time of any module exceeds this')
+    args = parser.parse_args()
+
+    failed = False
+    print(f'{"module":<32} {"median ms":>10} {"min ms":>8}  heavy modules loaded')
+    for module in MODULES:
+        results = [measure(module) for _ in range(args.repeat)]
+        times = [t for t, _ in results]
+        loaded = results[-1][1]
+        median = statistics.median(times)
+        print(f'{module:<32} {median:>10.1f} {min(times):>8.1f}  {", ".join(loaded) or "-"}')
+
+        if loaded or (args.max_ms is not None and median > args.max_ms):
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+A local fake of the Drive v3 and Sheets v4 backends for the benchmarks, which serves the requests of
+googleapiclient in process, in place of an httplib2.Http object.
+
+It answers the calls used by the benchmarks with generated contents of configurable sizes, after a configurable
+latency per request. serve() exposes it by a local http server, for the clients not using httplib2 like the asyncio
+ones:
+    Drive: files.list, files.get(alt=media) with ranges, files.create with multipart and resumable uploads,
+           including partially committed and failed chunks of resumable uploads,
+           changes.getStartPageToken and changes.list of the changes recorded by add_change(),
+           and files.list of a folder tree added by add_file() in place of the generated files
+    Sheets: spreadsheets.get, spreadsheets.batchUpdate, values.get, values.update, values.batchUpdate,
+            values.append, and the failures of the writes queued in sheet_errors
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+
+
+class FakeBackend:
+    """
+    An httplib2.Http compatible object answering Drive and Sheets requests without network.
+    It is thread-safe, so the services of all the threads can share it
+    """
+
+    def __init__(self, latency: float = 0.0, n_files: int = 1000, file_size: int = 1024 * 1024,
+                 n_rows: int = 1000, n_columns: int = 10, cell_size: int = 8) -> None:
+        """
+        :param latency: seconds to sleep per request, as a round trip to the server
+        :param n_files: the number of files listed in a folder
+        :param file_size: size of a file downloaded in bytes
+        :param n_rows: the number of rows of a sheet read, including the header
+        :param n_columns: the number of columns of a sheet read
+        :param cell_size: the length of a cell value of a sheet read
+        """
+        self.latency = latency
+        self.n_files = n_files
+        self.file_size = file_size
+        self.n_rows = n_rows
+        self.n_columns = n_columns
+        self.cell_size = cell_size
+
+        # the root url of the session uris of resumable uploads, which is the server's by serve()
+        self.base_url = 'https://fake.local'
+        self.requests = 0
+        # the number of next upload chunks of which only a half is committed, answered by 308 or by 503
+        self.partial_commits = 0
+        self.upload_failures = 0
+        # contents of the completed resumable uploads by file id
+        self.uploaded = {}
+        # the Changes feed, of which a page token is the index of the next change
+        self.changes = []
+        # file resources by id added by add_file(), which are listed by their parents instead of the generated ones
+        self.tree = {}
+        # status codes answered to the next writes of Sheets in order, instead of writing
+        self.sheet_errors = []
+        # the rows appended by values.append, and the requests of spreadsheets.batchUpdate
+        self.appended = []
+        self.batch_updates = []
+        self._content = bytes(range(256)) * (file_size // 256 + 1)
+        self._uploads = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # attributes of httplib2.Http read by googleapiclient
+        self.timeout = None
+        self.redirect_codes = frozenset()
+
+    def request(self, uri: str, method: str = 'GET', body=None, headers: dict = None, redirections: int = 5,
+                connection_type=None):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+
+        url = urlparse(uri)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if hasattr(body, 'read'):
+            # a chunk of a resumable upload, sliced from the stream of the file
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode()
+
+        if url.path.startswith('/upload/drive/v3/files') or url.path.startswith('/upload/session/'):
+            return self._upload(url.path, method, query, body, headers)
+        if url.path.startswith('/drive/v3/changes'):
+            return self._changes(url.path, query)
+        if url.path.startswith('/drive/v3/files'):
+            return self._drive(url.path, method, query, headers)
+        if url.path.startswith('/v4/spreadsheets/'):
+            return self._sheets(unquote(url.path), method, body)
+        return _response(404, {'error': {'code': 404, 'message': f'Unknown path {url.path}'}})
+
+    def _drive(self, path: str, method: str, query: dict, headers: dict):
+        file_id = path[len('/drive/v3/files/'):]
+        if method == 'GET' and file_id == '' and self.tree:
+            match = re.match(r"'([^']+)' in parents", query.get('q', ''))
+            with self._lock:
+                files = [file for file in self.tree.values() if match and match.group(1) in file.get('parents', [])]
+            return _response(200, {'files': files})
+
+        if method == 'GET' and file_id == '':
+            page_size = int(query.get('pageSize', 100))
+            start = int(query.get('pageToken', 0))
+            end = min(start + page_size, self.n_files)
+            files = [{'id': f'file{i:08d}', 'name': f'file-{i}.bin', 'mimeType': 'application/octet-stream',
+                      'parents': ['root']} for i in range(start, end)]
+            content = {'files': files}
+            if end < self.n_files:
+                content['nextPageToken'] = str(end)
+            return _response(200, content)
+
+        if method == 'GET' and query.get('alt') == 'media':
+            first, last = 0, self.file_size - 1
+            match = re.match(r'bytes=(\d+)-(\d*)', headers.get('range', ''))
+            if match:
+                first = int(match.group(1))
+                last = min(int(match.group(2) or last), last)
+            resp = httplib2.Response({'status': '206' if match else '200',
+                                      'content-range': f'bytes {first}-{last}/{self.file_size}',
+                                      'content-length': str(last - first + 1)})
+            return resp, self._content[first:last + 1]
+
+        if method == 'GET':
+            return _response(200, {'id': file_id, 'name': f'{file_id}.bin', 'size': str(self.file_size)})
+        return _response(200, {'id': file_id})
+
+    def add_file(self, file: dict) -> None:
+        """
+        Add a file or folder to the tree listed by files.list
+        :param file: the file resource. ex> {'id': ..., 'name': ..., 'mimeType': ..., 'parents': [...]}
+        """
+        with self._lock:
+            self.tree[file['id']] = file
+
+    def add_change(self, file_id: str, file: dict = None) -> None:
+        """
+        Record a change of a file in the Changes feed
+        :param file_id: id of the changed file
+        :param file: the metadata of the file after the change, or None for a removed file.
+                     ex> {'id': ..., 'name': ..., 'parents': [...], 'trashed': True} for a trashed file
+        """
+        change = {'kind': 'drive#change', 'changeType': 'file', 'fileId': file_id, 'removed': file is None}
+        if file is not None:
+            change['file'] = file
+        with self._lock:
+            self.changes.append(change)
+
+    def _changes(self, path: str, query: dict):
+        with self._lock:
+            if path.endswith('/startPageToken'):
+                return _response(200, {'startPageToken': str(len(self.changes))})
+
+            start = int(query.get('pageToken', 0))
+            end = min(start + int(query.get('pageSize', 100)), len(self.changes))
+            content = {'changes': self.changes[start:end]}
+            if end < len(self.changes):
+                content['nextPageToken'] = str(end)
+            else:
+                content['newStartPageToken'] = str(end)
+        return _response(200, content)
+
+    def _upload(self, path: str, method: str, query: dict, body: bytes, headers: dict):
+        if query.get('uploadType') == 'resumable' and method == 'POST':
+            session = str(next(self._ids))
+            with self._lock:
+                self._uploads[session] = bytearray()
+            return httplib2.Response({'status': '200', 'location': f'{self.base_url}/upload/session/{session}'}), b''
+
+        if path.startswith('/upload/session/'):
+            return self._upload_chunk(path.rsplit('/', 1)[-1], body or b'', headers.get('content-range', ''))
+
+        return _response(200, {'id': f'upload{next(self._ids)}'})
+
+    def _upload_chunk(self, session: str, body: bytes, content_range: str):
+        """
+        Store a chunk of a resumable upload, or answer the status of the session by 'bytes */total'
+        """
+        match = re.match(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)', content_range)
+        if match is None:
+            return _response(400, {'error': {'code': 400, 'message': f'Bad Content-Range {content_range}'}})
+
+        with self._lock:
+            stored = self._uploads[session]
+            fail = False
+            if match.group(1) is not None:
+                first = int(match.group(1))
+                if first > len(stored):
+                    return _response(400, {'error': {'code': 400, 'message': f'Chunk at {first} leaves a gap '
+                                                                             f'after {len(stored)} bytes'}})
+                if self.partial_commits > 0 or self.upload_failures > 0:
+                    # the server commits only a half of the chunk, as it may
+                    body = body[:len(body) // 2]
+                    fail = self.upload_failures > 0
+                    if fail:
+                        self.upload_failures -= 1
+                    else:
+                        self.partial_commits -= 1
+                stored[first:] = body
+
+            if fail:
+                return _response(503, {'error': {'code': 503, 'message': 'Backend Error'}})
+            total = match.group(3)
+            if total != '*' and len(stored) >= int(total):
+                file_id = f'upload{session}'
+                self.uploaded[file_id] = bytes(stored)
+                return _response(200, {'id': file_id})
+
+        info = {'status': '308'}
+        if len(stored) > 0:
+            info['range'] = f'bytes=0-{len(stored) - 1}'
+        return httplib2.Response(info), b''
+
+    def _sheets(self, path: str, method: str, body: bytes):
+        if method != 'GET':
+            with self._lock:
+                status = self.sheet_errors.pop(0) if self.sheet_errors else None
+            if status is not None:
+                return _response(status, {'error': {'code': status, 'message': 'Fake error'}})
+
+        if path.endswith(':batchUpdate') and '/values' not in path:
+            requests = json.loads(body or b'{}').get('requests', [])
+            with self._lock:
+                self.batch_updates.append(requests)
+            return _response(200, {'replies': [{} for _ in requests]})
+
+        if '/values' not in path:
+            return _response(200, {'properties': {'title': 'fake'},
+                                   'sheets': [{'properties': {'title': 'Sheet1', 'sheetId': 0, 'gridProperties': {
+                                       'rowCount': self.n_rows, 'columnCount': self.n_columns}}}]})
+
+        if method == 'GET':
+            cell = 'x' * self.cell_size
+            values = [[f'col{j}' for j in range(self.n_columns)]]
+            values.extend([cell] * self.n_columns for _ in range(self.n_rows - 1))
+            return _response(200, {'range': path.rsplit('/', 1)[-1], 'majorDimension': 'ROWS', 'values': values})
+
+        request = json.loads(body or b'{}')
+        if path.endswith(':batchUpdate'):
+            cells = sum(len(row) for data in request.get('data', []) for row in data.get('values', []))
+            return _response(200, {'totalUpdatedCells': cells, 'responses': []})
+        cells = sum(len(row) for row in request.get('values', []))
+        if path.endswith(':append'):
+            with self._lock:
+                self.appended.extend(request.get('values', []))
+            return _response(200, {'updates': {'updatedCells': cells}})
+        return _response(200, {'updatedCells': cells})
+
+
+def _response(status: int, content: dict):
+    return httplib2.Response({'status': str(status), 'content-type': 'application/json'}), json.dumps(content).encode()
+
+
+def serve(backend: FakeBackend) -> ThreadingHTTPServer:
+    """
+    Serve a fake backend by an http server on a free local port, in a daemon thread.
+    The root url of the server is set to backend.base_url. Stop it by shutdown()
+    :return: the running server
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def _handle(self) -> None:
+            body = self.rfile.read(int(self.headers.get('content-length', 0)))
+            resp, content = backend.request(backend.base_url + self.path, method=self.command, body=body,
+                                            headers=dict(self.headers.items()))
+            self.send_response(resp.status)
+            for key, value in resp.items():
+                if key not in ('status', 'content-length'):
+                    self.send_header(key, value)
+            self.send_header('content-length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    backend.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,418 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+from typing import AsyncIterator
+from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.AsyncGsuiteBase import _TRANSIENT_ERRORS, AsyncGsuiteBase
+from gworkspace_client.GsuiteBase import is_retryable, retry_delay
+from gworkspace_client.GoogleDrive import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_PART_SUFFIX, FOLDER_MIME_TYPE, MAX_PAGE_SIZE,
+                                           UPLOAD_CHUNK_SIZE, _downloaded_content, escape_query_value)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGoogleDrive(AsyncGsuiteBase):
+    """
+    An asyncio counterpart of GoogleDrive, of which methods are coroutines with the same parameters and results,
+    except that create_folder has no exists_ok, and upload_file always uploads in chunks by a resumable session,
+    without resumable and session_path
+    """
+    API_NAME = 'drive'
+    BASE_URL = 'https://www.googleapis.com'
+
+    def __init__(self, token_path: str, client_secret_path: str, session=None, pool_size: int = 100,
+                 base_url: str = None) -> None:
+        super().__init__(token_path=token_path,
+                         client_secret_path=client_secret_path,
+                         scopes=['https://www.googleapis.com/auth/drive'],
+                         session=session, pool_size=pool_size, base_url=base_url)
+
+    @staticmethod
+    def _file_path(file_id: str = None) -> str:
+        return '/drive/v3/files' + ('' if file_id is None else '/' + quote(file_id, safe=''))
+
+    async def iter_files(self, folder_id: str, name_query: str = '',
+                         fields: str = 'id, name') -> AsyncIterator[dict]:
+        """
+        Lazily iterate files under the specified folder, page by page
+        :param folder_id: id of the folder
+        :param name_query: query string of name.
+                For specific syntax, reters to https://developers.google.com/drive/api/guides/search-files
+        :param fields: comma separated file fields to retrieve. ex> 'id, name, mimeType, md5Checksum'
+        :return: an async generator of file resources(dict) with the requested fields
+        """
+        query = "'" + folder_id + "' in parents and mimeType!='" + FOLDER_MIME_TYPE + "'"
+        if len(name_query) > 0:
+            query += " and " + name_query
+
+        async for file in self._iter_query(query=query, fields=fields):
+            yield file
+
+    async def iter_folders(self, parent_id: str, name_query: str = '',
+                           fields: str = 'id, name') -> AsyncIterator[dict]:
+        """
+        Lazily iterate sub-folders under the parent folder, page by page
+        :param parent_id: id of the parent folder
+        :param name_query: query string of name.
+                For specific syntax, reters to https://developers.google.com/drive/api/guides/search-files
+        :param fields: comma separated file fields to retrieve. ex> 'id, name, modifiedTime'
+        :return: an async generator of folder resources(dict) with the requested fields
+        """
+        query = "'" + parent_id + "' in parents and mimeType='" + FOLDER_MIME_TYPE + "'"
+        if len(name_query) > 0:
+            query += " and " + name_query
+
+        async for folder in self._iter_query(query=query, fields=fields):
+            yield folder
+
+    async def _iter_query(self, query: str, fields: str = 'id, name',
+                          page_size: int = MAX_PAGE_SIZE) -> AsyncIterator[dict]:
+        page_token = None
+        while True:
+            response = await self._request('GET', self._file_path(), params={
+                'q': query,
+                'fields': f'nextPageToken, files({fields})',
+                'pageSize': page_size,
+                'pageToken': page_token})
+
+            for file in response.get('files', []):
+                yield file
+
+            page_token = response.get('nextPageToken', None)
+
+            if page_token is None:
+                break
+
+    async def list_files(self, folder_id: str, name_query: str = '') -> list:
+        """
+        List files and its id under the specified folder
+        :param folder_id: id of the folder
+        :param name_query: query string of name.
+        :return: a list of tuples, composed of (file name, file id)
+        """
+        try:
+            return [(file.get('name'), file.get('id'))
+                    async for file in self.iter_files(folder_id=folder_id, name_query=name_query)]
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def list_folders(self, parent_id: str, name_query: str = '') -> list:
+        """
+        List sub-folders under the parent folder
+        :param parent_id: id of the parent folder
+        :param name_query: query string of name.
+        :return: a list of tuples, composed of (folder name, folder id)
+        """
+        try:
+            return [(folder.get('name'), folder.get('id'))
+                    async for folder in self.iter_folders(parent_id=parent_id, name_query=name_query)]
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def file_exists(self, parent_id: str, file_id_or_name: str) -> bool:
+        """
+        Test if the folder or file exists
+        :param parent_id: id of a parent folder to search
+        :param file_id_or_name: name or id of a file to be tested if exists
+        :return: boolean result of test
+        """
+        try:
+            query = "'" + parent_id + "' in parents and name = '" + escape_query_value(file_id_or_name) + "'"
+            response = await self._request('GET', self._file_path(),
+                                           params={'q': query, 'fields': 'files(id)', 'pageSize': 1})
+            if len(response.get('files', [])) > 0:
+                return True
+
+            file = await self._request('GET', self._file_path(file_id_or_name), params={'fields': 'parents'})
+            return parent_id in file.get('parents', [])
+
+        except HttpError as error:
+            if error.resp.status != 404:
+                logger.error('An error occurred: %s', error)
+
+        return False
+
+    async def get_file_ids(self, folder_id: str, file_name: str) -> list:
+        """
+        Find a list of file id, of which name matched the specifed file name
+        :param folder_id: parent folder id
+        :param file_name: the file name that want to find
+        :return: a list of tuple of (id, file name)
+        """
+        query = "'" + folder_id + "' in parents and name = '" + escape_query_value(file_name) + "'"
+        try:
+            return [(file.get('id'), file.get('name')) async for file in self._iter_query(query=query)]
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return []
+
+    async def grant_permission(self, user_email: str, file_id: str, permission_type: str) -> list:
+        """
+        Grant access permission to the user on the file
+        :param user_email: user email
+        :param file_id: the file id
+        :param permission_type: a type of permission := {reader, commenter, editor}
+        :return: list of id
+        """
+        user_permission = {
+            'type': 'user',
+            'role': permission_type,
+            'emailAddress': user_email
+        }
+        try:
+            permission = await self._request('POST', self._file_path(file_id) + '/permissions',
+                                             params={'fields': 'id'}, body=user_permission)
+            return [permission.get('id')]
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def create_folder(self, parent_folder_id: str, sub_folder_name: str) -> str:
+        """
+        Create a folder with under the specific folder(parent)
+        :param parent_folder_id: id of parent folder
+        :param sub_folder_name: name of the folder to create
+        :return: id of the created folder
+        """
+        return await self._create({
+            'name': sub_folder_name,
+            "parents": [parent_folder_id],
+            'mimeType': FOLDER_MIME_TYPE
+        })
+
+    async def create_file(self, folder_id: str, filename: str, filetype: str) -> str:
+        """
+        Create a file in specified folder
+        :param folder_id: id of parent folder to create this file
+        :param filename: name of this file
+        :param filetype:  type of this file := {'spreadsheet'}
+        :return: id of the created file
+        """
+        return await self._create({
+            'name': filename,
+            "parents": [folder_id],
+            'mimeType': f'application/vnd.google-apps.{filetype}'
+        })
+
+    async def _create(self, file_metadata: dict) -> str:
+        try:
+            file = await self._request('POST', self._file_path(), params={'fields': 'id'}, body=file_metadata)
+            return file.get('id')
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def copy_file(self, source_file_id: str, target_folder_id: str, filename: str) -> str:
+        """
+        Copy a file to the target_folder
+        :param source_file_id: id of source file to be copied
+        :param target_folder_id: id of parent folder
+        :param filename: name of the copied file
+        :return: id of the copied file
+        """
+        file_metadata = {
+            'name': filename,
+            "parents": [target_folder_id],
+        }
+        try:
+            file = await self._request('POST', self._file_path(source_file_id) + '/copy', params={'fields': 'id'},
+                                       body=file_metadata)
+            return file.get('id')
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def move_file_to_folder(self, file_id: str, folder_id: str) -> list:
+        """
+        Move a file to a folder
+        :param file_id: id of the file to move
+        :param folder_id: id of the folder
+        :return: parent id
+        """
+        try:
+            file = await self._request('GET', self._file_path(file_id), params={'fields': 'parents'})
+            file = await self._request('PATCH', self._file_path(file_id), body={}, params={
+                'addParents': folder_id,
+                'removeParents': ",".join(file.get('parents')),
+                'fields': 'id, parents'})
+            return file.get('parents')
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def upload_file(self, folder_id: str, local_file_path: str, mimetype: str,
+                          chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+        """
+        Upload a file to a folder by a resumable upload session, reading the file chunk by chunk
+        :param folder_id: id of the folder to upload
+        :param local_file_path: a path of the file to upload
+        :param mimetype: mimetype of the file. ex> image/jpeg, image/png and so on.
+        :param chunk_size: size of a chunk in bytes. It must be a multiple of 256KB
+        :return: id of the uploaded file in the drive, or none if failed
+        """
+        file_metadata = {
+            'name': os.path.basename(local_file_path),
+            "parents": [folder_id],
+        }
+        size = os.path.getsize(local_file_path)
+        loop = asyncio.get_running_loop()
+
+        try:
+            async with self._open('POST', '/upload' + self._file_path(), body=file_metadata,
+                                  params={'uploadType': 'resumable', 'fields': 'id'},
+                                  headers={'X-Upload-Content-Type': mimetype,
+                                           'X-Upload-Content-Length': str(size)}) as response:
+                session_uri = response.headers['Location']
+
+            with open(local_file_path, 'rb') as f:
+                offset = 0
+                failures = 0
+                while True:
+                    # the file is read in a thread, not to block the event loop
+                    chunk = await loop.run_in_executor(None, _read_at, f, offset, chunk_size)
+                    if len(chunk) > 0:
+                        content_range = f'bytes {offset}-{offset + len(chunk) - 1}/{size}'
+                    else:
+                        content_range = f'bytes */{size}'
+                    try:
+                        # not retried by _send with the same chunk, since the server may have stored a part of it
+                        offset, file = await self._upload_chunk(session_uri, chunk, content_range, max_retries=0)
+                    except (HttpError, *_TRANSIENT_ERRORS) as error:
+                        if failures >= self.MAX_RETRIES or not (isinstance(error, _TRANSIENT_ERRORS)
+                                                                or is_retryable(error)):
+                            raise
+                        delay = retry_delay(error, failures)
+                        self.rate_limiter.record_backoff(delay)
+                        await asyncio.sleep(delay)
+                        failures += 1
+                        # resume from the offset the server has committed
+                        offset, file = await self._upload_chunk(session_uri, b'', f'bytes */{size}')
+                    else:
+                        failures = 0
+
+                    if file is not None:
+                        return file.get('id')
+                    if len(chunk) == 0 and offset >= size:
+                        return None
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+    async def _upload_chunk(self, session_uri: str, chunk: bytes, content_range: str,
+                            max_retries: int = None) -> tuple:
+        """
+        Send a chunk to a resumable upload session, or query the status of the session by an empty chunk
+        :return: a tuple of (the offset committed by the server, the file resource if the upload has completed)
+        """
+        async with self._open('PUT', session_uri, data=chunk, headers={'Content-Range': content_range},
+                              max_retries=max_retries) as response:
+            content = await response.read()
+            if response.status == 308:
+                # an incomplete upload, with the committed bytes in the Range header. ex> bytes=0-524287
+                committed = response.headers.get('Range')
+                return (int(committed.rsplit('-', 1)[-1]) + 1 if committed else 0), None
+            return None, json.loads(content) if content else {}
+
+    async def iter_download(self, file_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Download a file as an async iterator of chunks
+        :param file_id: the id of the file to download
+        :param chunk_size: the maximum size of a chunk in bytes
+        :return: an async generator of chunks in bytes
+        """
+        async with self._open('GET', self._file_path(file_id), params={'alt': 'media'}) as response:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def iter_export(self, file_id: str, mime_type: str,
+                          chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Export a Google Workspace Document as an async iterator of chunks
+        :param file_id: the id of the file to export
+        :param mime_type: a mime type of file, which should conforms to Google's MIME type
+        :param chunk_size: the maximum size of a chunk in bytes
+        :return: an async generator of chunks in bytes
+        """
+        async with self._open('GET', self._file_path(file_id) + '/export',
+                              params={'mimeType': mime_type}) as response:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def download_file(self, file_id: str, download_filepath: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                            return_bytes: bool = False, as_mmap: bool = False):
+        """
+        Download a file from the google drive, streaming it into the local file
+        :param file_id: the id of the file to download
+        :param download_filepath: a full local file path including a filename
+        :param chunk_size: the maximum size of a chunk in bytes
+        :param return_bytes: to read and return the downloaded content in bytes, which holds the whole content
+                             in memory. By default, returns download_filepath
+        :param as_mmap: to return a read-only mmap of the downloaded file instead of a copy of the content
+        :return: the file path, a mmap of the downloaded file, or its content in bytes if return_bytes
+        """
+        return await self._save(self.iter_download(file_id, chunk_size=chunk_size), download_filepath,
+                                return_bytes=return_bytes, as_mmap=as_mmap)
+
+    async def export_file(self, file_id: str, export_path: str, mime_type: str,
+                          chunk_size: int = DOWNLOAD_CHUNK_SIZE, return_bytes: bool = False, as_mmap: bool = False):
+        """
+        Export a Google Workspace Document from the google drive, streaming it into the local file
+        :param file_id: the id of the file to download
+        :param export_path: a local file path including a filename
+        :param mime_type: a mime type of file, which should conforms to Google's MIME type
+        :param chunk_size: the maximum size of a chunk in bytes
+        :param return_bytes: to read and return the exported content in bytes, which holds the whole content
+                             in memory. By default, returns export_path
+        :param as_mmap: to return a read-only mmap of the exported file instead of a copy of the content
+        :return: the file path, a mmap of the exported file, or its content in bytes if return_bytes
+        """
+        return await self._save(self.iter_export(file_id, mime_type=mime_type, chunk_size=chunk_size), export_path,
+                                return_bytes=return_bytes, as_mmap=as_mmap)
+
+    @staticmethod
+    async def _save(chunks: AsyncIterator[bytes], local_path: str, return_bytes: bool, as_mmap: bool):
+        tmp_path = local_path + DOWNLOAD_PART_SUFFIX
+        try:
+            loop = asyncio.get_running_loop()
+            # the file is written in a thread, not to block the event loop
+            out = await loop.run_in_executor(None, open, tmp_path, 'wb')
+            try:
+                async for chunk in chunks:
+                    await loop.run_in_executor(None, out.write, chunk)
+            finally:
+                await loop.run_in_executor(None, out.close)
+            os.replace(tmp_path, local_path)
+            return await loop.run_in_executor(None, functools.partial(_downloaded_content, local_path,
+                                                                      return_bytes=return_bytes, as_mmap=as_mmap))
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+        except IOError as ioe:
+            logger.error('An IO error while storing a file %s', ioe)
+            return None
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _read_at(f, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    return f.read(size)
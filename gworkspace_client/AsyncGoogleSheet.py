@@ -0,0 +1,177 @@
+import logging
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.AsyncGsuiteBase import AsyncGsuiteBase
+from gworkspace_client.GoogleSheet import add_sheet_request, resize_request
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGoogleSheet(AsyncGsuiteBase):
+    """
+    An asyncio counterpart of GoogleSheet, of which methods are coroutines with the same parameters and results
+    """
+    API_NAME = 'sheets'
+    BASE_URL = 'https://sheets.googleapis.com'
+
+    def __init__(self, token_path: str, client_secret_path: str, url_or_id: str = None, session=None,
+                 pool_size: int = 100, base_url: str = None) -> None:
+        super().__init__(token_path=token_path,
+                         client_secret_path=client_secret_path,
+                         scopes=['https://www.googleapis.com/auth/spreadsheets'],
+                         session=session, pool_size=pool_size, base_url=base_url)
+        if url_or_id.startswith('https://docs.google.com'):
+            self.sheet_url = url_or_id
+            self.sheet_id = self.sheet_url.split('/')[-1]
+        else:
+            self.sheet_id = url_or_id
+            self.sheet_url = "https://docs.google.com/spreadsheets/d/" + self.sheet_id
+
+    def _path(self, suffix: str = '') -> str:
+        return '/v4/spreadsheets/' + quote(self.sheet_id, safe='') + suffix
+
+    def _values_path(self, range_name: str, suffix: str = '') -> str:
+        return self._path('/values/' + quote(range_name, safe='') + suffix)
+
+    async def read_single_sheet(self, sheet_title: str) -> 'pd.DataFrame':
+        """
+        Read a sheet and return as a pandas DataFrame format
+        :param sheet_title: title of a sheet to read
+        :return: dataframe format of a sheet
+        """
+        import pandas as pd
+
+        raw_data = await self._request('GET', self._values_path(sheet_title))
+        return pd.DataFrame.from_records(raw_data.get("values", []))
+
+    async def get_sheet_titles(self) -> list:
+        """
+        Get titles of all sheets
+        :return: list of sheet title
+        """
+        try:
+            sheet_titles = await self._request('GET', self._path(), params={'fields': 'sheets(properties(title))'})
+            return [v['properties']['title'] for v in sheet_titles['sheets']]
+
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
+            return error
+
+    async def create_sheet_file(self, sheet_name: str, df: 'pd.DataFrame', folder_id: str,
+                                sheet_title: str = 'Sheet1', drive_token_path: str = '',
+                                drive_client_secret_path: str = ''):
+        """
+        Create a sheet file from the pandas data frame at the folder.
+        The drive client shares the session of this client
+        :param sheet_name: name of this spreadsheet file
+        :param df: input data frame
+        :param folder_id: id of parent folder
+        :param sheet_title: title of this sheet in this spreadsheet file
+        :param drive_token_path: optional token path to control drive.
+                                If not specified, will use this object's token path
+        :param drive_client_secret_path: optional client secret path to control drive.
+                                If not specified, will use this object's client secret path
+        :return: result of updates
+        """
+        from gworkspace_client.AsyncGoogleDrive import AsyncGoogleDrive
+
+        if drive_token_path != '' and drive_client_secret_path != '':
+            _token_path = drive_token_path
+            _client_secret_path = drive_client_secret_path
+        else:
+            _token_path = self.token_path
+            _client_secret_path = self.client_secret_path
+
+        _gdrive = await AsyncGoogleDrive.create(token_path=_token_path, client_secret_path=_client_secret_path,
+                                                session=self.session)
+        _sheet_id = await _gdrive.create_file(folder_id=folder_id, filename=sheet_name, filetype='spreadsheet')
+
+        self.sheet_id = _sheet_id
+        self.sheet_url = "https://docs.google.com/spreadsheets/d/" + _sheet_id
+
+        return await self.write_sheet(title=sheet_title, df=df)
+
+    async def write_sheet(self, title: str, df: 'pd.DataFrame'):
+        """
+        Write or update sheet from the data frame
+        :param title: title of sheet
+        :param df: dataframe to write or update
+        :return: result of updates
+        """
+        # Filling NA with empty string to avoid 404 error
+        df = df.fillna('')
+        values = [df.columns.to_list()]
+        values.extend(df.values.tolist())
+
+        # the values are written from A1, and the range expands to fit them
+        return await self.update_values(range_name=title + '!A1', _values=values)
+
+    async def resize_cells(self, sheet_number: int, dimension: str, start_index: int, end_index: int, size: int):
+        """
+        Resize cell width or height within the specified range
+        :param sheet_number: The ordinal number of sheet. The sheet_number of first sheet is 0
+        :param dimension: Must be 'ROWS' or 'COLUMNS'
+        :param start_index: Start index of rows or columns to resize
+        :param end_index: End index of rows or columns to resize.
+        :param size: The size of rows or columns in pixel unit
+        :return:
+        """
+        return await self._batch_update(resize_request(sheet_number, dimension, start_index, end_index, size))
+
+    async def add_sheet(self, sheet_title: str):
+        """
+        Add a new empty sheet to the current google sheet file
+        :param sheet_title: the title of new empty sheet to be added
+        :return:
+        """
+        return await self._batch_update(add_sheet_request(sheet_title))
+
+    async def _batch_update(self, request: dict):
+        try:
+            return await self._request('POST', self._path(':batchUpdate'), body={'requests': [request]})
+
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
+            return error
+
+    async def update_values(self, range_name: str, _values: list, value_input_option: str = "USER_ENTERED"):
+        """
+        Batch update the specified range with _values
+        :param range_name: name of range
+        :param value_input_option: the name of option for value input
+        :param _values: list of value to update
+        :return: result of updates
+        """
+        try:
+            result = await self._request('PUT', self._values_path(range_name),
+                                         params={'valueInputOption': value_input_option}, body={'values': _values})
+            logger.info("%s cells updated.", result.get('updatedCells'))
+            return result
+
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
+            return error
+
+    async def append_values(self, range_name: str, _values: list, value_input_option: str = "USER_ENTERED"):
+        """
+        Append the specified range with _values
+        :param range_name: name of range
+        :param value_input_option: the name of option for value input
+        :param _values: list of value to update
+        :return: result of appends
+        """
+        try:
+            result = await self._request('POST', self._values_path(range_name, ':append'),
+                                         params={'valueInputOption': value_input_option}, body={'values': _values})
+            logger.info('%s cells appended.', result.get('updates').get('updatedCells'))
+            return result
+
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
+            return error
@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import json
+
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.GsuiteBase import GsuiteBase, is_retryable, retry_delay
+
+try:
+    import aiohttp
+except ImportError as e:
+    raise ImportError('The asyncio clients require aiohttp. Install it by `pip install gworkspace_client[async]`') \
+        from e
+
+# errors of connections, which are retried as transient errors
+_TRANSIENT_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def _http_error(response: 'aiohttp.ClientResponse', content: bytes) -> HttpError:
+    """
+    Make an HttpError of googleapiclient from a response, so the async clients raise the same errors as the others
+    """
+    import httplib2
+
+    resp = httplib2.Response({k.lower(): v for k, v in response.headers.items()})
+    resp.status = response.status
+    resp.reason = response.reason
+    return HttpError(resp, content, uri=str(response.url))
+
+
+class AsyncGsuiteBase(GsuiteBase):
+    """
+    A base class of the asyncio clients, which call the REST APIs by aiohttp instead of googleapiclient.
+    Requests share a connection pool of an aiohttp session, and are rate limited and retried like the other clients.
+    The constructor loads the token, and refreshes or issues it if needed, which blocks. Within a coroutine,
+    create a client by `await create(...)` instead, which does it in a thread
+    """
+    BASE_URL = None
+
+    def __init__(self, token_path: str, client_secret_path: str, scopes: list,
+                 session: 'aiohttp.ClientSession' = None, pool_size: int = 100, base_url: str = None) -> None:
+        """
+        :param session: optional aiohttp session to share its connection pool with other clients.
+                        If not specified, the client creates its own session, closed by close()
+        :param pool_size: the maximum number of connections of the session created by the client
+        :param base_url: optional root url of the API, ex> a local fake server for tests
+        """
+        super().__init__(token_path=token_path, client_secret_path=client_secret_path, scopes=scopes)
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.pool_size = pool_size
+        self._session = session
+        self._owns_session = session is None
+        self._refresh_lock = None
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """
+        Create a client within a coroutine, loading the token in a thread not to block the event loop
+        ex>
+            async with await AsyncGoogleDrive.create(token_path, client_secret_path) as gdrive:
+                files = await gdrive.list_files(folder_id)
+        :param args: arguments of the constructor
+        :param kwargs: keyword arguments of the constructor
+        :return: the client
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(cls, *args, **kwargs))
+
+    def get_service(self) -> 'aiohttp.ClientSession':
+        return self.session
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        """
+        The aiohttp session of this client. It must be used within a running event loop
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Close the session, if it was created by this client
+        """
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _auth_headers(self) -> dict:
+        """
+        Get the authorization header, refreshing the token in a thread if it has expired
+        """
+        if self.creds is None:
+            return {}
+
+        if not self.creds.valid:
+            if self._refresh_lock is None:
+                self._refresh_lock = asyncio.Lock()
+            async with self._refresh_lock:
+                if not self.creds.valid:
+                    from google.auth.transport.requests import Request
+
+                    await asyncio.get_running_loop().run_in_executor(None, self.creds.refresh, Request())
+
+        return {'Authorization': 'Bearer ' + self.creds.token}
+
+    async def _request(self, method: str, path: str, params: dict = None, body: dict = None, data=None,
+                       headers: dict = None, max_retries: int = None):
+        """
+        Send a request under the rate limit of the API, retrying on a rate limit or a transient error
+        :param method: http method
+        :param path: a path under base_url, or an absolute url
+        :param params: query parameters
+        :param body: a json body
+        :param data: a raw body
+        :param headers: additional headers
+        :param max_retries: the maximum number of retries. Defaults to MAX_RETRIES
+        :return: the parsed json response, or None if the response has no content
+        """
+        async with self._open(method, path, params=params, body=body, data=data, headers=headers,
+                              max_retries=max_retries) as response:
+            content = await response.read()
+            return json.loads(content) if content else None
+
+    def _open(self, method: str, path: str, **kwargs) -> '_Response':
+        """
+        Open a response to read by an async context manager, ex> for streaming the body
+        """
+        return _Response(self, method, path, **kwargs)
+
+    async def _send(self, method: str, path: str, params: dict = None, body: dict = None, data=None,
+                    headers: dict = None, max_retries: int = None) -> 'aiohttp.ClientResponse':
+        url = path if path.startswith('http') else self.base_url + path
+        max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        params = {k: ('true' if v is True else 'false' if v is False else v)
+                  for k, v in (params or {}).items() if v is not None}
+        limiter = self.rate_limiter
+
+        attempt = 0
+        while True:
+            await asyncio.sleep(limiter.reserve())
+            try:
+                _headers = dict(headers or {}, **await self._auth_headers())
+                # redirects are not followed, as 308 of the resumable upload means an incomplete upload
+                response = await self.session.request(method, url, params=params, json=body, data=data,
+                                                      headers=_headers, allow_redirects=False)
+                if response.status < 400:
+                    return response
+
+                content = await response.read()
+                response.release()
+                error = _http_error(response, content)
+            except _TRANSIENT_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                error = e
+            else:
+                if attempt >= max_retries or not is_retryable(error):
+                    raise error
+
+            delay = retry_delay(error, attempt)
+            limiter.record_backoff(delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class _Response:
+    """
+    An async context manager of a response of AsyncGsuiteBase._send, which releases the connection on exit
+    """
+
+    def __init__(self, client: AsyncGsuiteBase, method: str, path: str, **kwargs) -> None:
+        self.client = client
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self) -> 'aiohttp.ClientResponse':
+        self.response = await self.client._send(self.method, self.path, **self.kwargs)
+        return self.response
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.response.release()
+
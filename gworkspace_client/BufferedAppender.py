@@ -0,0 +1,253 @@
+import json
+import logging
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.GoogleSheet import MAX_PAYLOAD_BYTES, GoogleSheet
+from gworkspace_client.GsuiteBase import is_retryable, retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedAppender:
+    """
+    Append rows to a sheet in the background, buffering them to send many rows by an append request.
+    A background thread flushes the buffer when it reaches max_rows or max_bytes, or when the oldest buffered row
+    has waited for flush_interval seconds. append() blocks while the buffer is full, so a fast producer is slowed
+    down to the rate of the API instead of growing the buffer without bound.
+    Rows are removed from the buffer only after they are appended, so a failed append is retried with the same
+    rows, and a row is appended at least once. A request failed after it was applied may append its rows twice.
+    The appender fails on an error which retrying does not help, ex> 400 of a bad range, or after max_failures
+    failures in a row. Then the rows are left in the buffer, and append(), extend() and flush() raise the error
+    ex>
+        with BufferedAppender(gsheet, 'events') as appender:
+            for event in events:
+                appender.append([event.time, event.name])
+    """
+
+    def __init__(self, gsheet: GoogleSheet, range_name: str, max_rows: int = 1000,
+                 max_bytes: int = MAX_PAYLOAD_BYTES, flush_interval: float = 5.0, max_buffered_rows: int = 10000,
+                 value_input_option: str = "USER_ENTERED", close_retries: int = 5, max_failures: int = 10) -> None:
+        """
+        :param gsheet: the sheet client to append by
+        :param range_name: name of range to append to. ex> 'Sheet1', 'Sheet1!A:C'
+        :param max_rows: the number of buffered rows to flush at, and the maximum number of rows of a request
+        :param max_bytes: the size of buffered rows to flush at, and the maximum size of a request
+        :param flush_interval: seconds the oldest buffered row waits at most before a flush
+        :param max_buffered_rows: the capacity of the buffer, at which append() blocks
+        :param value_input_option: the name of option for value input
+        :param close_retries: the number of retries of a failed flush on close, before close() gives up and raises
+        :param max_failures: the number of failed requests in a row, at which the appender fails
+        """
+        self.gsheet = gsheet
+        self.range_name = range_name
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_buffered_rows = max(max_buffered_rows, max_rows)
+        self.value_input_option = value_input_option
+        self.close_retries = close_retries
+        self.max_failures = max_failures
+
+        # rows, their sizes and the times they were buffered at, from the oldest
+        self._rows = []
+        self._sizes = []
+        self._times = []
+        self._bytes = 0
+        # the number of rows to flush regardless of the thresholds, i.e. the rows buffered when flush() was called
+        self._flush_rows = 0
+        self._closed = False
+        self._failed = False
+        self._cond = threading.Condition()
+
+        self.appended_rows = 0
+        self.requests = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name='BufferedAppender', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        """
+        The number of rows not appended yet
+        """
+        with self._cond:
+            return len(self._rows)
+
+    def append(self, row: list, timeout: float = None) -> None:
+        """
+        Add a row to the buffer, blocking while the buffer is full
+        :param row: a list of cell values
+        :param timeout: seconds to wait at most for room in the buffer. None waits forever
+        """
+        self.extend([row], timeout=timeout)
+
+    def extend(self, rows: list, timeout: float = None) -> None:
+        """
+        Add rows to the buffer, blocking while the buffer is full
+        :param rows: a list of rows
+        :param timeout: seconds to wait at most for room in the buffer. None waits forever
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for row in rows:
+            size = len(json.dumps(row, default=str))
+            with self._cond:
+                while len(self._rows) >= self.max_buffered_rows and not self._closed and not self._failed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f'The buffer of {len(self._rows)} rows is full')
+                    self._cond.wait(remaining)
+
+                self._raise_if_failed()
+                if self._closed:
+                    raise ValueError('The appender is closed')
+
+                self._rows.append(row)
+                self._sizes.append(size)
+                self._times.append(time.monotonic())
+                self._bytes += size
+                # the first row starts the timer of flush_interval
+                if len(self._rows) == 1 or len(self._rows) >= self.max_rows or self._bytes >= self.max_bytes:
+                    self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Flush the buffer now, and wait until the rows added so far are appended
+        :param timeout: seconds to wait at most. None waits forever
+        :return: True if all the rows are appended, False if timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._raise_if_failed()
+            target = self.appended_rows + len(self._rows)
+            self._flush_rows = len(self._rows)
+            self._cond.notify_all()
+            while self.appended_rows < target and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._raise_if_failed()
+            return self.appended_rows >= target
+
+    def _raise_if_failed(self) -> None:
+        """
+        Raise the error the appender failed on. Called with the lock held
+        """
+        if self._failed:
+            raise self.last_error
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Stop accepting rows, and append all the buffered rows before returning.
+        A failed flush is retried up to close_retries times, then the last error is raised with the rows
+        left in the buffer, which can be taken by pending()
+        :param timeout: seconds to wait at most for the background thread. None waits forever.
+                        TimeoutError is raised if rows are left in the buffer when timed out
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+        with self._cond:
+            if self._rows and self.last_error is not None:
+                raise self.last_error
+            if self._rows and self._thread.is_alive():
+                # the background thread goes on appending them
+                raise TimeoutError(f'{len(self._rows)} rows are not appended yet')
+
+    def pending(self) -> list:
+        """
+        :return: a copy of the rows not appended yet
+        """
+        with self._cond:
+            return list(self._rows)
+
+    def _take(self) -> list:
+        """
+        Get the oldest rows to send by a request, up to max_rows and max_bytes. Called with the lock held
+        """
+        count = 0
+        size = 0
+        for row_size in self._sizes[:self.max_rows]:
+            if count > 0 and size + row_size > self.max_bytes:
+                break
+            count += 1
+            size += row_size
+        return self._rows[:count]
+
+    def _due(self) -> bool:
+        if not self._rows:
+            return False
+        return (self._closed or self._flush_rows > 0 or len(self._rows) >= self.max_rows
+                or self._bytes >= self.max_bytes
+                or time.monotonic() - self._times[0] >= self.flush_interval)
+
+    def _run(self) -> None:
+        # the http object of a service is not thread-safe, so the thread uses its own service,
+        # or the shared one with the 'pooled' transport
+        service = self.gsheet.get_service()
+        failures = 0
+
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._rows:
+                        timeout = max(self._times[0] + self.flush_interval - time.monotonic(), 0)
+                    self._cond.wait(timeout)
+                rows = self._take()
+
+            try:
+                self.gsheet._append_values(range_name=self.range_name, _values=rows,
+                                           value_input_option=self.value_input_option, service=service)
+            except Exception as error:
+                logger.error("An error occurred: %s", error)
+                with self._cond:
+                    self.last_error = error
+                    failures += 1
+                    if _is_fatal(error) or failures >= self.max_failures:
+                        # fail, leaving the rows in the buffer for pending()
+                        self._failed = True
+                        self._cond.notify_all()
+                        return
+                    if self._closed and failures > self.close_retries:
+                        # give up, leaving the rows in the buffer for close() to report
+                        self._cond.notify_all()
+                        return
+                    # the error was already retried if transient, so wait longer before trying the same rows
+                    self._cond.wait(retry_delay(error, failures))
+                continue
+
+            with self._cond:
+                failures = 0
+                self.last_error = None
+                del self._rows[:len(rows)]
+                self._bytes -= sum(self._sizes[:len(rows)])
+                del self._sizes[:len(rows)]
+                # the rows left keep their times, so the oldest of them waits no longer than flush_interval
+                del self._times[:len(rows)]
+                self.appended_rows += len(rows)
+                # a requested flush is served by these rows, and the rest of it by the next requests
+                self._flush_rows = max(self._flush_rows - len(rows), 0)
+                self.requests += 1
+                self._cond.notify_all()
+
+
+def _is_fatal(error: Exception) -> bool:
+    """
+    Test if a failed append would fail again on retries, i.e. a client error other than a timeout or a rate limit
+    """
+    return (isinstance(error, HttpError) and 400 <= error.resp.status < 500 and error.resp.status not in (408, 429)
+            and not is_retryable(error))
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable
+
+from gworkspace_client.GoogleDrive import DOWNLOAD_PART_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCache:
+    """
+    An on-disk cache of downloaded and exported Drive files, shared by processes.
+    A cached content is keyed by the file id, its md5Checksum and version, and the mime type of an export,
+    so a changed file is never served from the cache. Before serving a cached content, the key is checked against
+    the file metadata by a cheap files().get, which is skipped within ttl seconds after the last check.
+    Contents are evicted in least recently used order to keep the cache under max_bytes.
+    Every file of the cache is written to a temporary file and renamed into place, so a reader never sees a
+    partial file, and processes sharing the cache only race on which of the same contents is kept
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024, ttl: float = 0.0) -> None:
+        """
+        :param cache_dir: the directory of the cache, created if not exists
+        :param max_bytes: the maximum total size of cached contents
+        :param ttl: seconds after the last metadata check of a file, in which its cached content is served without
+                    checking again. 0 checks on every hit
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._objects_dir = os.path.join(cache_dir, 'objects')
+        self._refs_dir = os.path.join(cache_dir, 'refs')
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._refs_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_id: str, metadata: dict, mime_type: str = None) -> str:
+        """
+        Make the cache key of a content
+        :param file_id: id of the file
+        :param metadata: a file resource with md5Checksum and version
+        :param mime_type: the mime type of an export, or None for a download
+        :return: the key, which is a name of a content file
+        """
+        key = json.dumps([file_id, metadata.get('md5Checksum'), metadata.get('version'), mime_type])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _ref_path(self, file_id: str, mime_type: str) -> str:
+        name = hashlib.sha256(json.dumps([file_id, mime_type]).encode()).hexdigest()
+        return os.path.join(self._refs_dir, name + '.json')
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self._objects_dir, key)
+
+    def fetch(self, file_id: str, local_path: str, download: Callable[[str], None],
+              get_metadata: Callable[[], dict], mime_type: str = None) -> bool:
+        """
+        Put the content of a file at local_path, from the cache if it holds the current content,
+        or by downloading it otherwise
+        :param file_id: id of the file
+        :param local_path: a local file path to write
+        :param download: a function downloading the content to the given path
+        :param get_metadata: a function getting the file resource with md5Checksum and version
+        :param mime_type: the mime type of an export, or None for a download
+        :return: True if served from the cache
+        """
+        ref_path = self._ref_path(file_id, mime_type)
+        ref = _read_json(ref_path)
+        if ref is not None and time.time() - ref['checked'] < self.ttl and self._serve(ref['key'], local_path):
+            self.hits += 1
+            return True
+
+        key = self.make_key(file_id, get_metadata(), mime_type)
+        if self._serve(key, local_path):
+            _write_json(ref_path, {'key': key, 'checked': time.time()})
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        download(local_path)
+        self._store(key, local_path)
+        _write_json(ref_path, {'key': key, 'checked': time.time()})
+        self.evict()
+        return False
+
+    def _serve(self, key: str, local_path: str) -> bool:
+        """
+        Copy a cached content to local_path, and mark it recently used
+        :return: False if the content is not cached
+        """
+        object_path = self._object_path(key)
+        tmp_path = local_path + DOWNLOAD_PART_SUFFIX
+        try:
+            shutil.copyfile(object_path, tmp_path)
+        except FileNotFoundError:
+            # not cached, or evicted by another process meanwhile
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        os.replace(tmp_path, local_path)
+        try:
+            os.utime(object_path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _store(self, key: str, local_path: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as out, open(local_path, 'rb') as src:
+                shutil.copyfileobj(src, out)
+            os.replace(tmp_path, self._object_path(key))
+        except OSError as error:
+            logger.warning('Failed to cache %s: %s', local_path, error)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used contents until the total size is under max_bytes
+        :return: the number of removed contents
+        """
+        entries = []
+        for entry in os.scandir(self._objects_dir):
+            if entry.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    def clear(self) -> None:
+        """
+        Remove all the cached contents and references
+        """
+        for directory in (self._objects_dir, self._refs_dir):
+            for entry in os.scandir(directory):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_json(path: str, value: dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,241 @@
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_FIELDS = 'id, name, parents, mimeType, md5Checksum, modifiedTime, trashed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT,
+    md5 TEXT,
+    modified_time TEXT
+);
+CREATE TABLE IF NOT EXISTS parents (
+    file_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    PRIMARY KEY (parent_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS parents_file_id ON parents (file_id);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+class DriveIndex:
+    """
+    A local SQLite index of Google Drive file metadata.
+    The index is seeded once by listing every file, and then kept fresh incrementally from the Changes feed
+    with the saved startPageToken. Trashed files are not kept in the index.
+    The files of the shared drives the user can access are indexed too
+    """
+
+    def __init__(self, db_path: str, service, max_staleness: float = 30.0, execute: Callable = None) -> None:
+        """
+        :param db_path: a path of the SQLite database file. ':memory:' for a non-persistent index
+        :param service: a Drive v3 service object, or any object providing files() and changes() alike
+        :param max_staleness: seconds after the last sync before a lookup syncs the index again.
+                              0 syncs on every lookup, and None never syncs automatically
+        :param execute: optional function to execute a request, ex> GoogleDrive._execute for rate limit and retries
+        """
+        self.db_path = db_path
+        self.service = service
+        self.execute = execute or (lambda request: request.execute())
+        self.max_staleness = max_staleness
+        self._lock = threading.RLock()
+        self._last_sync = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @property
+    def page_token(self) -> str:
+        """
+        The saved page token of the Changes feed, or None if the index has not been seeded yet
+        """
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'page_token'").fetchone()
+        return row[0] if row else None
+
+    def _save_page_token(self, page_token: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('page_token', ?)", (page_token,))
+
+    def _resolve(self, folder_id: str) -> str:
+        # parents hold the real id of My Drive, not its 'root' alias
+        if folder_id == 'root':
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'root_id'").fetchone()
+            if row:
+                return row[0]
+        return folder_id
+
+    def seed(self) -> int:
+        """
+        Rebuild the index by listing every file of the drive, then save the startPageToken for later syncs.
+        The token is taken before listing, so the changes made while listing are replayed by the next sync
+        :return: the number of indexed files
+        """
+        start_page_token = self.execute(self.service.changes().getStartPageToken(
+            supportsAllDrives=True)).get('startPageToken')
+        root_id = self.execute(self.service.files().get(fileId='root', fields='id')).get('id')
+
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM files')
+            self._conn.execute('DELETE FROM parents')
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root_id', ?)", (root_id,))
+
+            count = 0
+            page_token = None
+            while True:
+                response = self.execute(self.service.files().list(
+                    q='trashed = false',
+                    fields=f'nextPageToken, files({FILE_FIELDS})',
+                    pageSize=1000,
+                    pageToken=page_token,
+                    corpora='allDrives',
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True))
+
+                for file in response.get('files', []):
+                    self._upsert(file)
+                    count += 1
+
+                page_token = response.get('nextPageToken', None)
+
+                if page_token is None:
+                    break
+
+            self._save_page_token(start_page_token)
+
+        self._last_sync = time.monotonic()
+        return count
+
+    def sync(self) -> int:
+        """
+        Apply the changes made since the saved page token. Seeds the index if it has never been seeded
+        :return: the number of applied changes
+        """
+        with self._lock:
+            page_token = self.page_token
+            if page_token is None:
+                self.seed()
+                return 0
+
+            count = 0
+            with self._conn:
+                while page_token is not None:
+                    response = self.execute(self.service.changes().list(
+                        pageToken=page_token,
+                        fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))',
+                        pageSize=1000,
+                        includeItemsFromAllDrives=True,
+                        supportsAllDrives=True))
+
+                    for change in response.get('changes', []):
+                        file = change.get('file')
+                        if change.get('removed') or file is None or file.get('trashed'):
+                            self._delete(change.get('fileId'))
+                        else:
+                            self._upsert(file)
+                        count += 1
+
+                    if 'newStartPageToken' in response:
+                        self._save_page_token(response['newStartPageToken'])
+                        page_token = None
+                    else:
+                        page_token = response.get('nextPageToken')
+                        self._save_page_token(page_token)
+
+            self._last_sync = time.monotonic()
+            return count
+
+    def ensure_fresh(self) -> None:
+        """
+        Sync the index if it is older than max_staleness
+        """
+        if self.max_staleness is None and self.page_token is not None:
+            return
+        if self._last_sync is None or time.monotonic() - self._last_sync >= (self.max_staleness or 0):
+            self.sync()
+
+    def _upsert(self, file: dict) -> None:
+        self._conn.execute(
+            'INSERT OR REPLACE INTO files (id, name, mime_type, md5, modified_time) VALUES (?, ?, ?, ?, ?)',
+            (file.get('id'), file.get('name'), file.get('mimeType'), file.get('md5Checksum'),
+             file.get('modifiedTime')))
+        self._conn.execute('DELETE FROM parents WHERE file_id = ?', (file.get('id'),))
+        self._conn.executemany('INSERT INTO parents (file_id, parent_id) VALUES (?, ?)',
+                               [(file.get('id'), parent_id) for parent_id in file.get('parents', [])])
+
+    def _delete(self, file_id: str) -> None:
+        self._conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+        self._conn.execute('DELETE FROM parents WHERE file_id = ?', (file_id,))
+
+    def get(self, file_id: str) -> dict:
+        """
+        Get the indexed metadata of a file
+        :param file_id: id of the file
+        :return: a dict of id, name, parents, mimeType, md5Checksum and modifiedTime, or None if not indexed
+        """
+        self.ensure_fresh()
+        with self._lock:
+            row = self._conn.execute('SELECT id, name, mime_type, md5, modified_time FROM files WHERE id = ?',
+                                     (file_id,)).fetchone()
+            if row is None:
+                return None
+            parents = [r[0] for r in self._conn.execute('SELECT parent_id FROM parents WHERE file_id = ?',
+                                                        (file_id,))]
+        return {'id': row[0], 'name': row[1], 'parents': parents, 'mimeType': row[2], 'md5Checksum': row[3],
+                'modifiedTime': row[4]}
+
+    def list_children(self, parent_id: str, folders: bool = None) -> list:
+        """
+        List the children of a folder from the index
+        :param parent_id: id of the parent folder
+        :param folders: True for sub-folders only, False for files only, None for both
+        :return: a list of tuples, composed of (name, id)
+        """
+        query = 'SELECT f.name, f.id FROM parents p JOIN files f ON f.id = p.file_id WHERE p.parent_id = ?'
+        params = [parent_id]
+        if folders is not None:
+            query += ' AND f.mime_type ' + ('=' if folders else '!=') + ' ?'
+            params.append(FOLDER_MIME_TYPE)
+
+        self.ensure_fresh()
+        with self._lock:
+            params[0] = self._resolve(parent_id)
+            return [tuple(row) for row in self._conn.execute(query, params)]
+
+    def find(self, parent_id: str, name: str) -> list:
+        """
+        Find the children of a folder by name from the index
+        :param parent_id: id of the parent folder
+        :param name: the name to match exactly
+        :return: a list of tuples, composed of (id, name)
+        """
+        self.ensure_fresh()
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(
+                'SELECT f.id, f.name FROM parents p JOIN files f ON f.id = p.file_id '
+                'WHERE p.parent_id = ? AND f.name = ?', (self._resolve(parent_id), name))]
+
+    def contains(self, parent_id: str, file_id_or_name: str) -> bool:
+        """
+        Test if the folder has a child of the id or name, from the index
+        :param parent_id: id of the parent folder
+        :param file_id_or_name: name or id of the child
+        :return: boolean result of test
+        """
+        self.ensure_fresh()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM parents p JOIN files f ON f.id = p.file_id '
+                'WHERE p.parent_id = ? AND (f.id = ? OR f.name = ?) LIMIT 1',
+                (self._resolve(parent_id), file_id_or_name, file_id_or_name)).fetchone()
+        return row is not None
@@ -0,0 +1,355 @@
+import datetime
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.GoogleDrive import DOWNLOAD_PART_SUFFIX, UPLOAD_CHUNK_SIZE, UPLOAD_SESSION_SUFFIX, GoogleDrive
+
+logger = logging.getLogger(__name__)
+
+# file fields compared by the sync
+SYNC_FIELDS = 'id, name, mimeType, md5Checksum, size, modifiedTime, trashed'
+# local files of the transfers of this library, which are never synced.
+# They are matched by their own suffixes only, so a user file like 'video.part' is still synced
+_TRANSIENT_SUFFIXES = (UPLOAD_SESSION_SUFFIX, DOWNLOAD_PART_SUFFIX)
+# modified times closer than this in seconds are regarded as the same
+_MTIME_TOLERANCE = 1.0
+
+
+class SyncAction(NamedTuple):
+    """
+    An action of a sync, planned or done
+    """
+    # one of 'mkdir', 'upload', 'update', 'download', 'delete'
+    action: str
+    # '/' joined path relative to the synced directory
+    path: str
+    # id of the remote file or folder, or None if not created yet
+    file_id: str = None
+    # the exception raised by the action, or None if succeeded or not done yet(dry run)
+    error: Exception = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def md5sum(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the md5 checksum of a local file, in the hex digest as md5Checksum of Drive
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _parse_time(rfc3339: str) -> float:
+    # modifiedTime of Drive is in UTC with milliseconds. ex> '2024-01-31T12:34:56.789Z'
+    return datetime.datetime.fromisoformat(rfc3339.replace('Z', '+00:00')).timestamp()
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(
+        timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _parent(path: str) -> str:
+    return path.rpartition('/')[0]
+
+
+class DriveSync:
+    """
+    Mirror a local directory and a Drive folder incrementally, in either direction.
+    Both trees are listed in bulk, a local directory by os.walk and a Drive folder by GoogleDrive.walk with
+    md5Checksum, size and modifiedTime, and only new or changed files are transferred in parallel.
+    A file is regarded unchanged if its size and modified time match, and otherwise compared by md5 checksum.
+    Transferred files get the modified time of their source, so the next sync skips them without hashing.
+    Google Workspace Documents have no content to compare and are never transferred or deleted
+    ex>
+        sync = DriveSync(gdrive)
+        for action in sync.push('./reports', folder_id, delete_extraneous=True):
+            print(action)
+    """
+
+    def __init__(self, gdrive: GoogleDrive, workers: int = 4, resumable: bool = True,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE) -> None:
+        """
+        :param gdrive: the drive client to sync by
+        :param workers: the maximum number of files transferred concurrently
+        :param resumable: to upload by resumable upload sessions
+        :param chunk_size: size of a chunk in bytes for the resumable upload. It must be a multiple of 256KB
+        """
+        self.gdrive = gdrive
+        self.workers = workers
+        self.resumable = resumable
+        self.chunk_size = chunk_size
+
+    def push(self, local_dir: str, folder_id: str, dry_run: bool = False, delete_extraneous: bool = False) -> list:
+        """
+        Make the Drive folder mirror the local directory
+        :param local_dir: the local directory to read
+        :param folder_id: id of the Drive folder to update
+        :param dry_run: to plan the actions without doing them
+        :param delete_extraneous: to move the remote files and folders missing in the local directory to the trash
+        :return: a list of SyncAction, with the error of each failed action
+        """
+        local_dirs, local_files = self._local_tree(local_dir)
+        remote_folders, remote_files = self._remote_tree(folder_id)
+
+        actions = []
+        mkdirs = sorted(path for path in local_dirs if path not in remote_folders)
+        transfers = []
+        for path, (local_path, size, mtime) in local_files.items():
+            remote = remote_files.get(path)
+            if remote is None:
+                transfers.append(SyncAction('upload', path))
+            elif remote.get('md5Checksum') is None:
+                logger.warning('Skip %s, since a Google Workspace Document of the name exists', path)
+            elif self._changed(local_path, size, mtime, remote, dry_run=dry_run, pull=False):
+                transfers.append(SyncAction('update', path, remote.get('id')))
+
+        deletes = []
+        if delete_extraneous:
+            file_ids = {path: remote.get('id') for path, remote in remote_files.items()
+                        if remote.get('md5Checksum') is not None}
+            deletes = [SyncAction('delete', path, remote_folders.get(path) or file_ids.get(path))
+                       for path in _extraneous(remote_folders, file_ids, local_dirs, local_files)]
+
+        if dry_run:
+            return [SyncAction('mkdir', path) for path in mkdirs] + transfers + deletes
+
+        actions.extend(self._make_remote_folders(mkdirs, remote_folders))
+
+        def upload(action: SyncAction) -> str:
+            local_path, _, mtime = local_files[action.path]
+            _mimetype = mimetypes.guess_type(local_path)[0] or 'application/octet-stream'
+            return self.gdrive._upload(service=self.gdrive._thread_service(),
+                                       folder_id=remote_folders.get(_parent(action.path)),
+                                       local_file_path=local_path, mimetype=_mimetype, resumable=self.resumable,
+                                       chunk_size=self.chunk_size, session_path=None, file_id=action.file_id,
+                                       metadata={'modifiedTime': _format_time(mtime)})
+
+        # uploads into the folders failed to create are failed, not sent
+        transfers = [action if _parent(action.path) in remote_folders
+                     else action._replace(error=IOError(f'The parent folder of {action.path} is not created'))
+                     for action in transfers]
+        actions.extend(self._run(upload, transfers))
+        actions.extend(self._run(self._trash, deletes))
+        return actions
+
+    def pull(self, folder_id: str, local_dir: str, dry_run: bool = False, delete_extraneous: bool = False) -> list:
+        """
+        Make the local directory mirror the Drive folder
+        :param folder_id: id of the Drive folder to read
+        :param local_dir: the local directory to update
+        :param dry_run: to plan the actions without doing them
+        :param delete_extraneous: to delete the local files and directories missing in the Drive folder
+        :return: a list of SyncAction, with the error of each failed action
+        """
+        remote_folders, remote_files = self._remote_tree(folder_id)
+        local_dirs, local_files = self._local_tree(local_dir)
+
+        mkdirs = sorted(path for path in remote_folders if path != '' and path not in local_dirs)
+        transfers = []
+        for path, remote in remote_files.items():
+            if remote.get('md5Checksum') is None:
+                continue
+            local = local_files.get(path)
+            if local is None or self._changed(*local, remote, dry_run=dry_run, pull=True):
+                transfers.append(SyncAction('download', path, remote.get('id')))
+
+        deletes = []
+        if delete_extraneous:
+            deletes = [SyncAction('delete', path)
+                       for path in _extraneous(local_dirs, local_files, remote_folders, remote_files)]
+
+        if dry_run:
+            return [SyncAction('mkdir', path) for path in mkdirs] + transfers + deletes
+
+        actions = []
+        failed_dirs = []
+        for path in mkdirs:
+            try:
+                os.makedirs(os.path.join(local_dir, *path.split('/')), exist_ok=True)
+                actions.append(SyncAction('mkdir', path, remote_folders[path]))
+            except OSError as error:
+                # ex> a local file of the name of the folder
+                logger.error('An error occurred while syncing %s: %s', path, error)
+                actions.append(SyncAction('mkdir', path, remote_folders[path], error))
+                failed_dirs.append(path)
+
+        # downloads into the directories failed to create are failed, not sent
+        blocked = [action for action in transfers if any(action.path.startswith(path + '/') for path in failed_dirs)]
+        actions.extend(action._replace(error=IOError(f'The parent directory of {action.path} is not created'))
+                       for action in blocked)
+        transfers = [action for action in transfers if action not in blocked]
+
+        paths = {action.file_id: action.path for action in transfers}
+        for result in self.gdrive.download_many({file_id: os.path.join(*path.split('/'))
+                                                 for file_id, path in paths.items()},
+                                                dest_dir=local_dir, workers=self.workers):
+            path = paths[result.source]
+            if result.ok:
+                mtime = _parse_time(remote_files[path]['modifiedTime'])
+                os.utime(result.target, (mtime, mtime))
+            actions.append(SyncAction('download', path, result.source, result.error))
+
+        for action in deletes:
+            local_path = os.path.join(local_dir, *action.path.split('/'))
+            try:
+                if os.path.isdir(local_path):
+                    shutil.rmtree(local_path)
+                else:
+                    os.remove(local_path)
+                actions.append(action)
+            except OSError as error:
+                actions.append(action._replace(error=error))
+        return actions
+
+    def _changed(self, local_path: str, size: int, mtime: float, remote: dict, dry_run: bool, pull: bool) -> bool:
+        """
+        Compare a local file with a remote file, by size and modified time first, then by md5 checksum
+        """
+        if size != int(remote.get('size', -1)):
+            return True
+        remote_mtime = _parse_time(remote.get('modifiedTime'))
+        if abs(mtime - remote_mtime) < _MTIME_TOLERANCE:
+            return False
+        if md5sum(local_path) != remote.get('md5Checksum'):
+            return True
+        if pull and not dry_run:
+            # the same content, so take the remote modified time to skip hashing next time
+            os.utime(local_path, (remote_mtime, remote_mtime))
+        return False
+
+    @staticmethod
+    def _local_tree(local_dir: str) -> tuple:
+        """
+        List a local directory recursively
+        :return: a tuple of (a set of directory paths, a dict of {file path: (local path, size, mtime)}),
+                 where the paths are '/' joined and relative to local_dir. The root is ''
+        """
+        dirs = {''}
+        files = {}
+        for root, dir_names, file_names in os.walk(local_dir):
+            rel_root = os.path.relpath(root, local_dir).replace(os.sep, '/')
+            rel_root = '' if rel_root == '.' else rel_root + '/'
+            dirs.update(rel_root + name for name in dir_names)
+            for name in file_names:
+                if name.endswith(_TRANSIENT_SUFFIXES):
+                    continue
+                local_path = os.path.join(root, name)
+                stat = os.stat(local_path)
+                files[rel_root + name] = (local_path, stat.st_size, stat.st_mtime)
+        return dirs, files
+
+    def _remote_tree(self, folder_id: str) -> tuple:
+        """
+        List a Drive folder recursively, in bulk by GoogleDrive.walk
+        :return: a tuple of (a dict of {folder path: folder id}, a dict of {file path: file resource}),
+                 where the paths are '/' joined and relative to the folder. The root is ''
+        """
+        folders = {'': folder_id}
+        files = {}
+
+        def onerror(path, error):
+            raise error
+
+        for path, sub_folders, sub_files in self.gdrive.walk(folder_id, workers=self.workers, fields=SYNC_FIELDS,
+                                                              onerror=onerror):
+            prefix = '' if path == '' else path + '/'
+            for folder in sub_folders:
+                if not folder.get('trashed'):
+                    folders[prefix + folder['name']] = folder['id']
+            for file in sub_files:
+                if file.get('trashed'):
+                    continue
+                key = prefix + file['name']
+                # Drive allows files of the same name in a folder, of which the latest one is synced
+                if key in files and files[key].get('modifiedTime', '') >= file.get('modifiedTime', ''):
+                    logger.warning('Skip %s of id %s, since a newer file of the name exists', key, file['id'])
+                    continue
+                files[key] = file
+        return folders, files
+
+    def _make_remote_folders(self, paths: list, remote_folders: dict) -> list:
+        """
+        Create the remote folders level by level, in a batch request per level.
+        The ids of the created folders are added to remote_folders
+        """
+        actions = []
+        by_depth = {}
+        for path in paths:
+            by_depth.setdefault(path.count('/'), []).append(path)
+
+        for depth in sorted(by_depth):
+            futures = {}
+            with self.gdrive.batch():
+                for path in by_depth[depth]:
+                    parent, _, name = path.rpartition('/')
+                    if parent not in remote_folders:
+                        actions.append(SyncAction('mkdir', path, error=IOError(f'The parent folder of {path} '
+                                                                              f'is not created')))
+                        continue
+                    futures[path] = self.gdrive.create_folder(remote_folders[parent], name, exists_ok=False)
+
+            for path, future in futures.items():
+                try:
+                    remote_folders[path] = future.result()
+                    actions.append(SyncAction('mkdir', path, remote_folders[path]))
+                except HttpError as error:
+                    actions.append(SyncAction('mkdir', path, error=error))
+        return actions
+
+    def _trash(self, action: SyncAction) -> str:
+        # moved to the trash rather than deleted, so a mistaken sync can be undone
+        service = self.gdrive._thread_service()
+        self.gdrive._execute(service.files().update(fileId=action.file_id, body={'trashed': True}, fields='id'))
+        return action.file_id
+
+    def _run(self, func, actions: list) -> list:
+        """
+        Run the actions on a pool of worker threads
+        :param func: a function of an action, returning the file id
+        :return: a list of the actions done, with their file ids or errors
+        """
+        done = [action for action in actions if action.error is not None]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(func, action): action for action in actions if action.error is None}
+            for future in as_completed(futures):
+                action = futures[future]
+                try:
+                    done.append(action._replace(file_id=future.result()))
+                except (HttpError, IOError) as error:
+                    logger.error('An error occurred while syncing %s: %s', action.path, error)
+                    done.append(action._replace(error=error))
+        return done
+
+
+def _extraneous(dirs, files, other_dirs, other_files) -> list:
+    """
+    Find the files and directories of a tree missing in the other tree.
+    A missing directory is reported alone, without its contents
+    :param dirs: directory paths of the tree. The root is ''
+    :param files: file paths of the tree
+    :param other_dirs: directory paths of the other tree
+    :param other_files: file paths of the other tree
+    :return: a list of the paths
+    """
+    top_dirs = []
+    for path in sorted(path for path in dirs if path != '' and path not in other_dirs):
+        if not any(path.startswith(top + '/') for top in top_dirs):
+            top_dirs.append(path)
+
+    extraneous = list(top_dirs)
+    extraneous.extend(path for path in files
+                      if path not in other_files and not any(path.startswith(top + '/') for top in top_dirs))
+    return extraneous
@@ -1,26 +1,270 @@
 import io
+import json
+import logging
+import mimetypes
+import mmap
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import TYPE_CHECKING, Callable, Iterator, NamedTuple, Tuple
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 
 from gworkspace_client.GsuiteBase import GsuiteBase
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+    from gworkspace_client.DownloadCache import DownloadCache
+    from gworkspace_client.DriveIndex import DriveIndex
+
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# the largest pageSize allowed by files().list
+MAX_PAGE_SIZE = 1000
+# chunk size of resumable uploads, which must be a multiple of 256KB
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+UPLOAD_SESSION_SUFFIX = '.upload-session'
+# suffix of the temporary file a download is written to, before moved to its path
+DOWNLOAD_PART_SUFFIX = '.download-part'
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+
+class TransferResult(NamedTuple):
+    """
+    A result of a file transferred by a bulk operation
+    """
+    source: str
+    target: str
+    error: Exception = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _ChunkSink:
+    """
+    A write-only file object for MediaIoBaseDownload, which keeps the written chunks until taken
+    """
+
+    def __init__(self) -> None:
+        self._chunks = []
+        self.pending = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def take(self) -> list:
+        chunks, self._chunks = self._chunks, []
+        self.pending = 0
+        return chunks
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    A read-only binary stream over an iterator of chunks, to read a download as a file without saving it.
+    ex> pandas.read_csv(gdrive.open_export(file_id, 'text/csv'))
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = iter(chunks)
+        # a view of the rest of the current chunk, sliced without copying
+        self._buffer = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while len(self._buffer) == 0:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self) -> None:
+        # stop the generator, so the media request is not continued
+        if hasattr(self._chunks, 'close'):
+            self._chunks.close()
+        super().close()
+
+
+def escape_query_value(value: str) -> str:
+    """
+    Escape a string literal to be embedded in a query of files().list
+    :param value: a raw string value
+    :return: escaped string value, to be enclosed by single quotes
+    """
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _load_upload_session(session_path: str, session_key: dict) -> dict:
+    """
+    Load a saved resumable upload session, only if it was started for the same file
+    :return: the saved session, or None
+    """
+    try:
+        with open(session_path) as f:
+            session = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if any(session.get(k) != v for k, v in session_key.items()):
+        return None
+    return session
+
+
+def _save_upload_session(session_path: str, session: dict) -> None:
+    tmp_path = session_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(session, f)
+    os.replace(tmp_path, session_path)
+
+
+def _downloaded_content(local_path: str, return_bytes: bool, as_mmap: bool):
+    """
+    Get the content of a downloaded file in the requested form
+    :return: a read-only mmap, bytes, or the path itself
+    """
+    if as_mmap:
+        with open(local_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # an empty file cannot be mapped
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if return_bytes:
+        with open(local_path, 'rb') as f:
+            return f.read()
+    return local_path
+
 
 class GoogleDrive(GsuiteBase):
     """
     A Wrapper class of Google Drive API for a bit of improved usability
     """
+    API_NAME = 'drive'
 
-    def __init__(self, token_path: str, client_secret_path: str) -> None:
+    def __init__(self, token_path: str, client_secret_path: str, transport: str = 'httplib2',
+                 pool_size: int = 10) -> None:
+        """
+        :param transport: 'httplib2', or 'pooled' to share this client across threads. See GsuiteBase
+        :param pool_size: the maximum number of idle connections kept per host by the 'pooled' transport
+        """
         super().__init__(token_path=token_path,
                          client_secret_path=client_secret_path,
-                         scopes=['https://www.googleapis.com/auth/drive'])
+                         scopes=['https://www.googleapis.com/auth/drive'],
+                         transport=transport, pool_size=pool_size)
         self.service = self.get_service()
+        self.index = None
+        self.cache = None
 
     def get_service(self):
-        return build("drive", "v3", credentials=self.creds)
+        return self._build_service("drive", "v3")
+
+    def _thread_service(self):
+        """
+        Get a service object dedicated to the current thread.
+        The http object of a service is not thread-safe, so worker threads must not share self.service,
+        unless it is built on the thread-safe 'pooled' transport
+        :return: a service object of the current thread
+        """
+        if self.thread_safe:
+            return self.service
+        return self.get_service()
+
+    def attach_index(self, db_path: str, max_staleness: float = 30.0) -> 'DriveIndex':
+        """
+        Attach a local metadata index, so that list_files, list_folders, file_exists and get_file_ids
+        answer from the index instead of calling the API. The index is seeded on the first use,
+        and updated incrementally from the Changes feed afterwards
+        :param db_path: a path of the SQLite database file of the index
+        :param max_staleness: seconds after the last sync before a lookup syncs the index again.
+                              0 syncs on every lookup, and None never syncs automatically
+        :return: the attached index
+        """
+        from gworkspace_client.DriveIndex import DriveIndex
+
+        self.index = DriveIndex(db_path=db_path, service=self.service, max_staleness=max_staleness,
+                                execute=self._execute)
+        return self.index
+
+    def attach_cache(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024, ttl: float = 0.0) -> 'DownloadCache':
+        """
+        Attach an on-disk cache of contents, so that download_file and export_file serve an unchanged file
+        from the cache instead of downloading it again. The cache directory can be shared by processes
+        :param cache_dir: the directory of the cache
+        :param max_bytes: the maximum total size of cached contents, over which the least recently used are evicted
+        :param ttl: seconds after the last check of a file, in which its cached content is served without
+                    checking the file metadata. 0 checks on every hit
+        :return: the attached cache
+        """
+        from gworkspace_client.DownloadCache import DownloadCache
+
+        self.cache = DownloadCache(cache_dir=cache_dir, max_bytes=max_bytes, ttl=ttl)
+        return self.cache
+
+    def iter_files(self, folder_id: str, name_query: str = '', fields: str = 'id, name') -> Iterator[dict]:
+        """
+        Lazily iterate files under the specified folder, page by page
+        :param folder_id: id of the folder
+        :param name_query: query string of name.
+                For specific syntax, reters to https://developers.google.com/drive/api/guides/search-files
+        :param fields: comma separated file fields to retrieve. ex> 'id, name, mimeType, md5Checksum'
+        :return: a generator of file resources(dict) with the requested fields
+        """
+        query = "'" + folder_id + "' in parents and mimeType!='" + FOLDER_MIME_TYPE + "'"
+        if len(name_query) > 0:
+            query += " and " + name_query
+
+        return self._iter_query(query=query, fields=fields)
+
+    def iter_folders(self, parent_id: str, name_query: str = '', fields: str = 'id, name') -> Iterator[dict]:
+        """
+        Lazily iterate sub-folders under the parent folder, page by page
+        :param parent_id: id of the parent folder
+        :param name_query: query string of name.
+                For specific syntax, reters to https://developers.google.com/drive/api/guides/search-files
+        :param fields: comma separated file fields to retrieve. ex> 'id, name, modifiedTime'
+        :return: a generator of folder resources(dict) with the requested fields
+        """
+        query = "'" + parent_id + "' in parents and mimeType='" + FOLDER_MIME_TYPE + "'"
+        if len(name_query) > 0:
+            query += " and " + name_query
+
+        return self._iter_query(query=query, fields=fields)
+
+    def _iter_query(self, query: str, fields: str = 'id, name', page_size: int = MAX_PAGE_SIZE,
+                    service=None) -> Iterator[dict]:
+        """
+        Run a files().list query and yield the matched files while following the page tokens
+        :param query: a query string of files().list
+        :param fields: comma separated file fields to retrieve
+        :param page_size: the number of files per a page, up to MAX_PAGE_SIZE
+        :param service: optional service object to use instead of self.service
+        :return: a generator of file resources(dict)
+        """
+        service = service or self.service
+        page_token = None
+        while True:
+            response = self._execute(service.files().list(
+                q=query,
+                fields=f'nextPageToken, files({fields})',
+                pageSize=page_size,
+                pageToken=page_token))
+
+            yield from response.get('files', [])
+
+            page_token = response.get('nextPageToken', None)
+
+            if page_token is None:
+                break
 
     def list_files(self, folder_id: str, name_query: str = '') -> list:
         """
@@ -32,29 +276,14 @@ class GoogleDrive(GsuiteBase):
         """
 
         try:
-            file_ids = []
-            page_token = None
-            while True:
-                query = "'" + folder_id + "' in parents and mimeType!='application/vnd.google-apps.folder'"
-                if len(name_query) > 0:
-                    query += "and " + name_query
-
-                response = self.service.files().list(
-                    q=query,
-                    fields='nextPageToken, files(id, name)',
-                    pageSize=100,
-                    pageToken=page_token).execute()
+            if self.index is not None and len(name_query) == 0:
+                return self.index.list_children(parent_id=folder_id, folders=False)
 
-                for file in response.get('files', []):
-                    file_ids.append((file.get('name'), file.get('id')))
-
-                page_token = response.get('nextPageToken', None)
-
-                if page_token is None:
-                    break
+            file_ids = [(file.get('name'), file.get('id'))
+                        for file in self.iter_files(folder_id=folder_id, name_query=name_query)]
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             file_ids = None
 
         return file_ids
@@ -69,32 +298,68 @@ class GoogleDrive(GsuiteBase):
         """
 
         try:
-            folder_ids = []
-            page_token = None
-            while True:
-                query = "'" + parent_id + "' in parents and mimeType='application/vnd.google-apps.folder'"
-                if len(name_query) > 0:
-                    query += "and " + name_query
-                response = self.service.files().list(
-                    q=query,
-                    fields='nextPageToken, files(id, name)',
-                    pageSize=100,
-                    pageToken=page_token).execute()
-
-                for file in response.get('files', []):
-                    folder_ids.append((file.get('name'), file.get('id')))
-
-                page_token = response.get('nextPageToken', None)
-
-                if page_token is None:
-                    break
+            if self.index is not None and len(name_query) == 0:
+                return self.index.list_children(parent_id=parent_id, folders=True)
+
+            folder_ids = [(folder.get('name'), folder.get('id'))
+                          for folder in self.iter_folders(parent_id=parent_id, name_query=name_query)]
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             folder_ids = None
 
         return folder_ids
 
+    def walk(self, root_id: str, workers: int = 8, fields: str = 'id, name',
+             onerror: Callable[[str, HttpError], None] = None) -> Iterator[Tuple[str, list, list]]:
+        """
+        Walk the folder tree under the root folder like os.walk.
+        Folders are crawled breadth-first by a bounded pool of workers, each with its own service object,
+        and the result of a folder is yielded as soon as its listing arrives, so the order is not deterministic
+        :param root_id: id of the root folder to walk
+        :param workers: the maximum number of folders listed concurrently
+        :param fields: comma separated file fields to retrieve for each file and folder
+        :param onerror: optional callback called with (folder path, error) when listing a folder fails.
+                        The failed folder is skipped, and the walk goes on
+        :return: a generator of (path, folders, files). The path is '/' joined folder names relative to the root
+                 ('' for the root itself), and folders and files are lists of file resources(dict)
+        """
+        if 'mimeType' not in fields:
+            fields += ', mimeType'
+
+        def list_children(parent_id: str) -> Tuple[list, list]:
+            query = "'" + parent_id + "' in parents"
+            folders, files = [], []
+            for item in self._iter_query(query=query, fields=fields, service=self._thread_service()):
+                (folders if item.get('mimeType') == FOLDER_MIME_TYPE else files).append(item)
+            return folders, files
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(list_children, root_id): ''}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = pending.pop(future)
+                        try:
+                            folders, files = future.result()
+                        except HttpError as error:
+                            if onerror is not None:
+                                onerror(path, error)
+                            else:
+                                logger.error('An error occurred while listing %s: %s', path or "/", error)
+                            continue
+
+                        for folder in folders:
+                            sub_path = folder.get('name') if path == '' else path + '/' + folder.get('name')
+                            pending[executor.submit(list_children, folder.get('id'))] = sub_path
+
+                        yield path, folders, files
+            finally:
+                # the caller may stop the walk early, then drop the folders not listed yet
+                for future in pending:
+                    future.cancel()
+
     def file_exists(self, parent_id: str, file_id_or_name: str) -> bool:
         """
         Test if the folder or file exists
@@ -103,16 +368,28 @@ class GoogleDrive(GsuiteBase):
         :return: boolean result of test
         """
 
-        files = self.list_files(folder_id=parent_id)
-        folders = self.list_folders(parent_id=parent_id)
-
-        files.extend(folders)
+        try:
+            if self.index is not None:
+                return self.index.contains(parent_id=parent_id, file_id_or_name=file_id_or_name)
+
+            # 1. look up by name with a single targeted query
+            query = "'" + parent_id + "' in parents and name = '" + escape_query_value(file_id_or_name) + "'"
+            response = self._execute(self.service.files().list(q=query, fields='files(id)', pageSize=1))
+            if len(response.get('files', [])) > 0:
+                logger.info("File %s exists", file_id_or_name)
+                return True
 
-        for file_name, file_id in files:
-            if file_id == file_id_or_name or file_name == file_id_or_name:
-                print(f"File {file_id_or_name} exists")
+            # 2. otherwise treat it as an id and check its parents
+            file = self._execute(self.service.files().get(fileId=file_id_or_name, fields='parents'))
+            if parent_id in file.get('parents', []):
+                logger.info("File %s exists", file_id_or_name)
                 return True
 
+        except HttpError as error:
+            # files().get responds 404 if the name was not an id of existing file
+            if error.resp.status != 404:
+                logger.error('An error occurred: %s', error)
+
         return False
 
     def get_file_ids(self, folder_id:str, file_name:str) -> list:
@@ -124,16 +401,19 @@ class GoogleDrive(GsuiteBase):
         :return: a list of tuple of (id, file name)
         """
 
-        files = self.list_files(folder_id=folder_id)
-        folders = self.list_folders(parent_id=folder_id)
-
-        files.extend(folders)
+        query = "'" + folder_id + "' in parents and name = '" + escape_query_value(file_name) + "'"
 
         file_ids = []
-        for _file_name, _file_id in files:
-            if _file_name == file_name:
-                print(f"Found {file_name}")
-                file_ids.append((_file_id, _file_name))
+        try:
+            if self.index is not None:
+                return self.index.find(parent_id=folder_id, name=file_name)
+
+            for file in self._iter_query(query=query):
+                logger.info("Found %s", file_name)
+                file_ids.append((file.get('id'), file.get('name')))
+
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
 
         return file_ids
 
@@ -146,36 +426,46 @@ class GoogleDrive(GsuiteBase):
         :return: list of id
         """
 
-        try:
-            # create gmail api client
-            service = self.service
-            ids = []
-
-            def callback(request_id, response, exception):
-                if exception:
-                    # Handle error
-                    print(exception)
-                else:
-                    print(f'Request_Id: {request_id}')
-                    print(F'Permission Id: {response.get("id")}')
-                    ids.append(response.get('id'))
-
-            batch = service.new_batch_http_request(callback=callback)
+        ids = []
+        for (_file_id, _user_email), result in self.grant_permissions([(file_id, user_email, permission_type)]).items():
+            if isinstance(result, Exception):
+                logger.error('An error occurred: %s', result)
+                return None
+            logger.info('Permission Id: %s', result)
+            ids.append(result)
+
+        return ids
+
+    def grant_permissions(self, grants: list, batch_size: int = GsuiteBase.MAX_BATCH_SIZE,
+                          max_retries: int = None) -> dict:
+        """
+        Grant access permissions in bulk. The calls are packed into batch requests of up to batch_size,
+        and only the calls failed by a rate limit or a transient error are retried
+        :param grants: a list of tuples, composed of (file id, user email, permission type)
+                       where the permission type := {reader, commenter, editor}.
+                       A pair of file id and user email must not repeat, as a user has a single role on a file
+        :param batch_size: the maximum number of calls in a batch request
+        :param max_retries: the maximum number of retries of the failed calls. Defaults to MAX_RETRIES
+        :return: a dict of {(file id, user email): permission id}, where the value is the HttpError if failed
+        """
+
+        requests = {}
+        for file_id, user_email, permission_type in grants:
+            if (file_id, user_email) in requests:
+                raise ValueError(f'{user_email} is granted on {file_id} more than once')
             user_permission = {
                 'type': 'user',
                 'role': permission_type,
                 'emailAddress': user_email
             }
-            batch.add(service.permissions().create(fileId=file_id,
-                                                   body=user_permission,
-                                                   fields='id', ))
-            batch.execute()
+            requests[(file_id, user_email)] = self.service.permissions().create(fileId=file_id,
+                                                                                body=user_permission,
+                                                                                fields='id', )
 
-        except HttpError as error:
-            print(F'An error occurred: {error}')
-            ids = None
+        results = self._execute_batch(requests, batch_size=batch_size, max_retries=max_retries)
 
-        return ids
+        return {key: result if isinstance(result, Exception) else result.get('id')
+                for key, result in results.items()}
 
     def create_folder(self, parent_folder_id: str, sub_folder_name: str, exists_ok: bool = True) -> str:
         """
@@ -183,7 +473,8 @@ class GoogleDrive(GsuiteBase):
         :param parent_folder_id: id of parent folder
         :param sub_folder_name: name of the folder to create
         :param exists_ok: to ignore creation of folder if exists
-        :return: id of the created folder
+        :return: id of the created folder.
+                 Within a batch() context, a Future of it
         """
 
         try:
@@ -194,12 +485,14 @@ class GoogleDrive(GsuiteBase):
                 'mimeType': 'application/vnd.google-apps.folder'
             }
 
-            file = self.service.files().create(body=file_metadata, fields='id').execute()
-            print("Folder ID:", file.get('id'))
-            file_id = file.get('id')
+            def parse(file):
+                logger.info('Folder ID: %s', file.get('id'))
+                return file.get('id')
+
+            file_id = self._call(self.service.files().create(body=file_metadata, fields='id'), parse)
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             file_id = None
 
         return file_id
@@ -210,7 +503,8 @@ class GoogleDrive(GsuiteBase):
         :param folder_id: id of parent folder to create this file
         :param filename: name of this file
         :param filetype:  type of this file := {'spreadsheet'}
-        :return: id of the created file
+        :return: id of the created file.
+                 Within a batch() context, a Future of it
         """
 
         try:
@@ -220,13 +514,15 @@ class GoogleDrive(GsuiteBase):
                 "parents": [folder_id],
                 'mimeType': f'application/vnd.google-apps.{filetype}'
             }
-            file = self.service.files().create(body=file_metadata, fields='id').execute()
-            print("file name:", filename)
-            print("file id:", file.get('id'))
-            file_id = file.get('id')
+            def parse(file):
+                logger.info('file name: %s', filename)
+                logger.info('file id: %s', file.get('id'))
+                return file.get('id')
+
+            file_id = self._call(self.service.files().create(body=file_metadata, fields='id'), parse)
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             file_id = None
 
         return file_id
@@ -237,7 +533,8 @@ class GoogleDrive(GsuiteBase):
         :param source_file_id: id of source file to be copied
         :param target_folder_id: id of parent folder
         :param filename: name of the copied file
-        :return: id of the copied file
+        :return: id of the copied file.
+                 Within a batch() context, a Future of it
         """
 
         try:
@@ -251,10 +548,10 @@ class GoogleDrive(GsuiteBase):
             }
 
             # Copy the file to the new folder
-            file = self.service.files().copy(fileId=file_id, body=file_metadata, fields='id').execute()
-            copied_file_id = file.get('id')
+            copied_file_id = self._call(self.service.files().copy(fileId=file_id, body=file_metadata, fields='id'),
+                                        lambda file: file.get('id'))
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             copied_file_id = None
 
         return copied_file_id
@@ -264,111 +561,493 @@ class GoogleDrive(GsuiteBase):
         Move a file to a folder
         :param file_id: id of the file to move
         :param folder_id: id of the folder
-        :return: parent id
+        :return: parent id.
+                 Within a batch() context, a Future of it
         """
 
         try:
-            file = self.service.files().get(fileId=file_id, fields='parents').execute()
-            previous_parents = ",".join(file.get('parents'))
-            # Move the file to the new folder
-            file = self.service.files().update(fileId=file_id, addParents=folder_id,
-                                               removeParents=previous_parents,
-                                               fields='id, parents').execute()
+            def move(file):
+                previous_parents = ",".join(file.get('parents'))
+                # Move the file to the new folder
+                return self._call(self.service.files().update(fileId=file_id, addParents=folder_id,
+                                                              removeParents=previous_parents,
+                                                              fields='id, parents'),
+                                  lambda moved: moved.get('parents'))
 
-            parents = file.get('parents')
+            parents = self._call(self.service.files().get(fileId=file_id, fields='parents'), move)
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             parents = None
 
         return parents
 
-    def upload_file(self, folder_id:str, local_file_path:str, mimetype:str) -> str:
+    def upload_file(self, folder_id:str, local_file_path:str, mimetype:str, resumable: bool = False,
+                    chunk_size: int = UPLOAD_CHUNK_SIZE, session_path: str = None) -> str:
         """
         Upload a file to a folder
         :param folder_id: id of the folder to upload
         :param local_file_path: a path of the file to upload
         :param mimetype: mimetype of the file. ex> image/jpeg, image/png and so on.
                          For more details, please visit https://developer.mozilla.org/en-US/docs/Web/HTTP/Basics_of_HTTP/MIME_types
+        :param resumable: to upload in chunks by a resumable upload session.
+                          The session URI is saved in session_path, so an interrupted upload resumes
+                          from the last received chunk even after the process restarts
+        :param chunk_size: size of a chunk in bytes for the resumable upload. It must be a multiple of 256KB
+        :param session_path: a path to save the resumable session. Defaults to local_file_path + '.upload-session'
         :return: id of the uploaded file in the drive, or none if failed
         """
-        filename = os.path.basename(local_file_path)
 
         try:
+            file_id = self._upload(service=self.service, folder_id=folder_id, local_file_path=local_file_path,
+                                   mimetype=mimetype, resumable=resumable, chunk_size=chunk_size,
+                                   session_path=session_path)
+            logger.info('File ID: %s', file_id)
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+        return file_id
+
+    def update_file(self, file_id: str, local_file_path: str, mimetype: str, resumable: bool = False,
+                    chunk_size: int = UPLOAD_CHUNK_SIZE, session_path: str = None) -> str:
+        """
+        Replace the content of an existing file with a local file, keeping its id, name and permissions
+        :param file_id: id of the file to update
+        :param local_file_path: a path of the file to upload
+        :param mimetype: mimetype of the file
+        :param resumable: to upload in chunks by a resumable upload session, as upload_file does
+        :param chunk_size: size of a chunk in bytes for the resumable upload. It must be a multiple of 256KB
+        :param session_path: a path to save the resumable session. Defaults to local_file_path + '.upload-session'
+        :return: id of the updated file, or none if failed
+        """
+
+        try:
+            file_id = self._upload(service=self.service, folder_id=None, local_file_path=local_file_path,
+                                   mimetype=mimetype, resumable=resumable, chunk_size=chunk_size,
+                                   session_path=session_path, file_id=file_id)
+            logger.info('File ID: %s', file_id)
+        except HttpError as error:
+            logger.error('An error occurred: %s', error)
+            return None
+
+        return file_id
+
+    def _upload(self, service, folder_id: str, local_file_path: str, mimetype: str, resumable: bool,
+                chunk_size: int, session_path: str, file_id: str = None, metadata: dict = None) -> str:
+        """
+        Upload a file with the service object, and raise errors as they are
+        :param file_id: id of an existing file to update its content, instead of creating a file in folder_id
+        :param metadata: optional file metadata to set along. ex> {'modifiedTime': '2024-01-01T00:00:00Z'}
+        :return: id of the uploaded file
+        """
+        from googleapiclient.http import MediaFileUpload
+
+        if file_id is None:
+            filename = os.path.basename(local_file_path)
             file_metadata = {
                 'name': filename,
                 "parents": [folder_id],
             }
-            media = MediaFileUpload(local_file_path, mimetype=mimetype)
-            file = self.service.files().create(body=file_metadata, media_body=media,
-                                          fields='id').execute()
-            file_id = file.get('id')
-            print(F'File ID: {file_id}')
-        except HttpError as error:
-            print(F'An error occurred: {error}')
-            return None
+        else:
+            file_metadata = {}
+        file_metadata.update(metadata or {})
 
-        return file_id
+        def build_request(media):
+            if file_id is None:
+                return service.files().create(body=file_metadata, media_body=media, fields='id')
+            return service.files().update(fileId=file_id, body=file_metadata, media_body=media, fields='id')
 
-    def download_file(self, file_id:str, download_filepath:str) -> bytes:
+        if not resumable:
+            media = MediaFileUpload(local_file_path, mimetype=mimetype)
+            file = self._execute(build_request(media))
+            return file.get('id')
+
+        session_path = session_path or local_file_path + UPLOAD_SESSION_SUFFIX
+        stat = os.stat(local_file_path)
+        session_key = {'path': os.path.abspath(local_file_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                       'folder_id': folder_id}
+        if file_id is not None:
+            session_key['file_id'] = file_id
+
+        media = MediaFileUpload(local_file_path, mimetype=mimetype, chunksize=chunk_size, resumable=True)
+        request = build_request(media)
+
+        session = _load_upload_session(session_path, session_key)
+        if session is not None:
+            # an error state makes next_chunk ask the server how many bytes it has received
+            request.resumable_uri = session['uri']
+            request._in_error_state = True
+
+        probe = {}
+
+        def next_chunk():
+            # each chunk is reported as a call, with the bytes the server has received by it
+            progress = request.resumable_progress
+            chunk_status, chunk_response = request.next_chunk()
+            probe['bytes_sent'] = (request.resumable_progress if chunk_response is None else media.size()) - progress
+            return chunk_status, chunk_response
+
+        response = None
+        while response is None:
+            try:
+                _, response = self._retry(next_chunk, method=request.methodId + '.chunk', probe=probe)
+            except HttpError as error:
+                if session is not None and error.resp.status in (404, 410):
+                    # the saved session has expired, then start over with a new session
+                    session = None
+                    request.resumable_uri = None
+                    request.resumable_progress = 0
+                    request._in_error_state = False
+                    continue
+                if request.resumable_uri is not None:
+                    _save_upload_session(session_path, dict(session_key, uri=request.resumable_uri))
+                raise
+
+            if response is None and (session is None or session['uri'] != request.resumable_uri):
+                session = dict(session_key, uri=request.resumable_uri)
+                _save_upload_session(session_path, session)
+
+        if os.path.exists(session_path):
+            os.remove(session_path)
+
+        return response.get('id')
+
+    def upload_many(self, folder_id: str, local_file_paths: list, mimetype: str = None, workers: int = 4,
+                    resumable: bool = False, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[TransferResult]:
+        """
+        Upload many files to a folder concurrently. Each worker thread uses its own service object
+        :param folder_id: id of the folder to upload
+        :param local_file_paths: a list of file paths to upload
+        :param mimetype: mimetype of all the files. If not specified, guessed from each file name
+        :param workers: the maximum number of files uploaded concurrently
+        :param resumable: to upload each file by a resumable upload session, as upload_file does
+        :param chunk_size: size of a chunk in bytes for the resumable upload
+        :return: a generator of TransferResult(source=local file path, target=file id, error),
+                 yielded as each upload completes
+        """
+
+        def upload(local_file_path: str) -> str:
+            _mimetype = mimetype or mimetypes.guess_type(local_file_path)[0] or 'application/octet-stream'
+            return self._upload(service=self._thread_service(), folder_id=folder_id,
+                                local_file_path=local_file_path, mimetype=_mimetype, resumable=resumable,
+                                chunk_size=chunk_size, session_path=None)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(upload, path): path for path in local_file_paths}
+            for future in as_completed(futures):
+                try:
+                    yield TransferResult(source=futures[future], target=future.result(), error=None)
+                except (HttpError, IOError) as error:
+                    yield TransferResult(source=futures[future], target=None, error=error)
+
+    def download_file(self, file_id:str, download_filepath:str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                      return_bytes: bool = False, as_mmap: bool = False):
         """
         Download a file in byte format from the google drive
         Google Workspace Document(eg. google sheet) can be downloaded by export_file method, instead.
+        The content is streamed to the file chunk by chunk, so only a chunk is held in memory while downloading
         :param file_id: the id of the file to download
         :param download_filepath: a full local file path including a filename
-        :return: the downloaded file content in bytes format
+        :param chunk_size: size of a chunk in bytes to request at once
+        :param return_bytes: to read and return the downloaded content in bytes, which holds the whole content
+                             in memory. By default, returns download_filepath
+        :param as_mmap: to return a read-only mmap of the downloaded file instead of a copy of the content
+        :return: the file path, a mmap of the downloaded file, or its content in bytes if return_bytes
         """
         try:
-            request = self.service.files().get_media(fileId=file_id)
-            file = io.BytesIO()
-            downloader = MediaIoBaseDownload(file, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                print(F'Download {int(status.progress() * 100)}.')
-
-            with open(download_filepath, 'wb') as out:
-                out.write(file.getvalue())
+            self._download_cached(file_id=file_id, local_path=download_filepath, chunk_size=chunk_size,
+                                  label='Download')
+            return _downloaded_content(download_filepath, return_bytes=return_bytes, as_mmap=as_mmap)
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             return None
 
         except IOError as ioe:
-            print(f'An IO error while storing a file {ioe}')
+            logger.error('An IO error while storing a file %s', ioe)
             return None
 
-        return file.getvalue()
-
-    def export_file(self, file_id:str, export_path:str, mime_type:str) -> bytes:
+    def export_file(self, file_id:str, export_path:str, mime_type:str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                    return_bytes: bool = False, as_mmap: bool = False):
         """
         Export a Google Workspace Document from the google drive folder and save it in the export path
+        The export endpoint ignores the range of a chunk and sends the whole content in one response,
+        so the content is held in memory while exporting. An export is limited to 10MB by Drive
         :param file_id: the id of the file to download
         :param export_path: a local file path including a filename
         :param mime_type: a mime type of file, which should conforms to Google's MIME type
                 e.g. google sheet -> {'application/pdf', 'text/csv', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', ...}
                      google doc -> {'text/html', 'text/plain', 'application/rtf', 'application/pdf', 'application/epub+zip', ...}
                      and so on. For more details, visit https://developers.google.com/drive/api/guides/ref-export-formats
-        :return: the exported file content in bytes format
+        :param chunk_size: size of a chunk in bytes to request at once
+        :param return_bytes: to read and return the exported content in bytes, which holds the whole content
+                             in memory. By default, returns export_path
+        :param as_mmap: to return a read-only mmap of the exported file instead of a copy of the content
+        :return: the file path, a mmap of the exported file, or its content in bytes if return_bytes
         """
         try:
-            request = self.service.files().export_media(fileId=file_id, mimeType=mime_type)
-            file = io.BytesIO()
-            downloader = MediaIoBaseDownload(file, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                print(F'Export a file {int(status.progress() * 100)}.')
-
-            with open(export_path, 'wb') as out:
-                out.write(file.getvalue())
+            self._download_cached(file_id=file_id, local_path=export_path, chunk_size=chunk_size,
+                                  label='Export a file', mime_type=mime_type)
+            return _downloaded_content(export_path, return_bytes=return_bytes, as_mmap=as_mmap)
 
         except HttpError as error:
-            print(F'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             return None
 
         except IOError as ioe:
-            print(f'An IO error while storing a file {ioe}')
+            logger.error('An IO error while storing a file %s', ioe)
             return None
 
-        return file.getvalue()
\ No newline at end of file
+    def iter_download(self, file_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Download a file as an iterator of chunks, without saving it
+        :param file_id: the id of the file to download
+        :param chunk_size: size of a chunk in bytes to request at once
+        :return: a generator of chunks in bytes
+        """
+        return self._iter_media(self.service.files().get_media(fileId=file_id), chunk_size=chunk_size)
+
+    def iter_export(self, file_id: str, mime_type: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Export a Google Workspace Document as an iterator of chunks, without saving it.
+        The export endpoint sends the whole content in one response, so it is received at once
+        and a single chunk holding the whole content is yielded. An export is limited to 10MB by Drive
+        :param file_id: the id of the file to export
+        :param mime_type: a mime type to export, as export_file
+        :param chunk_size: size of a chunk in bytes to request at once, which the export endpoint ignores
+        :return: a generator of chunks in bytes
+        """
+        return self._iter_media(self.service.files().export_media(fileId=file_id, mimeType=mime_type),
+                                chunk_size=chunk_size)
+
+    def open_download(self, file_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> io.BufferedReader:
+        """
+        Open a file of the drive as a read-only binary stream, which downloads it chunk by chunk as read
+        :param file_id: the id of the file to download
+        :param chunk_size: size of a chunk in bytes to request at once
+        :return: a binary file object
+        """
+        return io.BufferedReader(ChunkStream(self.iter_download(file_id, chunk_size=chunk_size)))
+
+    def open_export(self, file_id: str, mime_type: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> io.BufferedReader:
+        """
+        Open an export of a Google Workspace Document as a read-only binary stream, which exports it on the first read.
+        The whole content is received in one response, as iter_export
+        :param file_id: the id of the file to export
+        :param mime_type: a mime type to export, as export_file
+        :param chunk_size: size of a chunk in bytes to request at once, which the export endpoint ignores
+        :return: a binary file object
+        """
+        return io.BufferedReader(ChunkStream(self.iter_export(file_id, mime_type=mime_type, chunk_size=chunk_size)))
+
+    def read_csv_export(self, file_id: str, chunksize: int = None, **kwargs):
+        """
+        Export a spreadsheet as CSV and parse it into pandas DataFrame, without a temporary file.
+        The CSV is received in one response and held in memory, limited to 10MB by Drive. Only the parsing is
+        incremental, so a chunksize keeps the data frames small, not the CSV.
+        Note that a CSV export of Drive holds the first sheet of the spreadsheet only
+        :param file_id: the id of the spreadsheet
+        :param chunksize: the number of rows of a data frame, to read a large sheet chunk by chunk.
+                          If not specified, the whole sheet is read into a data frame
+        :param kwargs: other options of pandas.read_csv
+        :return: a data frame, or an iterator of data frames if chunksize is given
+        """
+        import pandas as pd
+
+        return pd.read_csv(self.open_export(file_id, mime_type='text/csv'), chunksize=chunksize, **kwargs)
+
+    def read_csv_export_arrow(self, file_id: str, **kwargs) -> 'pa.Table':
+        """
+        Export a spreadsheet as CSV and parse it into an Arrow table, without a temporary file.
+        The CSV is received in one response and held in memory, limited to 10MB by Drive.
+        Note that a CSV export of Drive holds the first sheet of the spreadsheet only. Requires pyarrow
+        :param file_id: the id of the spreadsheet
+        :param kwargs: options of pyarrow.csv.read_csv. ex> convert_options
+        :return: an Arrow table
+        """
+        from pyarrow import csv
+
+        with self.open_export(file_id, mime_type='text/csv') as stream:
+            return csv.read_csv(stream, **kwargs)
+
+    def export_csv_to_parquet(self, file_id: str, parquet_path: str, block_size: int = 1024 * 1024,
+                              compression: str = 'snappy') -> int:
+        """
+        Export a spreadsheet as CSV, and convert it into a Parquet file block by block.
+        The CSV is received in one response and held in memory, limited to 10MB by Drive. Only the conversion is
+        incremental, so a single record batch is built at a time, not a table of the whole sheet.
+        The column types are inferred from the first block. Requires pyarrow
+        :param file_id: the id of the spreadsheet
+        :param parquet_path: a local path of the Parquet file to write
+        :param block_size: bytes of CSV parsed into a record batch at a time
+        :param compression: the compression codec of Parquet
+        :return: the number of rows written
+        """
+        from pyarrow import csv, parquet
+
+        rows = 0
+        tmp_path = parquet_path + '.part'
+        try:
+            with self.open_export(file_id, mime_type='text/csv') as stream:
+                reader = csv.open_csv(stream, read_options=csv.ReadOptions(block_size=block_size))
+                with parquet.ParquetWriter(tmp_path, reader.schema, compression=compression) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+                        rows += batch.num_rows
+            os.replace(tmp_path, parquet_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows
+
+    def download_many(self, file_ids, dest_dir: str, workers: int = 8,
+                      chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[TransferResult]:
+        """
+        Download many files concurrently into a local directory.
+        Each worker thread uses its own service object, since the http object of a service is not thread-safe
+        :param file_ids: a list of file ids, or a dict of {file id: local file name}.
+                         For a bare id, the file name in the drive is used as the local file name
+        :param dest_dir: a local directory to save the files
+        :param workers: the maximum number of files downloaded concurrently
+        :param chunk_size: size of a chunk in bytes to request at once
+        :return: a generator of TransferResult(source=file id, target=local file path, error),
+                 yielded as each download completes
+        """
+
+        def request(service, file_id):
+            return service.files().get_media(fileId=file_id)
+
+        return self._transfer_many(file_ids=file_ids, dest_dir=dest_dir, workers=workers, chunk_size=chunk_size,
+                                   build_request=request, extension='')
+
+    def export_many(self, file_ids, dest_dir: str, mime_type: str, workers: int = 8,
+                    chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[TransferResult]:
+        """
+        Export many Google Workspace Documents concurrently into a local directory.
+        Each worker thread uses its own service object, since the http object of a service is not thread-safe
+        :param file_ids: a list of file ids, or a dict of {file id: local file name}.
+                         For a bare id, the file name in the drive with the extension of mime_type is used
+        :param dest_dir: a local directory to save the files
+        :param mime_type: a mime type to export, as export_file
+        :param workers: the maximum number of files exported concurrently
+        :param chunk_size: size of a chunk in bytes to request at once
+        :return: a generator of TransferResult(source=file id, target=local file path, error),
+                 yielded as each export completes
+        """
+
+        def request(service, file_id):
+            return service.files().export_media(fileId=file_id, mimeType=mime_type)
+
+        return self._transfer_many(file_ids=file_ids, dest_dir=dest_dir, workers=workers, chunk_size=chunk_size,
+                                   build_request=request, extension=mimetypes.guess_extension(mime_type) or '')
+
+    def _transfer_many(self, file_ids, dest_dir: str, workers: int, chunk_size: int,
+                       build_request: Callable, extension: str) -> Iterator[TransferResult]:
+        """
+        Run media requests of many files on a pool of worker threads, and stream each file into dest_dir
+        :param build_request: a function of (service, file id) to build the media request of a file
+        :param extension: an extension appended to the drive file name, when the local file name is not given
+        :return: a generator of TransferResult as each transfer completes
+        """
+        names = dict(file_ids) if isinstance(file_ids, dict) else dict.fromkeys(file_ids)
+        used_names = set()
+        lock = threading.Lock()
+
+        def transfer(file_id: str) -> str:
+            service = self._thread_service()
+            name = names[file_id]
+            if name is None:
+                name = self._execute(service.files().get(fileId=file_id, fields='name')).get('name') + extension
+                with lock:
+                    # keep files of the same name in the drive from overwriting each other
+                    if name in used_names:
+                        root, ext = os.path.splitext(name)
+                        name = f'{root} ({file_id}){ext}'
+                    used_names.add(name)
+
+            local_path = os.path.join(dest_dir, name)
+            self._download_to(request=build_request(service, file_id), local_path=local_path,
+                              chunk_size=chunk_size, label=None)
+            return local_path
+
+        os.makedirs(dest_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(transfer, file_id): file_id for file_id in names}
+            for future in as_completed(futures):
+                try:
+                    yield TransferResult(source=futures[future], target=future.result(), error=None)
+                except (HttpError, IOError) as error:
+                    yield TransferResult(source=futures[future], target=None, error=error)
+
+    def _download_cached(self, file_id: str, local_path: str, chunk_size: int, label: str,
+                         mime_type: str = None) -> None:
+        """
+        Download or export a file to local_path, through the cache if attached
+        :param mime_type: the mime type to export, or None to download
+        """
+        if mime_type is None:
+            request = self.service.files().get_media(fileId=file_id)
+        else:
+            request = self.service.files().export_media(fileId=file_id, mimeType=mime_type)
+
+        def download(path: str) -> None:
+            self._download_to(request=request, local_path=path, chunk_size=chunk_size, label=label)
+
+        if self.cache is None:
+            download(local_path)
+            return
+
+        def get_metadata() -> dict:
+            return self._execute(self.service.files().get(fileId=file_id, fields='md5Checksum, version'))
+
+        if self.cache.fetch(file_id=file_id, local_path=local_path, download=download, get_metadata=get_metadata,
+                            mime_type=mime_type):
+            logger.debug('%s %s from the cache', label, file_id)
+
+    def _download_to(self, request, local_path: str, chunk_size: int, label: str) -> None:
+        """
+        Stream a media request into a local file chunk by chunk.
+        The content is written to a temporary file first, and moved to local_path when completed,
+        so a failed download never leaves a partial file at local_path
+        :param request: a media request of get_media or export_media
+        :param local_path: a local file path to write
+        :param chunk_size: size of a chunk in bytes to request at once
+        :param label: a label of progress messages. No progress is logged if None
+        """
+        tmp_path = local_path + DOWNLOAD_PART_SUFFIX
+        try:
+            with open(tmp_path, 'wb') as out:
+                for chunk in self._iter_media(request, chunk_size=chunk_size, label=label):
+                    out.write(chunk)
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _iter_media(self, request, chunk_size: int, label: str = None) -> Iterator[bytes]:
+        """
+        Run a media request chunk by chunk, and yield each chunk as it arrives
+        :param request: a media request of get_media or export_media
+        :param chunk_size: size of a chunk in bytes to request at once
+        :param label: a label of progress messages. No progress is logged if None
+        :return: a generator of chunks in bytes
+        """
+        from googleapiclient.http import MediaIoBaseDownload
+
+        sink = _ChunkSink()
+        downloader = MediaIoBaseDownload(sink, request, chunksize=chunk_size)
+        probe = {}
+
+        def next_chunk():
+            # each chunk is reported as a call, with the bytes received by it
+            chunk = downloader.next_chunk()
+            probe['bytes_received'] = sink.pending
+            return chunk
+
+        done = False
+        while done is False:
+            status, done = self._retry(next_chunk, method=request.methodId + '.chunk', probe=probe)
+            if label is not None:
+                logger.debug('%s %d%%', label, int(status.progress() * 100))
+            yield from sink.take()
@@ -1,21 +1,322 @@
-import sys
-import pandas as pd
+import contextlib
+import json
+import logging
+import os
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Iterator
+from urllib.parse import quote
+
 from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
 
 from gworkspace_client.GsuiteBase import GsuiteBase
-from gworkspace_client.GoogleDrive import GoogleDrive
+
+if TYPE_CHECKING:
+    from gworkspace_client.BufferedAppender import BufferedAppender
+    # pandas and pyarrow are imported on the first call of a method using them, to keep importing this module light
+    import pandas as pd
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# the recommended maximum payload of a request of Sheets API
+MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+# the maximum length of query string of ranges in a request of values.batchGet
+MAX_RANGES_QUERY_LENGTH = 1500
+# the maximum number of cells fetched by a request of values.batchGet, to keep its response moderate
+MAX_BATCH_GET_CELLS = 1000000
+# strings converted to datetime by typed_frame: numeric dates like 2024-01-31 or 1/31/2024, with optional time.
+# Words parsed by pandas like 'today' and 'now' are not dates of a sheet
+DATE_PATTERN = (r'^(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})'
+                r'([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$')
+
+
+def column_letter(column_number: int) -> str:
+    """
+    Convert a column number to its A1 notation letters
+    :param column_number: 1-based column number. ex> 1 -> 'A', 26 -> 'Z', 27 -> 'AA'
+    :return: letters of the column
+    """
+    letters = ''
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def a1_range(title: str, first_row: int, first_column: int, last_row: int, last_column: int) -> str:
+    """
+    Build an A1 notation of a rectangular range in the sheet
+    :param title: title of the sheet
+    :param first_row: 1-based number of the first row
+    :param first_column: 1-based number of the first column
+    :param last_row: 1-based number of the last row
+    :param last_column: 1-based number of the last column
+    :return: A1 notation of the range. ex> 'Sheet 1'!A1:C10
+    """
+    return f"{quote_title(title)}!{column_letter(first_column)}{first_row}:{column_letter(last_column)}{last_row}"
+
+
+def quote_title(title: str) -> str:
+    """
+    Quote a sheet title for A1 notation. ex> Sheet 1 -> 'Sheet 1'
+    """
+    return "'" + title.replace("'", "''") + "'"
+
+
+def typed_frame(rows: list, columns: list = None) -> 'pd.DataFrame':
+    """
+    Build a data frame from unformatted values of a sheet, and convert each column to a proper dtype
+    (numeric, datetime, bool or object) at once, instead of converting cell by cell.
+    Empty cells become missing values
+    :param rows: a list of rows, which may be shorter than others as the API omits trailing empty cells
+    :param columns: optional column names. ex> the header row
+    :return: a data frame with converted dtypes
+    """
+    import warnings
+
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    if columns is not None:
+        columns = [str(c) for c in columns]
+        width = max(len(columns), len(df.columns))
+        # name the columns beyond the header by their letters
+        columns += [column_letter(i + 1) for i in range(len(columns), width)]
+        df = df.reindex(columns=range(width))
+        df.columns = unique_columns(columns)
+
+    converted = {}
+    for i, column in enumerate(df.columns):
+        series = df.iloc[:, i].replace('', None)
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        if inferred == 'boolean':
+            series = series.astype('boolean')
+        elif inferred in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            series = pd.to_numeric(series)
+        elif inferred == 'string' and series.notna().any() and series.dropna().str.match(DATE_PATTERN).all():
+            with warnings.catch_warnings():
+                # the strings which are not valid dates, like 2024-02-30, end up in NaT
+                warnings.simplefilter('ignore')
+                try:
+                    # parsed per value, since a column may mix dates with and without time
+                    dates = pd.to_datetime(series, errors='coerce', format='mixed')
+                except ValueError:
+                    # pandas < 2.0, which parses per value without a format
+                    dates = pd.to_datetime(series, errors='coerce')
+            if dates.notna().sum() == series.notna().sum():
+                series = dates
+        converted[column] = series
+
+    return pd.DataFrame(converted, index=df.index, columns=df.columns)
+
+
+def unique_columns(columns: list) -> list:
+    """
+    Make column names unique, naming a blank column by its letter and suffixing a repeated name by its count
+    ex> ['a', '', 'a'] -> ['a', 'B', 'a.1']
+    :param columns: column names, ex> the header row of a sheet
+    :return: unique column names
+    """
+    names = []
+    seen = set()
+    for i, column in enumerate(columns):
+        name = str(column).strip() or column_letter(i + 1)
+        candidate, count = name, 0
+        while candidate in seen:
+            count += 1
+            candidate = f'{name}.{count}'
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def add_sheet_request(sheet_title: str, sheet_id: int = None) -> dict:
+    """
+    Make a request of spreadsheets.batchUpdate adding a new empty sheet
+    :param sheet_title: the title of new empty sheet
+    :param sheet_id: optional id of the new sheet, to refer to it by later requests of the same batchUpdate
+    """
+    properties = {
+        'title': sheet_title,
+        'tabColor': {
+            'blue': 0.50
+        }
+    }
+    if sheet_id is not None:
+        properties['sheetId'] = sheet_id
+    return {'addSheet': {'properties': properties}}
+
+
+def resize_request(sheet_id: int, dimension: str, start_index: int, end_index: int, size: int) -> dict:
+    """
+    Make a request of spreadsheets.batchUpdate resizing rows or columns
+    :param sheet_id: id of the sheet
+    :param dimension: Must be 'ROWS' or 'COLUMNS'
+    :param start_index: Start index of rows or columns to resize, inclusive
+    :param end_index: End index of rows or columns to resize, exclusive
+    :param size: The size of rows or columns in pixel unit
+    """
+    return {
+        "updateDimensionProperties": {
+            "range": {
+                "sheetId": sheet_id,
+                "dimension": dimension,
+                "startIndex": start_index,
+                "endIndex": end_index
+            },
+            "properties": {
+                "pixelSize": size
+            },
+            "fields": "pixelSize"
+        }
+    }
+
+
+def freeze_request(sheet_id: int, rows: int = None, columns: int = None) -> dict:
+    """
+    Make a request of spreadsheets.batchUpdate freezing the top rows and the left columns of a sheet
+    :param sheet_id: id of the sheet
+    :param rows: the number of rows to freeze. None keeps the current
+    :param columns: the number of columns to freeze. None keeps the current
+    """
+    grid_properties = {}
+    if rows is not None:
+        grid_properties['frozenRowCount'] = rows
+    if columns is not None:
+        grid_properties['frozenColumnCount'] = columns
+    return {
+        'updateSheetProperties': {
+            'properties': {
+                'sheetId': sheet_id,
+                'gridProperties': grid_properties
+            },
+            'fields': ','.join('gridProperties.' + field for field in grid_properties)
+        }
+    }
+
+
+def format_request(sheet_id: int, start_row: int, end_row: int, start_column: int, end_column: int,
+                   cell_format: dict) -> dict:
+    """
+    Make a request of spreadsheets.batchUpdate formatting a range of cells
+    :param sheet_id: id of the sheet
+    :param start_row: start index of rows, inclusive. None for the whole columns
+    :param end_row: end index of rows, exclusive. None for the whole columns
+    :param start_column: start index of columns, inclusive. None for the whole rows
+    :param end_column: end index of columns, exclusive. None for the whole rows
+    :param cell_format: a CellFormat to apply. Only its given fields are updated
+        ex> {'textFormat': {'bold': True}, 'numberFormat': {'type': 'NUMBER', 'pattern': '#,##0'}}
+    """
+    grid_range = {'sheetId': sheet_id}
+    for key, index in (('startRowIndex', start_row), ('endRowIndex', end_row),
+                       ('startColumnIndex', start_column), ('endColumnIndex', end_column)):
+        if index is not None:
+            grid_range[key] = index
+    return {
+        'repeatCell': {
+            'range': grid_range,
+            'cell': {'userEnteredFormat': cell_format},
+            'fields': 'userEnteredFormat(' + ','.join(cell_format) + ')'
+        }
+    }
+
+
+def delete_sheet_request(sheet_id: int) -> dict:
+    """
+    Make a request of spreadsheets.batchUpdate deleting a sheet
+    :param sheet_id: id of the sheet
+    """
+    return {'deleteSheet': {'sheetId': sheet_id}}
+
+
+def _conform_table(table: 'pa.Table', schema: 'pa.Schema') -> 'pa.Table':
+    """
+    Conform a chunk of a sheet to the schema of the file being written, as the dtype of a column may differ by
+    chunks. Missing columns are filled with nulls
+    """
+    import pyarrow as pa
+
+    extra = [name for name in table.column_names if schema.get_field_index(name) < 0]
+    if extra:
+        raise ValueError(f'Columns {extra} are not in the schema')
+
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+            continue
+        column = table.column(field.name)
+        try:
+            columns.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+            raise ValueError(f'Column {field.name} of {column.type} can not be written as {field.type}. '
+                             f'Specify the schema to write') from error
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _coalesce_cells(rows, changed_cells) -> list:
+    """
+    Coalesce changed cells into rectangles. Consecutive changed cells of a row are merged into a run,
+    then runs of the same columns in consecutive rows are merged into a rectangle
+    :param rows: 0-based row numbers of the changed rows
+    :param changed_cells: a boolean matrix of changed cells, a row for each of rows
+    :return: a list of rectangles of 0-based (first row, first column, last row, last column)
+    """
+    runs = []
+    for row, mask in zip(rows, changed_cells):
+        columns = [int(c) for c in mask.nonzero()[0]]
+        start = prev = columns[0] if columns else None
+        for column in columns[1:] + [None]:
+            if column is None or column != prev + 1:
+                runs.append((start, prev, int(row)))
+                start = column
+            prev = column
+
+    rectangles = []
+    for first_column, last_column, row in sorted(runs):
+        last = rectangles[-1] if rectangles else None
+        if last is not None and last[1] == first_column and last[3] == last_column and last[2] == row - 1:
+            rectangles[-1] = (last[0], first_column, row, last_column)
+        else:
+            rectangles.append((row, first_column, row, last_column))
+    return rectangles
+
+
+def _blank_blocks(title: str, first_row: int, first_column: int, last_row: int, last_column: int,
+                  max_payload_bytes: int) -> Iterator[tuple]:
+    """
+    Make blocks of empty strings clearing a rectangular range by values.batchUpdate, each no larger than
+    max_payload_bytes
+    :return: a generator of (A1 range, values, approximate payload size in bytes)
+    """
+    width = last_column - first_column + 1
+    # an empty string takes 4 bytes with its quotes and separator
+    block_rows = max(1, max_payload_bytes // (4 * width))
+    for row in range(first_row, last_row + 1, block_rows):
+        rows = min(block_rows, last_row - row + 1)
+        yield (a1_range(title, row, first_column, row + rows - 1, last_column), [[''] * width] * rows,
+               4 * width * rows)
 
 
 class GoogleSheet(GsuiteBase):
     """
     A Wrapper class of Google Sheet API for a bit of improved usability
     """
+    API_NAME = 'sheets'
 
-    def __init__(self, token_path: str, client_secret_path: str, url_or_id: str = None) -> None:
+    def __init__(self, token_path: str, client_secret_path: str, url_or_id: str = None, transport: str = 'httplib2',
+                 pool_size: int = 10) -> None:
+        """
+        :param transport: 'httplib2', or 'pooled' to share this client across threads. See GsuiteBase
+        :param pool_size: the maximum number of idle connections kept per host by the 'pooled' transport
+        """
         super().__init__(token_path=token_path,
                        client_secret_path=client_secret_path,
-                       scopes=['https://www.googleapis.com/auth/spreadsheets'])
+                       scopes=['https://www.googleapis.com/auth/spreadsheets'],
+                       transport=transport, pool_size=pool_size)
+        # the last written contents of each sheet by sync_sheet, as data frames of strings,
+        # keyed by (spreadsheet id, title)
+        self._snapshots = {}
         if url_or_id.startswith('https://docs.google.com'):
             self.sheet_url = url_or_id
             self.sheet_id = self.sheet_url.split('/')[-1]
@@ -25,35 +326,217 @@ class GoogleSheet(GsuiteBase):
         self.service = self.get_service()
 
     def get_service(self):
-        return build("sheets", "v4", credentials=self.creds)
+        return self._build_service("sheets", "v4")
 
-    def read_single_sheet(self, sheet_title: str) -> pd.DataFrame:
+    def read_single_sheet(self, sheet_title: str) -> 'pd.DataFrame':
         """
         Read a sheet and return as a pandas DataFrame format
         :param sheet_title: title of a sheet to read
         :return: dataframe format of a sheet
         """
-        raw_data = self.service.spreadsheets().values().get(spreadsheetId=self.sheet_id,
-                                                            range=sheet_title).execute()
+        raw_data = self._execute(self.service.spreadsheets().values().get(spreadsheetId=self.sheet_id,
+                                                                          range=sheet_title))
+
+        import pandas as pd
 
         df = pd.DataFrame.from_records(raw_data.get("values", []))
         return df
 
+    def read_sheet_typed(self, sheet_title: str, header: bool = True) -> 'pd.DataFrame':
+        """
+        Read a sheet of unformatted values, and return as a pandas DataFrame of numeric, datetime and bool dtypes
+        :param sheet_title: title of a sheet to read
+        :param header: to use the first row as the column names
+        :return: dataframe format of a sheet
+        """
+        rows = self._get_unformatted_values(quote_title(sheet_title))
+
+        if header and len(rows) > 0:
+            return typed_frame(rows[1:], columns=rows[0])
+        return typed_frame(rows)
+
+    def iter_sheet_chunks(self, sheet_title: str, chunk_rows: int = 10000,
+                          header: bool = True) -> Iterator['pd.DataFrame']:
+        """
+        Read a sheet by ranges of chunk_rows rows, to process a large sheet at constant memory.
+        Each chunk is typed as read_sheet_typed does, so the dtype of a column may differ by chunks
+        if it has no values in some of them
+        :param sheet_title: title of a sheet to read
+        :param chunk_rows: the number of rows to fetch at a time
+        :param header: to use the first row as the column names of every chunk
+        :return: a generator of data frames, which raises ValueError if the sheet does not exist
+        """
+        properties = self._execute(self.service.spreadsheets().get(
+            spreadsheetId=self.sheet_id, fields='sheets(properties(title,gridProperties(rowCount)))'))
+        row_count = next((sheet['properties']['gridProperties']['rowCount'] for sheet in properties['sheets']
+                          if sheet['properties']['title'] == sheet_title), None)
+        if row_count is None:
+            raise ValueError(f'No sheet titled {sheet_title!r}')
+
+        title = quote_title(sheet_title)
+        columns = None
+        start = 1
+        if header:
+            header_rows = self._get_unformatted_values(f'{title}!1:1')
+            columns = header_rows[0] if header_rows else []
+            start = 2
+
+        while start <= row_count:
+            end = min(start + chunk_rows - 1, row_count)
+            rows = self._get_unformatted_values(f'{title}!{start}:{end}')
+            if len(rows) > 0:
+                yield typed_frame(rows, columns=columns)
+            start = end + 1
+
+    def read_sheet_arrow(self, sheet_title: str, header: bool = True) -> 'pa.Table':
+        """
+        Read a sheet of unformatted values into an Arrow table, typed as read_sheet_typed does. Requires pyarrow
+        :param sheet_title: title of a sheet to read
+        :param header: to use the first row as the column names
+        :return: an Arrow table
+        """
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(self.read_sheet_typed(sheet_title, header=header), preserve_index=False)
+
+    def write_parquet(self, sheet_title: str, parquet_path: str, chunk_rows: int = 10000, header: bool = True,
+                      schema: 'pa.Schema' = None, compression: str = 'snappy') -> int:
+        """
+        Read a sheet by ranges of chunk_rows rows as iter_sheet_chunks does, and append each chunk to a Parquet file
+        as a row group, so only a chunk is held in memory at a time. Requires pyarrow
+        :param sheet_title: title of a sheet to read
+        :param parquet_path: a local path of the Parquet file to write
+        :param chunk_rows: the number of rows to fetch and write at a time
+        :param header: to use the first row as the column names
+        :param schema: optional Arrow schema of the file. If not specified, it is taken from the first chunk,
+                       where the columns without values are typed as strings
+        :param compression: the compression codec of Parquet
+        :return: the number of rows written
+        """
+        import pyarrow as pa
+        from pyarrow import parquet
+
+        rows = 0
+        writer = None
+        tmp_path = parquet_path + '.part'
+        try:
+            for df in self.iter_sheet_chunks(sheet_title, chunk_rows=chunk_rows, header=header):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    if schema is None:
+                        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                            for field in table.schema]).remove_metadata()
+                    writer = parquet.ParquetWriter(tmp_path, schema, compression=compression)
+                writer.write_table(_conform_table(table, schema))
+                rows += table.num_rows
+
+            if writer is None:
+                writer = parquet.ParquetWriter(tmp_path, schema or pa.schema([]), compression=compression)
+            writer.close()
+            writer = None
+            os.replace(tmp_path, parquet_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows
+
+    def _get_unformatted_values(self, range_name: str) -> list:
+        """
+        Get values of the range, where numbers and bools are unformatted and dates are formatted strings
+        :return: a list of rows
+        """
+        response = self._execute(self.service.spreadsheets().values().get(
+            spreadsheetId=self.sheet_id, range=range_name,
+            valueRenderOption='UNFORMATTED_VALUE', dateTimeRenderOption='FORMATTED_STRING'))
+        return response.get('values', [])
+
+    def read_sheets(self, titles_or_ranges: list = None, typed: bool = False) -> dict:
+        """
+        Read many sheets or ranges by values.batchGet, instead of a request per sheet.
+        The ranges are split into several requests when the query string or the response gets too large
+        :param titles_or_ranges: a list of sheet titles, or A1 ranges including a sheet title. ex> 'Sheet1!A1:C10'
+                                 If not specified, reads all the sheets
+        :param typed: to read unformatted values with the first row as the header, as read_sheet_typed does.
+                      Otherwise, reads formatted strings as read_single_sheet does
+        :return: a dict of {title or range: dataframe}
+        """
+        import pandas as pd
+
+        cells = {}
+        if titles_or_ranges is None:
+            properties = self._execute(self.service.spreadsheets().get(
+                spreadsheetId=self.sheet_id,
+                fields='sheets(properties(title,gridProperties(rowCount,columnCount)))'))
+            titles_or_ranges = []
+            for sheet in properties['sheets']:
+                title = sheet['properties']['title']
+                grid = sheet['properties'].get('gridProperties', {})
+                titles_or_ranges.append(title)
+                cells[title] = grid.get('rowCount', 0) * grid.get('columnCount', 0)
+
+        ranges = {key: key if '!' in key else quote_title(key) for key in titles_or_ranges}
+
+        # group the ranges by the length of query string and the number of cells
+        groups, group, query_length, group_cells = [], [], 0, 0
+        for key, range_name in ranges.items():
+            length = len('&ranges=' + quote(range_name, safe=''))
+            if len(group) > 0 and (query_length + length > MAX_RANGES_QUERY_LENGTH
+                                   or group_cells + cells.get(key, 0) > MAX_BATCH_GET_CELLS):
+                groups.append(group)
+                group, query_length, group_cells = [], 0, 0
+            group.append(key)
+            query_length += length
+            group_cells += cells.get(key, 0)
+        if len(group) > 0:
+            groups.append(group)
+
+        frames = {}
+        for group in groups:
+            for key, rows in self._batch_get(group, ranges, typed=typed).items():
+                if typed:
+                    frames[key] = typed_frame(rows[1:], columns=rows[0]) if len(rows) > 0 else typed_frame(rows)
+                else:
+                    frames[key] = pd.DataFrame.from_records(rows)
+
+        return frames
+
+    def _batch_get(self, keys: list, ranges: dict, typed: bool) -> dict:
+        """
+        Get values of the ranges by a values.batchGet request, bisecting the ranges if the request fails by its size
+        :return: a dict of {key: rows}
+        """
+        options = {'valueRenderOption': 'UNFORMATTED_VALUE', 'dateTimeRenderOption': 'FORMATTED_STRING'} \
+            if typed else {}
+        try:
+            response = self._execute(self.service.spreadsheets().values().batchGet(
+                spreadsheetId=self.sheet_id, ranges=[ranges[key] for key in keys], **options))
+        except HttpError as error:
+            if len(keys) == 1 or error.resp.status not in (400, 413, 414, 500):
+                raise
+            half = len(keys) // 2
+            return dict(self._batch_get(keys[:half], ranges, typed), **self._batch_get(keys[half:], ranges, typed))
+
+        # value ranges are in the order of the requested ranges
+        return {key: value_range.get('values', [])
+                for key, value_range in zip(keys, response.get('valueRanges', []))}
+
     def get_sheet_titles(self) -> list:
         """
         Get titles of all sheets
         :return: list of sheet title
         """
         try:
-            sheet_titles = self.service.spreadsheets().get(spreadsheetId=self.sheet_id,
-                                                           fields='sheets(properties(title))').execute()
+            sheet_titles = self._execute(self.service.spreadsheets().get(spreadsheetId=self.sheet_id,
+                                                                         fields='sheets(properties(title))'))
             return [v['properties']['title'] for v in sheet_titles['sheets']]
 
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
             return error
 
-    def create_sheet_file(self, sheet_name: str, df: pd.DataFrame, folder_id: str, sheet_title: str = 'Sheet1',
+    def create_sheet_file(self, sheet_name: str, df: 'pd.DataFrame', folder_id: str, sheet_title: str = 'Sheet1',
                           drive_token_path: str = '', drive_client_secret_path: str = ''):
         """
         Create a sheet file from the pandas data frame at the folder
@@ -78,6 +561,8 @@ class GoogleSheet(GsuiteBase):
             _token_path = self.token_path
             _client_secret_path = self.client_secret_path
 
+        from gworkspace_client.GoogleDrive import GoogleDrive
+
         _gdrive = GoogleDrive(token_path=_token_path, client_secret_path=_client_secret_path)
         _sheet_id = _gdrive.create_file(folder_id=folder_id, filename=sheet_name,
                                         filetype='spreadsheet')
@@ -89,7 +574,7 @@ class GoogleSheet(GsuiteBase):
 
         return result
 
-    def write_sheet(self, title: str, df: pd.DataFrame):
+    def write_sheet(self, title: str, df: 'pd.DataFrame'):
         """
         Write or update sheet from the data frame
         :param title: title of sheet
@@ -109,21 +594,255 @@ class GoogleSheet(GsuiteBase):
                 'values': values
             }
 
-            # building range_name: chr(66) -> 'A' to chr(66) + x
-            columns_start = chr(65)
-            columns_end = chr(65 + len(df.columns) - 1)
+            # building range_name: 'A' to the letters of the last column
+            columns_start = column_letter(1)
+            columns_end = column_letter(len(df.columns))
             row_end = len(df) + 1
             range_name = title + f'!{columns_start}1:{columns_end}{row_end}'
 
-            result = self.service.spreadsheets().values().update(
+            result = self._execute(self.service.spreadsheets().values().update(
                 spreadsheetId=self.sheet_id, range=range_name,
-                valueInputOption=value_input_option, body=body).execute()
-            print(f"{result.get('updatedCells')} cells updated.")
+                valueInputOption=value_input_option, body=body))
+            logger.info("%s cells updated.", result.get('updatedCells'))
             return result
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
+            return error
+
+    def write_sheet_chunked(self, title: str, df: 'pd.DataFrame', max_payload_bytes: int = MAX_PAYLOAD_BYTES,
+                            block_rows: int = 1000, value_input_option: str = "USER_ENTERED") -> list:
+        """
+        Write or update sheet from a large data frame, in row blocks sent by values.batchUpdate.
+        Only a block of rows is converted to lists at a time, and blocks are packed into a request
+        until its payload reaches max_payload_bytes
+        :param title: title of sheet
+        :param df: dataframe to write or update
+        :param max_payload_bytes: the maximum size of values in a request
+        :param block_rows: the number of rows converted at a time
+        :param value_input_option: the name of option for value input
+        :return: a list of results of batchUpdate, or the error if failed
+        """
+        try:
+            blocks = self._iter_value_blocks(title=title, df=df, block_rows=block_rows,
+                                             max_payload_bytes=max_payload_bytes)
+            results = self._send_value_blocks(blocks, max_payload_bytes=max_payload_bytes,
+                                              value_input_option=value_input_option)
+
+            logger.info("%s cells updated.", sum(result.get('totalUpdatedCells', 0) for result in results))
+            return results
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
             return error
 
+    def sync_sheet(self, title: str, df: 'pd.DataFrame', snapshot_path: str = None,
+                   max_payload_bytes: int = MAX_PAYLOAD_BYTES, value_input_option: str = "USER_ENTERED") -> dict:
+        """
+        Write the data frame to the sheet by sending only the cells changed since the last write.
+        The data frame is compared with a snapshot of the last written contents by row hashes, then with cells
+        of the changed rows, and the changed cells are coalesced into rectangular ranges sent by values.batchUpdate.
+        Added rows are written below. If the columns have changed, the whole sheet is written again.
+        The rows and columns of the last contents beyond the new ones are cleared in the same values.batchUpdate
+        :param title: title of sheet
+        :param df: dataframe to write
+        :param snapshot_path: optional json file to keep the snapshot across processes.
+                              Without it, the snapshot is kept in this object, or read from the sheet once
+        :param max_payload_bytes: the maximum size of values in a request
+        :param value_input_option: the name of option for value input
+        :return: a dict of the number of updated ranges, appended rows, cleared rows and cleared columns,
+                 and the results of requests
+        """
+        import numpy as np
+        import pandas as pd
+
+        try:
+            # Filling NA with empty string to avoid 404 error
+            df = df.fillna('')
+            new = df.astype(str)
+            new.columns = [str(c) for c in df.columns]
+
+            old = self._load_snapshot(title, snapshot_path)
+            summary = {'updated_ranges': 0, 'appended_rows': 0, 'cleared_rows': 0, 'cleared_columns': 0,
+                       'results': []}
+
+            if old is None or old.columns.to_list() != new.columns.to_list():
+                blocks = list(self._iter_value_blocks(title=title, df=df, block_rows=1000,
+                                                      max_payload_bytes=max_payload_bytes))
+                summary['updated_ranges'] = len(blocks)
+            else:
+                common = min(len(old), len(new))
+                # compare rows by hashes first, then cells of the changed rows only
+                changed_rows = np.flatnonzero(
+                    pd.util.hash_pandas_object(new.iloc[:common], index=False).to_numpy()
+                    != pd.util.hash_pandas_object(old.iloc[:common], index=False).to_numpy())
+                changed_cells = new.to_numpy()[changed_rows] != old.to_numpy()[changed_rows]
+
+                values = df.to_numpy()
+                blocks = []
+                for row, first_column, last_row, last_column in _coalesce_cells(changed_rows, changed_cells):
+                    block = values[row:last_row + 1, first_column:last_column + 1].tolist()
+                    # the header takes the first row of the sheet
+                    blocks.append((a1_range(title, row + 2, first_column + 1, last_row + 2, last_column + 1), block,
+                                   len(json.dumps(block, default=str))))
+                summary['updated_ranges'] = len(blocks)
+
+                if len(new) > common:
+                    blocks.extend(self._iter_value_blocks(title=title, df=df.iloc[common:], block_rows=1000,
+                                                          max_payload_bytes=max_payload_bytes,
+                                                          first_row=common + 2, header=False))
+                    summary['appended_rows'] = len(new) - common
+
+            if old is not None:
+                # blank the last contents out of the new bounds, i.e. the columns past the new width
+                # including the header, and the rows past the new length
+                old_rows, old_columns = len(old), len(old.columns)
+                new_rows, new_columns = len(new), len(new.columns)
+                if old_columns > new_columns:
+                    blocks.extend(_blank_blocks(title, 1, new_columns + 1, old_rows + 1, old_columns,
+                                                max_payload_bytes))
+                    summary['cleared_columns'] = old_columns - new_columns
+                if old_rows > new_rows and min(old_columns, new_columns) > 0:
+                    blocks.extend(_blank_blocks(title, new_rows + 2, 1, old_rows + 1, min(old_columns, new_columns),
+                                                max_payload_bytes))
+                    summary['cleared_rows'] = old_rows - new_rows
+
+            summary['results'] = self._send_value_blocks(blocks, max_payload_bytes=max_payload_bytes,
+                                                         value_input_option=value_input_option)
+
+            self._save_snapshot(title, new, snapshot_path)
+            logger.info('%s ranges updated, %s rows appended, %s rows and %s columns cleared.',
+                        summary['updated_ranges'], summary['appended_rows'], summary['cleared_rows'],
+                        summary['cleared_columns'])
+            return summary
+        except HttpError as error:
+            logger.error("An error occurred: %s", error)
+            return error
+
+    def _load_snapshot(self, title: str, snapshot_path: str) -> 'pd.DataFrame':
+        """
+        Load the snapshot of the sheet from this object, the snapshot file, or the sheet itself in order.
+        Snapshots are keyed by the spreadsheet id and the title, as the same title may be in other spreadsheets
+        :return: a data frame of strings with the header as its columns, or None if the sheet is empty
+        """
+        import pandas as pd
+
+        if (self.sheet_id, title) in self._snapshots:
+            return self._snapshots[(self.sheet_id, title)]
+
+        if snapshot_path is not None:
+            try:
+                with open(snapshot_path) as f:
+                    snapshot = json.load(f)
+                if snapshot['spreadsheet_id'] == self.sheet_id and snapshot['title'] == title:
+                    return pd.DataFrame(snapshot['rows'], columns=snapshot['columns'], dtype=str)
+                logger.warning('Ignoring the snapshot file %s of another sheet', snapshot_path)
+            except (IOError, ValueError, KeyError):
+                pass
+
+        rows = self._execute(self.service.spreadsheets().values().get(spreadsheetId=self.sheet_id,
+                                                                      range=quote_title(title))).get('values', [])
+        if len(rows) == 0:
+            return None
+        # the API omits trailing empty cells, so pad the rows to the width of the header
+        width = len(rows[0])
+        return pd.DataFrame([(row + [''] * width)[:width] for row in rows[1:]], columns=rows[0], dtype=str)
+
+    def _save_snapshot(self, title: str, snapshot: 'pd.DataFrame', snapshot_path: str) -> None:
+        self._snapshots[(self.sheet_id, title)] = snapshot
+        if snapshot_path is not None:
+            tmp_path = snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'spreadsheet_id': self.sheet_id, 'title': title, 'columns': snapshot.columns.to_list(),
+                           'rows': snapshot.to_numpy().tolist()}, f)
+            os.replace(tmp_path, snapshot_path)
+
+    def _send_value_blocks(self, blocks, max_payload_bytes: int, value_input_option: str) -> list:
+        """
+        Pack blocks of values into values.batchUpdate requests of up to max_payload_bytes, and send them
+        :param blocks: an iterable of (A1 range, values, approximate payload size in bytes)
+        :return: a list of results of batchUpdate
+        """
+        results = []
+        data, payload_bytes = [], 0
+        for range_name, values, size in blocks:
+            if len(data) > 0 and payload_bytes + size > max_payload_bytes:
+                results.append(self._batch_update_values(data, value_input_option))
+                data, payload_bytes = [], 0
+            data.append({'range': range_name, 'values': values})
+            payload_bytes += size
+
+        if len(data) > 0:
+            results.append(self._batch_update_values(data, value_input_option))
+
+        return results
+
+    @staticmethod
+    def _iter_value_blocks(title: str, df: 'pd.DataFrame', block_rows: int, max_payload_bytes: int,
+                           first_row: int = 1, header: bool = True) -> Iterator[tuple]:
+        """
+        Convert a data frame with its header into blocks of rows, each no larger than max_payload_bytes
+        :param first_row: 1-based row number of the sheet to write the first row, i.e. the header if header is True
+        :param header: to write the header before the rows
+        :return: a generator of (A1 range, values, approximate payload size in bytes)
+        """
+        last_column = len(df.columns)
+        if header:
+            columns = [df.columns.to_list()]
+            yield (a1_range(title, first_row, 1, first_row, last_column), columns,
+                   len(json.dumps(columns, default=str)))
+            first_row += 1
+
+        start = 0
+        while start < len(df):
+            # Filling NA with empty string to avoid 404 error
+            values = df.iloc[start:start + block_rows].fillna('').values.tolist()
+            size = len(json.dumps(values, default=str))
+            if size > max_payload_bytes and len(values) > 1:
+                # too wide rows for a block, then retry with a smaller block
+                block_rows = max(1, len(values) * max_payload_bytes // size)
+                continue
+
+            range_name = a1_range(title, first_row + start, 1, first_row + start + len(values) - 1, last_column)
+            yield range_name, values, size
+            start += len(values)
+
+    def _batch_update_values(self, data: list, value_input_option: str) -> dict:
+        body = {
+            'valueInputOption': value_input_option,
+            'data': data
+        }
+        return self._execute(self.service.spreadsheets().values().batchUpdate(spreadsheetId=self.sheet_id,
+                                                                                body=body))
+
+    @contextlib.contextmanager
+    def update_batch(self, max_payload_bytes: int = MAX_PAYLOAD_BYTES):
+        """
+        Collect structural updates made within this context, and send them in as few spreadsheets.batchUpdate
+        requests as possible when the context exits. Each operation returns a concurrent.futures.Future of its
+        reply. The operations are applied in order, and a batchUpdate is applied atomically,
+        so a failed request raises its error from the futures of all its operations.
+        If the context exits by an exception, nothing is sent and the operations fail with the exception
+        ex>
+            with gsheet.update_batch() as batch:
+                added = batch.add_sheet('report', sheet_id=100)
+                batch.resize_cells(100, 'COLUMNS', 0, 10, 120)
+                batch.freeze(100, rows=1)
+            sheet_id = added.result()['addSheet']['properties']['sheetId']
+        :param max_payload_bytes: the maximum size of a batchUpdate request
+        :return: a SheetUpdateBatch to add the operations to
+        """
+        batch = SheetUpdateBatch(client=self, max_payload_bytes=max_payload_bytes)
+        try:
+            yield batch
+        except BaseException as error:
+            # resolve the operations not sent, so that no one waits for their futures forever
+            batch.abort(error)
+            raise
+        batch.flush()
+
+    def _batch_update(self, requests: list) -> dict:
+        body = {'requests': requests}
+        return self._execute(self.service.spreadsheets().batchUpdate(spreadsheetId=self.sheet_id, body=body))
+
     def resize_cells(self, sheet_number: int, dimension: str, start_index: int, end_index: int, size: int):
         """
         Resize cell width or height within the specified range
@@ -135,30 +854,11 @@ class GoogleSheet(GsuiteBase):
         :return:
         """
         try:
-            body = {
-                "requests": [
-                    {
-                        "updateDimensionProperties": {
-                            "range": {
-                                "sheetId": sheet_number,
-                                "dimension": dimension,
-                                "startIndex": start_index,
-                                "endIndex": end_index
-                            },
-                            "properties": {
-                                "pixelSize": size
-                            },
-                            "fields": "pixelSize"
-                        }
-                    }
-                ]
-            }
-
-            result = self.service.spreadsheets().batchUpdate(spreadsheetId=self.sheet_id, body=body).execute()
+            result = self._batch_update([resize_request(sheet_number, dimension, start_index, end_index, size)])
 
             return result
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
             return error
 
     def add_sheet(self, sheet_title: str):
@@ -169,24 +869,11 @@ class GoogleSheet(GsuiteBase):
         """
 
         try:
-            body = {
-                'requests': [{
-                    'addSheet': {
-                        'properties': {
-                            'title': sheet_title,
-                            'tabColor': {
-                                'blue': 0.50
-                            }
-                        }
-                    }
-                }]
-            }
-
-            result = self.service.spreadsheets().batchUpdate(spreadsheetId=self.sheet_id, body=body).execute()
+            result = self._batch_update([add_sheet_request(sheet_title)])
 
             return result
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
             return error
 
     def update_values(self, range_name: str, _values: list, value_input_option: str = "USER_ENTERED"):
@@ -210,13 +897,13 @@ class GoogleSheet(GsuiteBase):
             body = {
                 'values': values
             }
-            result = service.spreadsheets().values().update(
+            result = self._execute(service.spreadsheets().values().update(
                 spreadsheetId=self.sheet_id, range=range_name,
-                valueInputOption=value_input_option, body=body).execute()
-            print(f"{result.get('updatedCells')} cells updated.")
+                valueInputOption=value_input_option, body=body))
+            logger.info("%s cells updated.", result.get('updatedCells'))
             return result
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
             return error
 
     def append_values(self, range_name: str, _values: list, value_input_option: str = "USER_ENTERED"):
@@ -235,16 +922,124 @@ class GoogleSheet(GsuiteBase):
         """
 
         try:
-            service = self.service
-            values = _values
-            body = {
-                'values': values
-            }
-            result = service.spreadsheets().values().append(
-                spreadsheetId=self.sheet_id, range=range_name,
-                valueInputOption=value_input_option, body=body).execute()
-            print('{0} cells appended.'.format(result.get('updates').get('updatedCells')))
+            result = self._append_values(range_name=range_name, _values=_values,
+                                         value_input_option=value_input_option)
+            logger.info('%s cells appended.', result.get('updates').get('updatedCells'))
             return result
         except HttpError as error:
-            print(f"An error occurred: {error}")
+            logger.error("An error occurred: %s", error)
             return error
+
+    def _append_values(self, range_name: str, _values: list, value_input_option: str, service=None) -> dict:
+        """
+        Append the values, raising the error if failed
+        :param service: optional service object to use instead of self.service, ex> of another thread
+        """
+        service = service or self.service
+        body = {
+            'values': _values
+        }
+        return self._execute(service.spreadsheets().values().append(
+            spreadsheetId=self.sheet_id, range=range_name,
+            valueInputOption=value_input_option, body=body))
+
+    def buffered_appender(self, range_name: str, **kwargs) -> 'BufferedAppender':
+        """
+        Make a BufferedAppender appending rows to the range in the background, by few requests of many rows.
+        Close it, or use it as a context manager, to append all the buffered rows
+        :param range_name: name of range to append to
+        :param kwargs: options of BufferedAppender. ex> max_rows, max_bytes, flush_interval, max_buffered_rows
+        :return: a BufferedAppender
+        """
+        from gworkspace_client.BufferedAppender import BufferedAppender
+
+        return BufferedAppender(self, range_name, **kwargs)
+
+
+class SheetUpdateBatch:
+    """
+    Structural updates collected by GoogleSheet.update_batch(), to be sent in spreadsheets.batchUpdate requests
+    """
+
+    def __init__(self, client: GoogleSheet, max_payload_bytes: int = MAX_PAYLOAD_BYTES) -> None:
+        self.client = client
+        self.max_payload_bytes = max_payload_bytes
+        self._operations = []
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def add(self, request: dict) -> Future:
+        """
+        Add a raw request of spreadsheets.batchUpdate
+        :param request: a request. ex> {'deleteSheet': {'sheetId': 1}}
+        :return: a Future of the reply of the request
+        """
+        future = Future()
+        self._operations.append((request, future))
+        return future
+
+    def add_sheet(self, sheet_title: str, sheet_id: int = None) -> Future:
+        return self.add(add_sheet_request(sheet_title, sheet_id=sheet_id))
+
+    def resize_cells(self, sheet_number: int, dimension: str, start_index: int, end_index: int, size: int) -> Future:
+        return self.add(resize_request(sheet_number, dimension, start_index, end_index, size))
+
+    def freeze(self, sheet_id: int, rows: int = None, columns: int = None) -> Future:
+        return self.add(freeze_request(sheet_id, rows=rows, columns=columns))
+
+    def format_cells(self, sheet_id: int, cell_format: dict, start_row: int = None, end_row: int = None,
+                     start_column: int = None, end_column: int = None) -> Future:
+        return self.add(format_request(sheet_id, start_row, end_row, start_column, end_column, cell_format))
+
+    def delete_sheet(self, sheet_id: int) -> Future:
+        return self.add(delete_sheet_request(sheet_id))
+
+    def flush(self) -> list:
+        """
+        Send the collected operations in order, packed into batchUpdate requests of up to max_payload_bytes
+        :return: a list of responses of batchUpdate, where the response is the error if the request failed
+        """
+        operations, self._operations = self._operations, []
+
+        chunks = []
+        size = 0
+        for request, future in operations:
+            request_size = len(json.dumps(request))
+            if chunks and size + request_size > self.max_payload_bytes:
+                chunks.append([])
+                size = 0
+            if not chunks:
+                chunks.append([])
+            chunks[-1].append((request, future))
+            size += request_size
+
+        results = []
+        for i, chunk in enumerate(chunks):
+            try:
+                response = self.client._batch_update([request for request, _ in chunk])
+            except Exception as error:
+                # not only an HttpError, but also a transport error like a timeout fails the operations
+                logger.error("An error occurred: %s", error)
+                # the later operations may depend on the failed ones, so they are not sent either
+                for _, future in (operation for rest in chunks[i:] for operation in rest):
+                    future.set_exception(error)
+                results.append(error)
+                break
+
+            # replies are in the order of the requests, and empty for the requests without a reply
+            replies = response.get('replies', [])
+            for j, (_, future) in enumerate(chunk):
+                future.set_result(replies[j] if j < len(replies) else {})
+            results.append(response)
+
+        return results
+
+    def abort(self, error: BaseException) -> None:
+        """
+        Drop the collected operations without sending them, failing their futures with the error
+        """
+        operations, self._operations = self._operations, []
+        for _, future in operations:
+            if not future.done():
+                future.set_exception(error)
@@ -1,40 +1,481 @@
 import os
 import abc
+import contextlib
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
+
+from gworkspace_client import Instrumentation
+from gworkspace_client.RateLimiter import RateLimiter
+
+# credentials shared process-wide, keyed by (token path, scopes)
+_credentials_cache = {}
+# a lock per token path and scopes, so that loading a token, ex> a user logging in, blocks no clients of other tokens
+_credentials_locks = {}
+_credentials_lock = threading.Lock()
+# built service objects of each thread, keyed by (token path, scopes, api, version)
+_service_cache = threading.local()
+# pooled http objects and service objects built on them, shared by all the threads,
+# keyed by (token path, scopes, pool size) and (token path, scopes, pool size, api, version)
+_pooled_http_cache = {}
+_pooled_service_cache = {}
+_pooled_lock = threading.Lock()
+
+TRANSPORTS = ('httplib2', 'pooled')
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Test if a failed request is worth retrying, i.e. it failed by a rate limit or a transient server error
+    :param error: an exception raised by a request
+    :return: boolean result of test
+    """
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status in RETRYABLE_STATUSES:
+        return True
+    if error.resp.status == 403:
+        return any(detail.get('reason') in RATE_LIMIT_REASONS
+                   for detail in (error.error_details or []) if isinstance(detail, dict))
+    return False
+
+
+def retry_delay(error: Exception, attempt: int, max_delay: float = 64.0) -> float:
+    """
+    Seconds to wait before retrying a failed request.
+    Honours the Retry-After header if the server sent it, otherwise an exponential backoff with jitter
+    :param error: an exception raised by the request
+    :param attempt: the number of retries so far, starting from 0
+    :param max_delay: the upper bound of the exponential backoff
+    :return: seconds to wait
+    """
+    retry_after = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            # a malformed value, which falls back to the backoff
+            retry_at = None
+        if retry_at is not None:
+            return max(0.0, retry_at.timestamp() - time.time())
+
+    return random.uniform(0, min(max_delay, 2 ** attempt))
 
 
 class GsuiteBase:
-    def __init__(self, token_path: str, client_secret_path: str, scopes: list):
+    # name of the API, which identifies the rate limiter shared by the clients of the API
+    API_NAME = None
+    # the maximum number of calls packed into a batch request
+    MAX_BATCH_SIZE = 100
+    # the maximum number of retries of a request failed by a rate limit or a transient error
+    MAX_RETRIES = 5
+    # whether to renew the token shortly before its expiry in background, by one of the processes sharing it
+    REFRESH_IN_BACKGROUND = True
+
+    def __init__(self, token_path: str, client_secret_path: str, scopes: list, transport: str = 'httplib2',
+                 pool_size: int = 10):
+        """
+        :param transport: 'httplib2' to build a service with a single connection per thread,
+                          or 'pooled' to build a service shared by all the threads on a keep-alive connection pool
+        :param pool_size: the maximum number of idle connections kept per host by the 'pooled' transport
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f'Unknown transport {transport}, which must be one of {TRANSPORTS}')
         self.client_secret_path = client_secret_path
         self.token_path = token_path
+        self.scopes = scopes
+        self.transport = transport
+        self.pool_size = pool_size
         self.creds = self.get_token(scopes=scopes)
+        self._batch_local = threading.local()
 
     def get_token(self, scopes: str) -> object:
         """
-        Get an auth token and save as a local token
+        Get an auth token and save as a local token.
+        The credential is cached process-wide by the token path and scopes, so that the clients of the same token
+        share a credential without reading the token file again
         :return: a credential object
         """
+        key = (os.path.abspath(self.token_path), tuple(sorted(scopes)))
+        with _credentials_lock:
+            creds = _credentials_cache.get(key)
+            if creds is not None:
+                return creds
+            lock = _credentials_locks.setdefault(key, threading.Lock())
+
+        # the clients of the same token wait for the one loading it, not to let the user log in twice
+        with lock:
+            with _credentials_lock:
+                creds = _credentials_cache.get(key)
+            if creds is None:
+                creds = self._load_token(scopes=scopes)
+                with _credentials_lock:
+                    _credentials_cache[key] = creds
+        return creds
 
-        creds = None
-        SCOPES = scopes
+    def _load_token(self, scopes: str) -> object:
+        """
+        Load an auth token from the local token file, or issue a new one and save it.
+        The token file is accessed through a TokenStore, so that the processes sharing it renew an expired token
+        only once, and never see a partially written file
+        :return: a credential object
+        """
+        # imported here, since the auth stacks are heavy to import and needed only once per token
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
 
-        if os.path.exists(self.token_path):
-            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        from gworkspace_client.TokenStore import TokenStore
+
+        store = TokenStore.for_path(self.token_path)
+        creds = store.load(scopes)
+        if creds and creds.expired and creds.refresh_token:
+            # takes the token renewed by another process, or renews it for all
+            creds.refresh(Request())
         # If there are no (valid) credentials available, let the user log in.
         if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_path, SCOPES)
-                creds = flow.run_local_server(port=0)
-            # Save the credentials for the next run
-            with open(self.token_path, 'w') as token:
-                token.write(creds.to_json())
+            def log_in():
+                flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_path, scopes)
+                return flow.run_local_server(port=0)
+
+            creds = store.create(log_in, scopes)
+
+        if self.REFRESH_IN_BACKGROUND:
+            store.start_refresher()
         return creds
 
     @abc.abstractmethod
     def get_service(self):
         pass
+
+    @property
+    def thread_safe(self) -> bool:
+        """
+        Whether the service objects of this client can be shared by threads, which is True for the 'pooled' transport
+        """
+        return self.transport == 'pooled'
+
+    def _build_service(self, api: str, version: str):
+        """
+        Build a service object with the discovery document bundled in googleapiclient, without fetching it.
+        Built services are cached by the token path, scopes and API version, per thread,
+        since the http object of a service is not thread-safe.
+        With the 'pooled' transport, a service is shared by all the threads and the clients of the same token instead
+        :param api: name of the API. ex> 'drive'
+        :param version: version of the API. ex> 'v3'
+        :return: a service object
+        """
+        if self.thread_safe:
+            return self._build_pooled_service(api, version)
+
+        # imported here, since the discovery stack is heavy to import
+        from googleapiclient.discovery import build
+
+        services = getattr(_service_cache, 'services', None)
+        if services is None:
+            services = _service_cache.services = {}
+
+        key = (os.path.abspath(self.token_path), tuple(sorted(self.scopes)), api, version)
+        service = services.get(key)
+        if service is None:
+            service = build(api, version, credentials=self.creds, static_discovery=True, cache_discovery=False)
+            services[key] = service
+        return service
+
+    def _build_pooled_service(self, api: str, version: str):
+        from googleapiclient.discovery import build
+
+        key = (os.path.abspath(self.token_path), tuple(sorted(self.scopes)), self.pool_size)
+        with _pooled_lock:
+            service = _pooled_service_cache.get(key + (api, version))
+            if service is None:
+                service = build(api, version, http=self._pooled_http(key), static_discovery=True,
+                                cache_discovery=False)
+                _pooled_service_cache[key + (api, version)] = service
+        return service
+
+    def _pooled_http(self, key: tuple):
+        """
+        Get the pooled http object of the token, creating it on the first use. Must be called under _pooled_lock
+        """
+        # imported here, since requests is needed only by the 'pooled' transport
+        from gworkspace_client.PooledHttp import PooledHttp
+
+        http = _pooled_http_cache.get(key)
+        if http is None:
+            http = _pooled_http_cache[key] = PooledHttp(self.creds, pool_size=self.pool_size)
+        return http
+
+    def transport_stats(self) -> dict:
+        """
+        Statistics of connection reuse of the pooled http object of this client, shared by the clients of the token
+        :return: a dict of requests, connections, reused, reuse_ratio, refreshes and pool_size,
+                 or None with the 'httplib2' transport
+        """
+        if not self.thread_safe:
+            return None
+        key = (os.path.abspath(self.token_path), tuple(sorted(self.scopes)), self.pool_size)
+        with _pooled_lock:
+            return self._pooled_http(key).stats()
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """
+        The rate limiter of this client's API, shared by all the clients of the API
+        """
+        return RateLimiter.for_api(self.API_NAME)
+
+    def throttle_stats(self) -> dict:
+        """
+        Statistics of throttling of this client's API, across all the clients of the API
+        :return: a dict of requests, retries, throttled_seconds and backoff_seconds
+        """
+        return self.rate_limiter.stats()
+
+    def _retry(self, func: Callable, max_retries: int = None, method: str = None, probe: dict = None):
+        """
+        Call a function making a request, under the rate limit of the API.
+        Retries it with backoff while it fails by a rate limit or a transient error.
+        The call is reported to the hooks of Instrumentation, if any
+        :param func: a function making a request. ex> request.execute
+        :param max_retries: the maximum number of retries. Defaults to MAX_RETRIES
+        :param method: name of the API method to report. ex> 'drive.files.list'
+        :param probe: optional dict filled with 'status', 'bytes_sent' and 'bytes_received' by the function
+        :return: the return value of the function
+        """
+        max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        limiter = self.rate_limiter
+        start = time.perf_counter() if Instrumentation.enabled() else None
+
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                result = func()
+            except HttpError as error:
+                if attempt < max_retries and is_retryable(error):
+                    limiter.backoff(retry_delay(error, attempt))
+                    attempt += 1
+                    continue
+                if start is not None:
+                    self._record(method, start, attempt, probe, error)
+                raise
+            except Exception as error:
+                if start is not None:
+                    self._record(method, start, attempt, probe, error)
+                raise
+
+            if start is not None:
+                self._record(method, start, attempt, probe)
+            return result
+
+    def _record(self, method: str, start: float, retries: int, probe: dict = None, error: Exception = None,
+                end: float = None) -> None:
+        """
+        Report a call to the hooks of Instrumentation
+        """
+        probe = probe or {}
+        if error is None:
+            status = probe.get('status', 200)
+        else:
+            status = error.resp.status if isinstance(error, HttpError) else None
+        Instrumentation.emit(Instrumentation.CallRecord(
+            api=self.API_NAME, method=method, latency=(end or time.perf_counter()) - start, status=status,
+            retries=retries, bytes_sent=probe.get('bytes_sent', 0), bytes_received=probe.get('bytes_received', 0),
+            error=error))
+
+    def _execute(self, request, max_retries: int = None):
+        """
+        Execute a request under the rate limit of the API, retrying on a rate limit or a transient error
+        :param request: a request to execute
+        :param max_retries: the maximum number of retries. Defaults to MAX_RETRIES
+        :return: the response
+        """
+        probe = None
+        if Instrumentation.enabled():
+            probe = Instrumentation.probe_request(request)
+            probe['bytes_sent'] = len(request.body or '')
+        return self._retry(request.execute, max_retries=max_retries, method=getattr(request, 'methodId', None),
+                           probe=probe)
+
+    @contextlib.contextmanager
+    def batch(self, batch_size: int = None, max_retries: int = None):
+        """
+        Queue the supported calls made within this context, and send them in batch requests of up to batch_size.
+        A queued call returns a concurrent.futures.Future instead of its result, which is resolved by the time
+        the context exits, or earlier when the queue gets full. A failed call raises its error from the future.
+        If the context exits by an exception, the calls not sent yet fail with the exception.
+        Queueing is per thread, so the calls of other threads are not affected
+        ex>
+            with gdrive.batch():
+                futures = [gdrive.create_folder(parent_folder_id, name) for name in names]
+            folder_ids = [future.result() for future in futures]
+        :param batch_size: the maximum number of calls in a batch request, up to MAX_BATCH_SIZE
+        :param max_retries: the maximum number of retries of the calls failed by a rate limit or a transient error.
+                            Defaults to MAX_RETRIES
+        """
+        queue = _BatchQueue(client=self, batch_size=min(batch_size or self.MAX_BATCH_SIZE, self.MAX_BATCH_SIZE),
+                            max_retries=max_retries)
+        outer_queue = getattr(self._batch_local, 'queue', None)
+        self._batch_local.queue = queue
+        try:
+            yield queue
+            queue.flush()
+        except BaseException as error:
+            # resolve the calls not sent, so that no one waits for their futures forever
+            queue.abort(error)
+            raise
+        finally:
+            self._batch_local.queue = outer_queue
+
+    def _call(self, request, parse: Callable = None):
+        """
+        Execute a request, or queue it if called within a batch() context
+        :param request: a request to execute
+        :param parse: optional function to make the result from the response.
+                      It may return a result of another _call, to chain a dependent call
+        :return: the result, or a Future of the result if queued
+        """
+        queue = getattr(getattr(self, '_batch_local', None), 'queue', None)
+        if queue is None:
+            response = self._execute(request)
+            return parse(response) if parse is not None else response
+
+        return queue.add(request, parse)
+
+    def _execute_batch(self, requests: dict, batch_size: int = None, max_retries: int = None) -> dict:
+        """
+        Execute many requests packed into batch requests of up to batch_size calls.
+        Only the calls failed by a rate limit or a transient error are retried, with exponential backoff
+        :param requests: a dict of {key: request}. The key can be any hashable to identify each call
+        :param batch_size: the maximum number of calls in a batch request, up to MAX_BATCH_SIZE
+        :param max_retries: the maximum number of retries of the failed calls. Defaults to MAX_RETRIES
+        :return: a dict of {key: response}, where the response is the exception if the call failed
+        """
+        batch_size = min(batch_size or self.MAX_BATCH_SIZE, self.MAX_BATCH_SIZE)
+        max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        limiter = self.rate_limiter
+        results = {}
+        pending = list(requests)
+
+        probes = None
+        if Instrumentation.enabled():
+            started = time.perf_counter()
+            probes = {key: Instrumentation.probe_request(request) for key, request in requests.items()}
+            finished = {}
+
+        for attempt in range(max_retries + 1):
+            if attempt > 0:
+                limiter.backoff(max(retry_delay(results[key], attempt - 1) for key in pending))
+
+            for start in range(0, len(pending), batch_size):
+                keys = pending[start:start + batch_size]
+
+                def callback(request_id, response, exception, keys=keys, attempt=attempt):
+                    key = keys[int(request_id)]
+                    results[key] = exception if exception is not None else response
+                    if probes is not None:
+                        finished[key] = (time.perf_counter(), attempt)
+
+                batch = self.service.new_batch_http_request(callback=callback)
+                for i, key in enumerate(keys):
+                    batch.add(requests[key], request_id=str(i))
+                # each call in a batch counts against the quota
+                limiter.acquire(len(keys))
+                try:
+                    batch.execute()
+                except HttpError as error:
+                    # the batch request failed as a whole
+                    for key in keys:
+                        results[key] = error
+                        if probes is not None:
+                            finished[key] = (time.perf_counter(), attempt)
+
+            pending = [key for key in pending if is_retryable(results[key])]
+            if len(pending) == 0:
+                break
+
+        if probes is not None:
+            # each call in the batch is reported as a call, with the latency until its own response
+            for key, request in requests.items():
+                end, retries = finished.get(key, (time.perf_counter(), 0))
+                error = results[key] if isinstance(results[key], Exception) else None
+                probes[key]['bytes_sent'] = len(request.body or '')
+                self._record(getattr(request, 'methodId', None), started, retries, probes[key], error, end=end)
+
+        return results
+
+
+class _BatchQueue:
+    """
+    Calls queued by GsuiteBase.batch(), to be sent in batch requests
+    """
+
+    def __init__(self, client: GsuiteBase, batch_size: int, max_retries: int) -> None:
+        self.client = client
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._calls = []
+        self._flushing = False
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def add(self, request, parse: Callable = None) -> Future:
+        future = Future()
+        self._calls.append((request, parse, future))
+        if len(self._calls) >= self.batch_size and not self._flushing:
+            self.flush()
+        return future
+
+    def flush(self) -> None:
+        """
+        Send all the queued calls, including the calls chained while resolving them
+        """
+        self._flushing = True
+        try:
+            while self._calls:
+                calls, self._calls = self._calls, []
+                responses = self.client._execute_batch({i: request for i, (request, _, _) in enumerate(calls)},
+                                                       batch_size=self.batch_size, max_retries=self.max_retries)
+                for i, (_, parse, future) in enumerate(calls):
+                    _resolve(future, responses[i], parse)
+        finally:
+            self._flushing = False
+
+    def abort(self, error: BaseException) -> None:
+        """
+        Drop the queued calls without sending them, failing their futures with the error
+        """
+        calls, self._calls = self._calls, []
+        for _, _, future in calls:
+            if not future.done():
+                future.set_exception(error)
+
+
+def _resolve(future: Future, response, parse: Callable) -> None:
+    if isinstance(response, Exception):
+        future.set_exception(response)
+        return
+    try:
+        result = parse(response) if parse is not None else response
+    except Exception as error:
+        future.set_exception(error)
+        return
+
+    if isinstance(result, Future):
+        # a chained call, which resolves in a later batch request
+        result.add_done_callback(lambda chained: _resolve(future, chained.exception() or chained.result(), None))
+    else:
+        future.set_result(result)
@@ -0,0 +1,166 @@
+import bisect
+import logging
+import threading
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# hooks called with a CallRecord of every API call of all the clients in this process
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+class CallRecord(NamedTuple):
+    """
+    A record of an API call, including its retries
+    """
+    # name of the API. ex> 'drive', 'sheets'
+    api: str
+    # id of the API method. ex> 'drive.files.list', 'sheets.spreadsheets.values.batchUpdate'
+    method: str
+    # seconds from the first attempt to the end of the last, including waits for the rate limit and backoff
+    latency: float
+    # http status of the last attempt, or None if it failed without a response
+    status: int
+    retries: int
+    bytes_sent: int
+    bytes_received: int
+    # the exception raised by the call, or None if succeeded
+    error: Exception = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def add_hook(hook: Callable) -> Callable:
+    """
+    Register a hook called with a CallRecord after every API call. A hook is called in the thread making the call,
+    so it should be quick and thread-safe. Exceptions raised by a hook are logged, and not propagated
+    :param hook: a callable taking a CallRecord
+    :return: the hook, to remove it later
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Callable) -> None:
+    """
+    Unregister a hook registered by add_hook
+    """
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    """
+    Whether any hook is registered. Calls are not measured without hooks, to keep the hot path cheap
+    """
+    return len(_hooks) > 0
+
+
+def emit(record: CallRecord) -> None:
+    for hook in tuple(_hooks):
+        try:
+            hook(record)
+        except Exception:
+            logger.exception('A hook failed on the record of %s', record.method)
+
+
+def probe_request(request) -> dict:
+    """
+    Measure the response of a request of googleapiclient, by wrapping its postproc called with the raw response.
+    The postproc is called by both execute() and batch requests
+    :param request: an HttpRequest
+    :return: a dict filled with 'status' and 'bytes_received' when the request succeeds
+    """
+    probe = {}
+    postproc = request.postproc
+
+    def _postproc(resp, content):
+        probe['status'] = resp.status
+        probe['bytes_received'] = len(content or b'')
+        return postproc(resp, content)
+
+    request.postproc = _postproc
+    return probe
+
+
+# upper bounds of latency buckets in seconds, from 1ms to about 65s by doubling
+DEFAULT_BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+
+
+class HistogramExporter:
+    """
+    A hook keeping in-memory histograms of latency, with counts of errors, retries and bytes, per method
+    ex>
+        exporter = HistogramExporter()
+        add_hook(exporter)
+        ...
+        print(exporter.summary())
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        """
+        :param buckets: ascending upper bounds of latency buckets in seconds. Larger latencies go to an extra bucket
+        """
+        self.buckets = tuple(buckets)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        key = (record.api, record.method)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'count': 0, 'errors': 0, 'retries': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                    'latency_sum': 0.0, 'latency_max': 0.0, 'statuses': {},
+                    'histogram': [0] * (len(self.buckets) + 1),
+                }
+            stats['count'] += 1
+            stats['errors'] += 0 if record.ok else 1
+            stats['retries'] += record.retries
+            stats['bytes_sent'] += record.bytes_sent
+            stats['bytes_received'] += record.bytes_received
+            stats['latency_sum'] += record.latency
+            stats['latency_max'] = max(stats['latency_max'], record.latency)
+            stats['statuses'][record.status] = stats['statuses'].get(record.status, 0) + 1
+            stats['histogram'][bisect.bisect_left(self.buckets, record.latency)] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+
+    def percentile(self, histogram: list, q: float) -> float:
+        """
+        Estimate a percentile of latency from a histogram, as the upper bound of the bucket containing it
+        :param histogram: counts of buckets
+        :param q: the percentile between 0 and 100
+        :return: seconds, or inf if it is over the last bound
+        """
+        rank = q / 100 * sum(histogram)
+        count = 0
+        for i, bucket_count in enumerate(histogram):
+            count += bucket_count
+            if count >= rank and bucket_count > 0:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return 0.0
+
+    def summary(self) -> dict:
+        """
+        :return: a dict of {(api, method): stats}, where stats is a dict of count, errors, retries, bytes_sent,
+                 bytes_received, mean, max, p50, p95, p99 (in seconds), statuses and histogram
+        """
+        with self._lock:
+            stats = {key: dict(value, statuses=dict(value['statuses']), histogram=list(value['histogram']))
+                     for key, value in self._stats.items()}
+
+        for value in stats.values():
+            value['mean'] = value.pop('latency_sum') / value['count']
+            value['max'] = value.pop('latency_max')
+            for q in (50, 95, 99):
+                value[f'p{q}'] = self.percentile(value['histogram'], q)
+        return stats
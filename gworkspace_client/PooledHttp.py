@@ -0,0 +1,176 @@
+import logging
+import threading
+
+import httplib2
+import requests
+import requests.adapters
+from google.auth.transport.requests import Request
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# statuses on which the credential is refreshed and the request is sent again once, as google-auth-httplib2 does
+REFRESH_STATUSES = (401,)
+# seconds to wait for a connection or a response, as the default of googleapiclient
+DEFAULT_TIMEOUT = 60
+
+
+class PooledHttp:
+    """
+    An httplib2.Http compatible object, which sends the requests of googleapiclient over a keep-alive pool of
+    connections of requests, authorized by a google-auth credential.
+    Unlike httplib2.Http, it is thread-safe: the threads sharing it take idle connections from the pool, so one
+    service object built on it can be shared by all the threads, and TLS handshakes are paid only by new connections.
+    The credential is refreshed under a lock, by only one of the threads finding it expired
+    ex>
+        http = PooledHttp(creds, pool_size=20)
+        service = build('drive', 'v3', http=http)
+    """
+
+    def __init__(self, credentials, pool_size: int = 10, block: bool = False,
+                 timeout: float = DEFAULT_TIMEOUT) -> None:
+        """
+        :param credentials: a google-auth credential, or None to send requests unauthorized
+        :param pool_size: the maximum number of idle connections kept per host
+        :param block: if True, a thread waits for an idle connection when pool_size connections are in use.
+                      Otherwise it opens an extra connection, which is closed after use instead of kept
+        :param timeout: seconds to wait for a connection or a response
+        """
+        # not named 'credentials', so that batch requests of googleapiclient leave the credential to this object,
+        # instead of refreshing it by an httplib2.Http of their own
+        self._credentials = credentials
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # an attribute of httplib2.Http read by googleapiclient
+        self.redirect_codes = frozenset()
+
+        self._adapter = _CountingAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=block)
+        self._session = requests.Session()
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._refreshes = 0
+
+    def request(self, uri: str, method: str = 'GET', body=None, headers: dict = None, redirections: int = 5,
+                connection_type=None):
+        """
+        Send a request, as httplib2.Http.request
+        :return: a tuple of (httplib2.Response, content in bytes)
+        """
+        headers = dict(headers or {})
+        token = self._authorize(headers)
+        resp = self._send(uri, method, body, headers, redirections)
+
+        if resp.status_code in REFRESH_STATUSES and self._credentials is not None:
+            logger.debug('Refreshing the credential on %d of %s %s', resp.status_code, method, uri)
+            self._refresh(token)
+            self._authorize(headers)
+            resp = self._send(uri, method, body, headers, redirections)
+
+        return _to_httplib2(resp)
+
+    def _send(self, uri: str, method: str, body, headers: dict, redirections: int):
+        resp = self._session.request(method, uri, data=body, headers=headers, timeout=self.timeout,
+                                     allow_redirects=redirections > 0 and method in ('GET', 'HEAD'))
+        with self._stats_lock:
+            self._requests += 1 + len(resp.history)
+        return resp
+
+    def _authorize(self, headers: dict) -> str:
+        """
+        Put the authorization header of the credential, refreshing it first if expired
+        :return: the token put, or None without a credential
+        """
+        if self._credentials is None:
+            return None
+        if not self._credentials.valid:
+            self._refresh(self._credentials.token)
+        with self._refresh_lock:
+            self._credentials.apply(headers)
+            return self._credentials.token
+
+    def _refresh(self, stale_token: str) -> None:
+        """
+        Refresh the credential, unless another thread already refreshed the stale token
+        """
+        with self._refresh_lock:
+            if self._credentials.token != stale_token and self._credentials.valid:
+                return
+            self._credentials.refresh(Request(self._session))
+            self._refreshes += 1
+
+    def stats(self) -> dict:
+        """
+        Statistics of connection reuse since created
+        :return: a dict of requests, connections opened, reused requests, reuse_ratio, refreshes of the credential
+                 and pool_size
+        """
+        with self._stats_lock:
+            count = self._requests
+        connections = self._adapter.connections
+        reused = max(0, count - connections)
+        return {
+            'requests': count,
+            'connections': connections,
+            'reused': reused,
+            'reuse_ratio': reused / count if count > 0 else 0.0,
+            'refreshes': self._refreshes,
+            'pool_size': self.pool_size,
+        }
+
+    def close(self) -> None:
+        """
+        Close all the pooled connections
+        """
+        self._session.close()
+
+
+class _CountingAdapter(requests.adapters.HTTPAdapter):
+    """
+    An HTTPAdapter counting the connections opened by its pools
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.connections = 0
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                adapter.opened()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                adapter.opened()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {'http': CountingHTTPConnectionPool,
+                                                   'https': CountingHTTPSConnectionPool}
+
+
+def _to_httplib2(resp) -> tuple:
+    """
+    Convert a response of requests into a response of httplib2
+    :return: a tuple of (httplib2.Response, content in bytes)
+    """
+    content = resp.content
+    info = {key.lower(): value for key, value in resp.headers.items()}
+    if 'content-encoding' in info:
+        # requests already decoded the content, as httplib2 does
+        info['-content-encoding'] = info.pop('content-encoding')
+        info['content-length'] = str(len(content))
+    info['status'] = str(resp.status_code)
+    response = httplib2.Response(info)
+    response.reason = resp.reason
+    return response, content
@@ -0,0 +1,121 @@
+import threading
+import time
+
+# default (requests per second, burst) of each API, after the per-user quotas
+# Drive: 12,000 queries per minute, Sheets: 60 requests per minute
+DEFAULT_RATE_LIMITS = {
+    'drive': (200.0, 200),
+    'sheets': (1.0, 60),
+}
+
+
+class RateLimiter:
+    """
+    A token bucket limiting the request rate of an API, shared by all the clients of the API in this process.
+    It also accounts the time spent throttled, by the bucket itself and by backoff of retried requests
+    """
+
+    _limiters = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        :param rate: tokens refilled per second, i.e. the sustained requests per second
+        :param burst: capacity of the bucket, i.e. the number of requests allowed at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+    @classmethod
+    def for_api(cls, api: str) -> 'RateLimiter':
+        """
+        Get the shared limiter of an API, creating it with the default limits on the first use
+        :param api: name of the API. ex> 'drive', 'sheets'
+        :return: the rate limiter of the API
+        """
+        with cls._registry_lock:
+            if api not in cls._limiters:
+                rate, burst = DEFAULT_RATE_LIMITS.get(api, (10.0, 10))
+                cls._limiters[api] = cls(rate=rate, burst=burst)
+            return cls._limiters[api]
+
+    @classmethod
+    def configure(cls, api: str, rate: float, burst: int) -> 'RateLimiter':
+        """
+        Set the limits of an API, which take effect on all the clients of the API
+        :param api: name of the API. ex> 'drive', 'sheets'
+        :param rate: requests per second
+        :param burst: the number of requests allowed at once
+        :return: the rate limiter of the API
+        """
+        limiter = cls.for_api(api)
+        with limiter._lock:
+            limiter.rate = rate
+            limiter.burst = burst
+            limiter._tokens = min(limiter._tokens, burst)
+        return limiter
+
+    def reserve(self, tokens: int = 1) -> float:
+        """
+        Take tokens from the bucket without blocking, for callers sleeping on their own like asyncio tasks.
+        Tokens are reserved in the order of calls, so the bucket may go into debt for a large request
+        :param tokens: the number of tokens, i.e. the number of requests to make
+        :return: seconds to wait before making the requests
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.requests += tokens
+            self.throttled_seconds += wait
+        return wait
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens from the bucket, and block until they are available
+        :param tokens: the number of tokens, i.e. the number of requests to make
+        :return: seconds waited
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_backoff(self, seconds: float) -> None:
+        """
+        Account a backoff before retrying a request, without sleeping
+        :param seconds: seconds of the backoff
+        """
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += seconds
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Sleep before retrying a request, and account it
+        :param seconds: seconds to sleep
+        """
+        self.record_backoff(seconds)
+        time.sleep(seconds)
+
+    def stats(self) -> dict:
+        """
+        :return: a dict of requests, retries, throttled_seconds(waited for tokens) and backoff_seconds
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled_seconds': self.throttled_seconds,
+                'backoff_seconds': self.backoff_seconds,
+            }
@@ -0,0 +1,281 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable
+
+from google.oauth2.credentials import Credentials
+
+try:
+    import fcntl
+except ImportError:
+    # not a POSIX system, where the store works within a process, without file locks
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# seconds before the expiry of the access token, from which the background refresher renews it.
+# It should be longer than the threshold of google-auth (3m45s), so that clients find the token renewed
+# before they consider it expired
+REFRESH_MARGIN = 300
+# seconds between checks of the background refresher
+CHECK_INTERVAL = 30
+
+
+class StoredCredentials(Credentials):
+    """
+    A credential loaded from a TokenStore, which takes a new token from the store on refresh,
+    instead of calling the token endpoint by itself. The store calls the token endpoint only if no other process
+    or thread has renewed the token yet
+    """
+    store = None
+
+    def refresh(self, request) -> None:
+        info = self.store.refresh(stale_token=self.token, request=request)
+        fresh = Credentials.from_authorized_user_info(info)
+        self.token = fresh.token
+        self.expiry = fresh.expiry
+
+
+class TokenStore:
+    """
+    A token file shared by the processes and threads using the same token.
+    Every read and write of the file is under a file lock, and a write replaces the file atomically,
+    so a reader never sees a partial token. An expired token is renewed by only one of the processes,
+    and the others take the renewed token from the file.
+    A background refresher renews the token shortly before its expiry, so that the clients rarely wait for it.
+    It runs in every process, but only the one holding a non-blocking lock of the refresher renews the token,
+    and another one takes over when the process holding it exits
+    """
+
+    _stores = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, token_path: str, refresh_margin: float = REFRESH_MARGIN,
+                 check_interval: float = CHECK_INTERVAL) -> None:
+        """
+        :param token_path: a path of the token file
+        :param refresh_margin: seconds before the expiry, from which the background refresher renews the token
+        :param check_interval: seconds between checks of the background refresher
+        """
+        self.token_path = os.path.abspath(token_path)
+        self.lock_path = self.token_path + '.lock'
+        self.refresher_lock_path = self.token_path + '.refresher'
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        # a file lock does not exclude the threads of a process sharing an open file, so they take this lock too
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+
+        # calls to the token endpoint by this process
+        self.refreshes = 0
+        # tokens taken from the file, renewed by another process or thread
+        self.reloads = 0
+
+    @classmethod
+    def for_path(cls, token_path: str) -> 'TokenStore':
+        """
+        Get the shared store of a token file, creating it on the first use
+        :param token_path: a path of the token file
+        :return: the token store
+        """
+        token_path = os.path.abspath(token_path)
+        with cls._registry_lock:
+            if token_path not in cls._stores:
+                cls._stores[token_path] = cls(token_path)
+            return cls._stores[token_path]
+
+    @contextlib.contextmanager
+    def locked(self, exclusive: bool = True):
+        """
+        Hold the lock of the token file, exclusive to write or shared to read
+        """
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self) -> dict:
+        """
+        :return: the authorized user info of the token file, or None if not exists
+        """
+        with self.locked(exclusive=False):
+            return self._read()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.token_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as error:
+            logger.warning('Ignoring a broken token file %s: %s', self.token_path, error)
+            return None
+
+    def _write(self, info: dict) -> None:
+        directory, name = os.path.split(self.token_path)
+        # created readable only by the owner, as the token is a secret
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(info, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.token_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self, scopes: list = None) -> StoredCredentials:
+        """
+        Load the credential of the token file
+        :param scopes: the scopes requested
+        :return: a credential refreshed through this store, or None if the token file not exists
+        """
+        info = self.read()
+        if info is None:
+            return None
+        return self._credentials(info, scopes)
+
+    def _credentials(self, info: dict, scopes: list = None) -> StoredCredentials:
+        creds = StoredCredentials.from_authorized_user_info(info, scopes)
+        creds.store = self
+        return creds
+
+    def save(self, creds: Credentials) -> None:
+        """
+        Write a credential to the token file
+        """
+        with self.locked():
+            self._write(json.loads(creds.to_json()))
+
+    def create(self, issue: Callable[[], Credentials], scopes: list = None) -> StoredCredentials:
+        """
+        Issue a new token and save it, unless another process has saved a valid token meanwhile.
+        The token is issued without holding the lock, since it may wait for the user to log in,
+        and the lock is taken only to check the file again and write the token
+        :param issue: a function issuing a new credential. ex> an OAuth flow letting the user log in
+        :param scopes: the scopes requested
+        :return: a credential refreshed through this store
+        """
+        creds = self._valid(self.read(), scopes)
+        if creds is not None:
+            return creds
+
+        info = json.loads(issue().to_json())
+        with self.locked():
+            # another process may have saved a token while the user was logging in, which is kept for all
+            creds = self._valid(self._read(), scopes)
+            if creds is not None:
+                return creds
+            self._write(info)
+        return self._credentials(info, scopes)
+
+    def _valid(self, info: dict, scopes: list = None) -> StoredCredentials:
+        """
+        :return: a credential of the authorized user info if valid, or None
+        """
+        if info is None:
+            return None
+        creds = self._credentials(info, scopes)
+        return creds if creds.valid else None
+
+    def refresh(self, stale_token: str = None, request=None) -> dict:
+        """
+        Renew the token, unless the token file already holds a valid token other than the stale one
+        :param stale_token: the access token found expired, or None to renew the stored token if expired
+        :param request: a google.auth.transport.Request to call the token endpoint with
+        :return: the authorized user info of the renewed token
+        """
+        with self.locked():
+            info = self._read()
+            if info is None:
+                from google.auth.exceptions import RefreshError
+                raise RefreshError(f'No token file {self.token_path} to refresh')
+
+            creds = Credentials.from_authorized_user_info(info)
+            if creds.valid and creds.token != stale_token:
+                self.reloads += 1
+                return info
+
+            if request is None:
+                from google.auth.transport.requests import Request
+                request = Request()
+            creds.refresh(request)
+            info = json.loads(creds.to_json())
+            self._write(info)
+            self.refreshes += 1
+            logger.debug('Refreshed the token of %s', self.token_path)
+            return info
+
+    def start_refresher(self) -> None:
+        """
+        Start the background refresher of this process, if not started yet
+        """
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._run_refresher, name='TokenStore-refresher',
+                                               daemon=True)
+            self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        """
+        Stop the background refresher, releasing the lock of the refresher to another process
+        """
+        self._stop.set()
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join()
+
+    def _run_refresher(self) -> None:
+        election = None
+        try:
+            while not self._stop.is_set():
+                # any error is logged and retried on the next check, so that the refresher survives it
+                try:
+                    if election is None:
+                        election = self._elect()
+                    if election is not None:
+                        self._refresh_if_due()
+                except Exception:
+                    logger.exception('Failed to refresh the token of %s in background', self.token_path)
+                self._stop.wait(self.check_interval)
+        finally:
+            if election is not None:
+                election.close()
+
+    def _elect(self):
+        """
+        Try to take the lock of the refresher without blocking. It is held until the refresher stops
+        :return: the open lock file if taken, or None if another process holds it
+        """
+        election = open(self.refresher_lock_path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(election, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                election.close()
+                return None
+        logger.debug('Elected as the refresher of %s', self.token_path)
+        return election
+
+    def _refresh_if_due(self) -> None:
+        info = self.read()
+        if info is None or not info.get('refresh_token'):
+            return
+        expiry = Credentials.from_authorized_user_info(info).expiry
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        # a token without expiry, ex> of an old token file, is renewed to learn its expiry
+        if expiry is None or (expiry - now).total_seconds() <= self.refresh_margin:
+            self.refresh(stale_token=info.get('token'))
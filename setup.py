@@ -19,6 +19,11 @@ setup(
         'googleapis-common-protos==1.55.0',
         'pandas',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'arrow': ['pyarrow'],
+        'pooled': ['requests'],
+    },
     python_requires='>=3.8'
 
 )
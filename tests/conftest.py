@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# the fake backend of the benchmarks serves the tests too
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_backend import FakeBackend  # noqa: E402
+from gworkspace_client import GsuiteBase as base_module  # noqa: E402
+from gworkspace_client.GoogleDrive import GoogleDrive  # noqa: E402
+from gworkspace_client.GoogleSheet import GoogleSheet  # noqa: E402
+from gworkspace_client.RateLimiter import DEFAULT_RATE_LIMITS, RateLimiter  # noqa: E402
+
+
+class _FakeBackendMixin:
+    """
+    Serve a client by the fake backend instead of Google, with no credential
+    """
+    backend = None
+
+    def _load_token(self, scopes: str) -> object:
+        return None
+
+    def _build_service(self, api: str, version: str):
+        from googleapiclient.discovery import build
+
+        services = self.__dict__.setdefault('_fake_services', threading.local())
+        if not hasattr(services, api):
+            setattr(services, api, build(api, version, http=self.backend, static_discovery=True))
+        return getattr(services, api)
+
+
+class FakeDrive(_FakeBackendMixin, GoogleDrive):
+    pass
+
+
+class FakeSheet(_FakeBackendMixin, GoogleSheet):
+    pass
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend(n_files=5)
+
+
+@pytest.fixture(autouse=True)
+def no_waits(monkeypatch):
+    # the rate limiters are opened up and retries are immediate, so that the tests run fast
+    monkeypatch.setattr(base_module, 'retry_delay', lambda error, attempt: 0.0)
+    for api in DEFAULT_RATE_LIMITS:
+        RateLimiter.configure(api, rate=1e9, burst=10 ** 9)
+    yield
+    for api, (rate, burst) in DEFAULT_RATE_LIMITS.items():
+        RateLimiter.configure(api, rate=rate, burst=burst)
+
+
+@pytest.fixture
+def gdrive(backend, tmp_path):
+    FakeDrive.backend = backend
+    return FakeDrive(token_path=str(tmp_path / 'token.json'), client_secret_path='')
+
+
+@pytest.fixture
+def gsheet(backend, tmp_path):
+    FakeSheet.backend = backend
+    return FakeSheet(token_path=str(tmp_path / 'token.json'), client_secret_path='', url_or_id='fake')
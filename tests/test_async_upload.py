@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from fake_backend import FakeBackend, serve  # noqa: E402
+from gworkspace_client import AsyncGoogleDrive as async_drive_module  # noqa: E402
+from gworkspace_client.AsyncGoogleDrive import AsyncGoogleDrive  # noqa: E402
+
+CHUNK_SIZE = 256 * 1024
+
+
+class FakeAsyncDrive(AsyncGoogleDrive):
+    def _load_token(self, scopes: str) -> object:
+        return None
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    server = serve(backend)
+    yield backend
+    server.shutdown()
+
+
+@pytest.fixture
+def upload_path(tmp_path):
+    path = tmp_path / 'upload.bin'
+    path.write_bytes(os.urandom(3 * CHUNK_SIZE + 1000))
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(async_drive_module, 'retry_delay', lambda error, attempt: 0.0)
+
+
+def upload(backend: FakeBackend, upload_path: str, tmp_path) -> str:
+    async def run():
+        async with await FakeAsyncDrive.create(token_path=str(tmp_path / 'token.json'), client_secret_path='',
+                                               base_url=backend.base_url) as gdrive:
+            return await gdrive.upload_file('root', upload_path, mimetype='application/octet-stream',
+                                            chunk_size=CHUNK_SIZE)
+
+    return asyncio.run(run())
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_upload_file(backend, upload_path, tmp_path):
+    file_id = upload(backend, upload_path, tmp_path)
+
+    assert backend.uploaded[file_id] == read(upload_path)
+
+
+def test_upload_file_resends_from_committed_range(backend, upload_path, tmp_path):
+    # the server commits only a half of the first chunks, answered by 308 with the committed range
+    backend.partial_commits = 2
+
+    file_id = upload(backend, upload_path, tmp_path)
+
+    assert backend.uploaded[file_id] == read(upload_path)
+
+
+def test_upload_file_resumes_after_failed_chunk(backend, upload_path, tmp_path):
+    # a chunk fails after the server has committed a half of it, so the client must ask for the committed offset
+    backend.upload_failures = 1
+
+    file_id = upload(backend, upload_path, tmp_path)
+
+    assert backend.uploaded[file_id] == read(upload_path)
+
+
+def test_upload_file_gives_up_after_max_retries(backend, upload_path, tmp_path):
+    backend.upload_failures = FakeAsyncDrive.MAX_RETRIES + 1
+
+    assert upload(backend, upload_path, tmp_path) is None
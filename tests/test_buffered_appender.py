@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from gworkspace_client import BufferedAppender as appender_module
+from gworkspace_client.BufferedAppender import BufferedAppender
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(appender_module, 'retry_delay', lambda error, attempt: 0.0)
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_flush_on_max_rows(backend, gsheet):
+    with BufferedAppender(gsheet, 'Sheet1', max_rows=3, flush_interval=60) as appender:
+        appender.extend([[i] for i in range(7)])
+        wait_for(lambda: appender.requests == 2)
+        assert backend.appended == [[i] for i in range(6)]
+        assert len(appender) == 1
+
+    assert backend.appended == [[i] for i in range(7)]
+    assert appender.requests == 3
+
+
+def test_flush_on_interval(backend, gsheet):
+    with BufferedAppender(gsheet, 'Sheet1', flush_interval=0.2) as appender:
+        started = time.monotonic()
+        appender.append(['a'])
+        wait_for(lambda: appender.appended_rows == 1)
+        assert time.monotonic() - started >= 0.2
+
+    assert backend.appended == [['a']]
+
+
+def test_append_blocks_when_full(backend, gsheet):
+    backend.latency = 0.5
+    with BufferedAppender(gsheet, 'Sheet1', max_rows=2, max_buffered_rows=2) as appender:
+        appender.extend([['a'], ['b']])
+        # the rows stay in the buffer until the slow append of them completes
+        with pytest.raises(TimeoutError):
+            appender.append(['c'], timeout=0.1)
+        appender.append(['c'])
+
+    assert backend.appended == [['a'], ['b'], ['c']]
+
+
+def test_fatal_error_leaves_rows(backend, gsheet):
+    backend.sheet_errors.append(400)
+    appender = BufferedAppender(gsheet, 'Sheet1', flush_interval=60)
+    appender.append(['a'])
+
+    with pytest.raises(HttpError):
+        appender.flush()
+    with pytest.raises(HttpError):
+        appender.append(['b'])
+    assert appender.pending() == [['a']]
+    assert backend.appended == []
+
+
+def test_close_raises_after_close_retries(backend, gsheet):
+    gsheet.MAX_RETRIES = 0
+    backend.sheet_errors.extend([503] * 10)
+    appender = BufferedAppender(gsheet, 'Sheet1', flush_interval=60, close_retries=2)
+    appender.append(['a'])
+
+    with pytest.raises(HttpError):
+        appender.close()
+    # the first try and close_retries retries
+    assert len(backend.sheet_errors) == 10 - 3
+    assert appender.pending() == [['a']]
+
+
+def test_close_timeout(backend, gsheet):
+    backend.latency = 0.5
+    appender = BufferedAppender(gsheet, 'Sheet1')
+    appender.append(['a'])
+
+    with pytest.raises(TimeoutError):
+        appender.close(timeout=0.1)
+    appender.close()
+    assert backend.appended == [['a']]
@@ -0,0 +1,93 @@
+import pytest
+from googleapiclient.discovery import build
+
+from fake_backend import FakeBackend
+from gworkspace_client.DriveIndex import FOLDER_MIME_TYPE, DriveIndex
+
+N_FILES = 5
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend(n_files=N_FILES)
+
+
+@pytest.fixture
+def index(backend):
+    service = build('drive', 'v3', http=backend, static_discovery=True)
+    index = DriveIndex(':memory:', service, max_staleness=None)
+    yield index
+    index.close()
+
+
+def test_seed(backend, index):
+    backend.add_change('before-seed', {'id': 'before-seed', 'name': 'old.bin', 'parents': ['root']})
+
+    assert index.seed() == N_FILES
+    assert index.page_token == '1'
+    assert sorted(index.list_children('root')) == [(f'file-{i}.bin', f'file{i:08d}') for i in range(N_FILES)]
+    assert index.get('file00000000')['parents'] == ['root']
+
+
+def test_sync_new_file(backend, index):
+    index.seed()
+    backend.add_change('folder', {'id': 'folder', 'name': 'folder', 'mimeType': FOLDER_MIME_TYPE,
+                                  'parents': ['root']})
+    backend.add_change('new', {'id': 'new', 'name': 'new.bin', 'parents': ['folder']})
+
+    assert index.sync() == 2
+    assert index.list_children('root', folders=True) == [('folder', 'folder')]
+    assert index.find('folder', 'new.bin') == [('new', 'new.bin')]
+    assert index.page_token == '2'
+
+
+def test_sync_trashed_and_removed_files(backend, index):
+    index.seed()
+    backend.add_change('file00000001', {'id': 'file00000001', 'name': 'file-1.bin', 'parents': ['root'],
+                                        'trashed': True})
+    backend.add_change('file00000002')
+
+    assert index.sync() == 2
+    assert index.get('file00000001') is None
+    assert index.get('file00000002') is None
+    assert not index.contains('root', 'file-1.bin')
+    assert len(index.list_children('root')) == N_FILES - 2
+
+
+def test_sync_moved_file(backend, index):
+    index.seed()
+    backend.add_change('file00000003', {'id': 'file00000003', 'name': 'moved.bin', 'parents': ['folder']})
+
+    index.sync()
+    assert index.get('file00000003')['parents'] == ['folder']
+    assert not index.contains('root', 'file00000003')
+    assert index.list_children('folder') == [('moved.bin', 'file00000003')]
+
+
+def test_sync_pages(backend, index):
+    index.seed()
+    for i in range(1500):
+        backend.add_change(f'new{i}', {'id': f'new{i}', 'name': f'new-{i}.bin', 'parents': ['root']})
+
+    assert index.sync() == 1500
+    assert index.page_token == '1500'
+    assert len(index.list_children('root')) == N_FILES + 1500
+    assert index.sync() == 0
+
+
+def test_shared_drives_indexed(backend, index, monkeypatch):
+    uris = []
+    request = backend.request
+
+    def record(uri, *args, **kwargs):
+        uris.append(uri)
+        return request(uri, *args, **kwargs)
+
+    monkeypatch.setattr(backend, 'request', record)
+    index.seed()
+    index.sync()
+
+    listings = [uri for uri in uris if '/files?' in uri or '/changes?' in uri]
+    assert len(listings) == 2
+    for uri in listings:
+        assert 'includeItemsFromAllDrives=true' in uri and 'supportsAllDrives=true' in uri
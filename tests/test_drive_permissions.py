@@ -0,0 +1,9 @@
+import pytest
+
+
+def test_grant_permissions_rejects_repeated_grants(backend, gdrive):
+    grants = [('file1', 'a@example.com', 'reader'), ('file1', 'a@example.com', 'editor')]
+
+    with pytest.raises(ValueError, match='more than once'):
+        gdrive.grant_permissions(grants)
+    assert backend.requests == 0
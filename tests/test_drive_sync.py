@@ -0,0 +1,136 @@
+import hashlib
+import os
+
+import pytest
+
+from fake_backend import FakeBackend
+from gworkspace_client.DriveSync import DriveSync, _format_time
+from gworkspace_client.GoogleDrive import FOLDER_MIME_TYPE
+
+MTIME = 1700000000.0
+FILE_SIZE = 1024
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend(file_size=FILE_SIZE)
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    path = tmp_path / 'local'
+    path.mkdir()
+    return str(path)
+
+
+def add_remote(backend: FakeBackend, name: str, content: bytes = None, mtime: float = MTIME,
+               parent: str = 'root') -> None:
+    file = {'id': 'id-' + name, 'name': name, 'parents': [parent], 'modifiedTime': _format_time(mtime)}
+    if content is None:
+        file['mimeType'] = FOLDER_MIME_TYPE
+    else:
+        file.update(mimeType='text/plain', size=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+    backend.add_file(file)
+
+
+def add_local(local_dir: str, name: str, content: bytes, mtime: float = MTIME) -> str:
+    path = os.path.join(local_dir, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def plan(actions: list) -> set:
+    return {(action.action, action.path) for action in actions}
+
+
+@pytest.fixture
+def trees(backend, local_dir):
+    # unchanged, by size and modified time
+    add_remote(backend, 'same.txt', b'same')
+    add_local(local_dir, 'same.txt', b'same')
+    # changed in size
+    add_remote(backend, 'resized.txt', b'old')
+    add_local(local_dir, 'resized.txt', b'longer')
+    # the same size but another modified time, compared by md5
+    add_remote(backend, 'touched.txt', b'data')
+    add_local(local_dir, 'touched.txt', b'data', mtime=MTIME + 60)
+    add_remote(backend, 'edited.txt', b'abcd')
+    add_local(local_dir, 'edited.txt', b'wxyz', mtime=MTIME + 60)
+    # on one side only
+    add_local(local_dir, 'local.txt', b'local')
+    os.mkdir(os.path.join(local_dir, 'local-dir'))
+    add_remote(backend, 'remote.txt', b'remote')
+    add_remote(backend, 'remote-dir')
+    # a transient file of a download, and a user file of a similar name
+    add_local(local_dir, 'video.mp4.download-part', b'partial')
+    add_local(local_dir, 'video.part', b'video')
+
+
+def test_push_plan(gdrive, trees, local_dir):
+    actions = DriveSync(gdrive).push(local_dir, 'root', dry_run=True, delete_extraneous=True)
+
+    assert plan(actions) == {('mkdir', 'local-dir'), ('upload', 'local.txt'), ('upload', 'video.part'),
+                             ('update', 'resized.txt'), ('update', 'edited.txt'),
+                             ('delete', 'remote.txt'), ('delete', 'remote-dir')}
+
+
+def test_pull_plan(gdrive, trees, local_dir):
+    actions = DriveSync(gdrive).pull('root', local_dir, dry_run=True, delete_extraneous=True)
+
+    assert plan(actions) == {('mkdir', 'remote-dir'), ('download', 'remote.txt'),
+                             ('download', 'resized.txt'), ('download', 'edited.txt'),
+                             ('delete', 'local.txt'), ('delete', 'local-dir'), ('delete', 'video.part')}
+    # a dry run changes nothing
+    assert os.stat(os.path.join(local_dir, 'touched.txt')).st_mtime == MTIME + 60
+
+
+def test_pull_takes_remote_mtime_of_same_content(gdrive, backend, local_dir):
+    add_remote(backend, 'touched.txt', b'data')
+    path = add_local(local_dir, 'touched.txt', b'data', mtime=MTIME + 60)
+
+    assert DriveSync(gdrive).pull('root', local_dir) == []
+    assert os.stat(path).st_mtime == MTIME
+
+
+def test_pull(gdrive, backend, local_dir):
+    content = bytes(range(256)) * (FILE_SIZE // 256)
+    add_remote(backend, 'remote.txt', content, mtime=MTIME)
+    add_remote(backend, 'remote-dir')
+    add_local(local_dir, 'local.txt', b'local')
+
+    actions = DriveSync(gdrive).pull('root', local_dir, delete_extraneous=True)
+
+    assert all(action.ok for action in actions)
+    assert plan(actions) == {('mkdir', 'remote-dir'), ('download', 'remote.txt'), ('delete', 'local.txt')}
+    path = os.path.join(local_dir, 'remote.txt')
+    with open(path, 'rb') as f:
+        assert f.read() == content
+    assert os.stat(path).st_mtime == MTIME
+    assert sorted(os.listdir(local_dir)) == ['remote-dir', 'remote.txt']
+    assert DriveSync(gdrive).pull('root', local_dir, dry_run=True, delete_extraneous=True) == []
+
+
+def test_pull_fails_mkdir_over_a_file(gdrive, backend, local_dir):
+    add_remote(backend, 'name')
+    add_remote(backend, 'inner.txt', b'inner', parent='id-name')
+    add_remote(backend, 'other.txt', b'other')
+    add_local(local_dir, 'name', b'a file of the name of the folder')
+
+    actions = {action.path: action for action in DriveSync(gdrive).pull('root', local_dir)}
+
+    assert isinstance(actions['name'].error, OSError)
+    assert isinstance(actions['name/inner.txt'].error, IOError)
+    assert actions['other.txt'].ok
+
+
+def test_push_deletes_extraneous(gdrive, backend, local_dir):
+    add_remote(backend, 'same.txt', b'same')
+    add_local(local_dir, 'same.txt', b'same')
+    add_remote(backend, 'remote.txt', b'remote')
+
+    actions = DriveSync(gdrive).push(local_dir, 'root', delete_extraneous=True)
+
+    assert [(action.action, action.path, action.file_id, action.ok) for action in actions] == [
+        ('delete', 'remote.txt', 'id-remote.txt', True)]
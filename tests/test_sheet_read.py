@@ -0,0 +1,36 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from gworkspace_client.GoogleSheet import typed_frame, unique_columns  # noqa: E402
+
+
+def test_unique_columns():
+    assert unique_columns(['a', '', 'a', 'a']) == ['a', 'B', 'a.1', 'a.2']
+
+
+def test_typed_frame_by_position():
+    df = typed_frame([[1, 'x', '2024-01-02'], [2, 'y', '2024-01-03 10:00']], columns=['n', 'n', ''])
+
+    assert list(df.columns) == ['n', 'n.1', 'C']
+    assert pd.api.types.is_integer_dtype(df['n'])
+    assert df['n.1'].tolist() == ['x', 'y']
+    assert pd.api.types.is_datetime64_any_dtype(df['C'])
+
+
+def test_typed_frame_keeps_words():
+    df = typed_frame([['today'], ['now']], columns=['when'])
+
+    assert df['when'].tolist() == ['today', 'now']
+
+
+def test_iter_sheet_chunks(gsheet):
+    chunks = list(gsheet.iter_sheet_chunks('Sheet1', chunk_rows=400))
+
+    assert len(chunks) == 3
+    assert list(chunks[0].columns) == [f'col{j}' for j in range(10)]
+
+
+def test_iter_sheet_chunks_of_missing_sheet(gsheet):
+    with pytest.raises(ValueError, match="No sheet titled 'missing'"):
+        list(gsheet.iter_sheet_chunks('missing'))
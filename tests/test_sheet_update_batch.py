@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from gworkspace_client.GoogleSheet import SheetUpdateBatch
+
+
+def test_update_batch(backend, gsheet):
+    with gsheet.update_batch() as batch:
+        added = batch.add_sheet('report', sheet_id=100)
+        frozen = batch.freeze(100, rows=1)
+
+    assert added.result() == {}
+    assert frozen.result() == {}
+    assert [list(request) for request in backend.batch_updates[0]] == [['addSheet'], ['updateSheetProperties']]
+
+
+def test_update_batch_aborted(backend, gsheet):
+    with pytest.raises(KeyError):
+        with gsheet.update_batch() as batch:
+            added = batch.add_sheet('report')
+            raise KeyError('body failed')
+
+    assert added.done()
+    with pytest.raises(KeyError):
+        added.result()
+    assert backend.batch_updates == []
+
+
+def test_flush_fails_later_chunks(backend, gsheet):
+    backend.sheet_errors.append(400)
+    batch = SheetUpdateBatch(client=gsheet, max_payload_bytes=1)
+    futures = [batch.delete_sheet(sheet_id) for sheet_id in range(3)]
+
+    results = batch.flush()
+    assert len(results) == 1 and isinstance(results[0], HttpError)
+    for future in futures:
+        with pytest.raises(HttpError):
+            future.result(timeout=0)
+
+
+def test_flush_fails_on_transport_error(gsheet, monkeypatch):
+    def timeout(requests: list) -> dict:
+        raise socket.timeout('timed out')
+
+    monkeypatch.setattr(gsheet, '_batch_update', timeout)
+    batch = SheetUpdateBatch(client=gsheet)
+    future = batch.delete_sheet(1)
+
+    assert isinstance(batch.flush()[0], socket.timeout)
+    with pytest.raises(socket.timeout):
+        future.result(timeout=0)
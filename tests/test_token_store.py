@@ -0,0 +1,109 @@
+import datetime
+import json
+import threading
+import time
+
+import pytest
+
+from gworkspace_client import TokenStore as token_store_module
+from gworkspace_client.TokenStore import TokenStore
+
+
+class FakeTokenEndpoint:
+    """
+    A google.auth.transport.Request answering every token request by a new access token
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            token = f'token-{self.calls}'
+        return _Response(200, {'access_token': token, 'expires_in': 3600})
+
+
+class _Response:
+    def __init__(self, status: int, content: dict) -> None:
+        self.status = status
+        self.headers = {'content-type': 'application/json'}
+        self.data = json.dumps(content).encode()
+
+
+def write_token(path: str, expires_in: float) -> None:
+    expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(seconds=expires_in)
+    with open(path, 'w') as f:
+        json.dump({'token': 'stale', 'refresh_token': 'refresh', 'client_id': 'id', 'client_secret': 'secret',
+                   'token_uri': 'https://oauth2.googleapis.com/token', 'expiry': expiry.isoformat() + 'Z'}, f)
+
+
+@pytest.fixture
+def token_path(tmp_path):
+    path = str(tmp_path / 'token.json')
+    write_token(path, expires_in=-60)
+    return path
+
+
+def test_one_refresh_by_many_stores(token_path):
+    endpoint = FakeTokenEndpoint()
+    # a store per thread, as separate processes have
+    credentials = [TokenStore(token_path).load() for _ in range(8)]
+    barrier = threading.Barrier(len(credentials))
+
+    def refresh(creds) -> None:
+        barrier.wait()
+        creds.refresh(endpoint)
+
+    threads = [threading.Thread(target=refresh, args=(creds,)) for creds in credentials]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert endpoint.calls == 1
+    assert {creds.token for creds in credentials} == {'token-1'}
+    assert all(creds.valid for creds in credentials)
+    with open(token_path) as f:
+        assert json.load(f)['token'] == 'token-1'
+
+
+def test_create_keeps_the_token_saved_meanwhile(token_path):
+    store = TokenStore(token_path)
+
+    def issue():
+        # another process saves a valid token while the user is logging in
+        write_token(token_path, expires_in=3600)
+        return store.load()
+
+    creds = store.create(issue)
+    assert creds.valid and creds.token == 'stale'
+
+
+@pytest.mark.skipif(token_store_module.fcntl is None, reason='the refresher is elected by file locks')
+def test_refresher_elected_and_stopped(token_path):
+    write_token(token_path, expires_in=3600)
+    store = TokenStore(token_path, check_interval=0.05)
+    other = TokenStore(token_path)
+    store.start_refresher()
+    store.start_refresher()
+    refresher = store._refresher
+
+    # the running refresher takes the lock of the refresher, which no other store gets then
+    deadline = time.monotonic() + 5
+    while True:
+        election = other._elect()
+        if election is None:
+            break
+        election.close()
+        assert time.monotonic() < deadline, 'the refresher is not elected'
+        time.sleep(0.01)
+
+    store.stop_refresher()
+    assert not refresher.is_alive()
+    # the lock is released for another process
+    election = other._elect()
+    assert election is not None
+    election.close()
+    assert store.refreshes == 0